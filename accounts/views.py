@@ -4,7 +4,7 @@ from django.contrib.auth.decorators import login_required, user_passes_test
 from django.contrib import messages
 from .models import User
 from .forms import CustomUserCreationForm, CustomUserChangeForm, LoginForm
-from pharmacy.models import Historique
+from pharmacy import audit
 
 
 def is_admin(user):
@@ -22,7 +22,7 @@ def login_view(request):
             user = authenticate(request, username=username, password=password)
             if user is not None:
                 login(request, user)
-                Historique.objects.create(utilisateur=user, action='connexion', modele='', detail=f"Connexion de {user.username}")
+                audit.journaliser(user, 'connexion', '', f"Connexion de {user.username}")
                 return redirect('dashboard')
             else:
                 messages.error(request, "Nom d'utilisateur ou mot de passe incorrect.")
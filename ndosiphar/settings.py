@@ -170,3 +170,54 @@ EMAIL_USE_TLS = True
 EMAIL_HOST_USER = os.environ.get('EMAIL_HOST_USER', '')
 EMAIL_HOST_PASSWORD = os.environ.get('EMAIL_HOST_PASSWORD', '')
 DEFAULT_FROM_EMAIL = f'NDOSIPHAR <{EMAIL_HOST_USER}>'
+
+# Journal d'audit (Historique)
+# 'tampon' : écriture par lots (bulk_create) avec spool local ; 'synchrone' : une écriture par action (tests).
+AUDIT_MODE = os.environ.get('AUDIT_MODE', 'tampon')
+AUDIT_TAMPON_TAILLE = 50
+AUDIT_TAMPON_INTERVALLE = 5  # secondes
+AUDIT_SPOOL_DIR = BASE_DIR / 'var' / 'audit'
+AUDIT_SPOOL_FSYNC = False
+HISTORIQUE_RETENTION_JOURS = 365
+HISTORIQUE_ARCHIVE_DIR = BASE_DIR / 'var' / 'archives' / 'historique'
+HISTORIQUE_MODULES_CACHE = 600  # secondes
+
+# Réapprovisionnement (réquisition) : point de commande = ventes/jour × (délai fournisseur + sécurité)
+REAPPRO_JOURS_SECURITE = 7
+REAPPRO_JOURS_COUVERTURE = 30  # jours de ventes couverts par une commande
+
+# Prévision de la demande (pharmacy/prevision.py)
+PREVISION_HISTORIQUE_JOURS = 3 * 365
+PREVISION_HORIZON_JOURS = 60
+PREVISION_ALPHA = 0.1  # lissage exponentiel : poids du jour le plus récent
+PREVISION_SEMAINES_SAISON = 8  # semaines utilisées pour la saisonnalité hebdomadaire
+
+# Séries de taux de change gardées en mémoire par processus (pharmacy/taux.py)
+TAUX_HISTORIQUE_CACHE = 60  # secondes
+
+# Analyse produits (meilleures ventes, ABC, stock dormant)
+ANALYSE_PRODUITS_CACHE = 900  # secondes, période incluant aujourd'hui
+ANALYSE_JOURS_STOCK_DORMANT = 90
+
+# Tâches de fond (pharmacy/taches.py) : PDF et exports Excel lourds produits par `manage.py traiter_taches`
+# 'synchrone' (défaut) : document produit dans la requête ; 'file' : mise en file + page d'attente,
+# à n'activer qu'avec le worker `manage.py traiter_taches` lancé en service (voir README).
+TACHES_MODE = os.environ.get('TACHES_MODE', 'synchrone')
+TACHES_DIR = BASE_DIR / 'var' / 'taches'
+TACHES_RETENTION_HEURES = 24
+TACHES_INTERVALLE = 2  # secondes entre deux scrutations de la file
+TACHES_DELAI_BLOCAGE = 1800  # secondes avant de considérer une tâche 'en_cours' comme abandonnée
+
+# Cache disque des PDF rendus (pharmacy/cache_pdf.py) : factures et inventaires validés
+PDF_CACHE_DIR = BASE_DIR / 'var' / 'pdf'
+PDF_CACHE_TAILLE_MAX = 200 * 1024 * 1024  # octets, éviction LRU au-delà
+
+# Rendu PDF par tranches des longues listes (produits, inventaires) : lignes par tranche, processus de rendu
+PDF_MORCEAU_LIGNES = 400
+PDF_PROCESSUS = int(os.environ.get('PDF_PROCESSUS', min(os.cpu_count() or 1, 4)))
+
+# Moteur des factures (pharmacy/factures.py) : 'html' (gabarit + xhtml2pdf) ou 'canvas' (dessin reportlab direct)
+FACTURE_MOTEUR = os.environ.get('FACTURE_MOTEUR', 'html')
+
+# Tickets de caisse thermiques (pharmacy/tickets.py) : largeur du papier en mm (58 ou 80)
+TICKET_LARGEUR_MM = 80
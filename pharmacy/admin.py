@@ -1,5 +1,8 @@
-from django.contrib import admin
-from .models import Taux, Fournisseur, Produit, Client, Vente, LigneVente, Inventaire, LigneInventaire
+from django.contrib import admin, messages
+from .models import (Taux, TauxHistorique, Fournisseur, Produit, Client, Vente, LigneVente, Inventaire,
+                     LigneInventaire, ZoneComptage, SuiviEcartProduit, VelociteProduit, PrevisionProduit,
+                     MoisCubeVentes, AlerteExpiration, Lot, Reception, LigneReception, Tache,
+                     ClotureJournee, LigneCloture, CaisseCloture, AjustementCloture, StockInsuffisant)
 
 
 @admin.register(Taux)
@@ -11,7 +14,7 @@ class TauxAdmin(admin.ModelAdmin):
 
 @admin.register(Fournisseur)
 class FournisseurAdmin(admin.ModelAdmin):
-    list_display = ('code_fournisseur', 'designation', 'marge_beneficiaire')
+    list_display = ('code_fournisseur', 'designation', 'marge_beneficiaire', 'delai_livraison')
     search_fields = ('designation',)
 
 
@@ -21,6 +24,19 @@ class ProduitAdmin(admin.ModelAdmin):
     list_filter = ('fournisseur',)
     search_fields = ('designation',)
 
+    def save_model(self, request, obj, form, change):
+        # Comme produit_edit : le stock saisi passe par les lots, sinon Lot.synchroniser l'écraserait.
+        super().save_model(request, obj, form, change)
+        if change and 'date_expiration' in form.changed_data:
+            lots = Lot.ordre_fefo(obj.pk)
+            if lots.count() == 1:
+                lots.update(date_expiration=obj.date_expiration)
+        try:
+            Lot.ajuster(obj, obj.quantite_stock)
+        except StockInsuffisant as e:
+            self.message_user(request, f"Stock non modifié : {e}", messages.WARNING)
+        AlerteExpiration.rafraichir(produit_ids=[obj.pk])
+
 
 @admin.register(Client)
 class ClientAdmin(admin.ModelAdmin):
@@ -45,10 +61,118 @@ class LigneInventaireInline(admin.TabularInline):
     readonly_fields = ('ecart', 'valeur_ecart')
 
 
+class ZoneComptageInline(admin.TabularInline):
+    model = ZoneComptage
+    extra = 0
+
+
 @admin.register(Inventaire)
 class InventaireAdmin(admin.ModelAdmin):
     list_display = ('code_inventaire', 'date_creation', 'utilisateur', 'statut', 'nb_produits_comptes', 'total_ecart_valeur')
     list_filter = ('statut', 'date_creation')
-    inlines = [LigneInventaireInline]
+    inlines = [ZoneComptageInline, LigneInventaireInline]
     filter_horizontal = ('compteurs_autorises',)
     readonly_fields = ('date_creation', 'date_validation', 'nb_produits_comptes', 'total_ecart_valeur')
+
+
+@admin.register(SuiviEcartProduit)
+class SuiviEcartProduitAdmin(admin.ModelAdmin):
+    list_display = ('produit', 'nb_inventaires', 'nb_manquants', 'cumul_ecart', 'cumul_pertes', 'cumul_valeur_ecart')
+    search_fields = ('produit__designation',)
+    readonly_fields = ('date_mise_a_jour',)
+
+
+@admin.register(VelociteProduit)
+class VelociteProduitAdmin(admin.ModelAdmin):
+    list_display = ('produit', 'qte_7j', 'qte_30j', 'qte_90j', 'velocite', 'point_commande', 'stock_cible', 'date_calcul')
+    search_fields = ('produit__designation',)
+    list_filter = ('produit__fournisseur',)
+
+
+@admin.register(PrevisionProduit)
+class PrevisionProduitAdmin(admin.ModelAdmin):
+    list_display = ('produit', 'moyenne_jour', 'date_calcul')
+    search_fields = ('produit__designation',)
+
+
+class LigneReceptionInline(admin.TabularInline):
+    model = LigneReception
+    extra = 0
+
+
+@admin.register(Reception)
+class ReceptionAdmin(admin.ModelAdmin):
+    list_display = ('code_reception', 'fournisseur', 'numero_bl', 'date_reception', 'statut', 'montant_total', 'utilisateur')
+    list_filter = ('statut', 'fournisseur')
+    search_fields = ('numero_bl', 'fournisseur__designation')
+    inlines = [LigneReceptionInline]
+
+
+@admin.register(Lot)
+class LotAdmin(admin.ModelAdmin):
+    list_display = ('produit', 'numero_lot', 'date_expiration', 'quantite_initiale', 'quantite', 'date_reception')
+    search_fields = ('produit__designation', 'numero_lot')
+    list_filter = ('produit__fournisseur',)
+
+
+@admin.register(AlerteExpiration)
+class AlerteExpirationAdmin(admin.ModelAdmin):
+    list_display = ('produit', 'lot', 'statut', 'date_expiration', 'jours_restants', 'quantite_stock', 'valeur_risque', 'date_calcul')
+    search_fields = ('produit__designation',)
+    list_filter = ('statut', 'fournisseur')
+
+
+@admin.register(MoisCubeVentes)
+class MoisCubeVentesAdmin(admin.ModelAdmin):
+    list_display = ('mois', 'a_recalculer', 'derniere_vente', 'date_calcul')
+    list_filter = ('a_recalculer',)
+
+
+@admin.register(TauxHistorique)
+class TauxHistoriqueAdmin(admin.ModelAdmin):
+    list_display = ('code_devise', 'montant_fc', 'date_debut')
+    list_filter = ('code_devise',)
+
+
+@admin.register(Tache)
+class TacheAdmin(admin.ModelAdmin):
+    list_display = ('pk', 'type_tache', 'utilisateur', 'statut', 'progression', 'date_creation', 'date_fin', 'date_expiration')
+    list_filter = ('statut', 'type_tache')
+    readonly_fields = ('cle', 'fichier')
+
+
+class LigneClotureInline(admin.TabularInline):
+    model = LigneCloture
+    extra = 0
+    can_delete = False
+
+    def has_add_permission(self, request, obj=None):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+class CaisseClotureInline(LigneClotureInline):
+    model = CaisseCloture
+
+
+class AjustementClotureInline(LigneClotureInline):
+    model = AjustementCloture
+
+
+@admin.register(ClotureJournee)
+class ClotureJourneeAdmin(admin.ModelAdmin):
+    """Consultation seule : une clôture se crée depuis la page « Clôture journalière » et ne se modifie plus."""
+    list_display = ('jour', 'cloture_par', 'date_cloture')
+    date_hierarchy = 'jour'
+    inlines = [LigneClotureInline, CaisseClotureInline, AjustementClotureInline]
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
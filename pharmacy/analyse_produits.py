@@ -0,0 +1,140 @@
+"""
+Analyse des ventes par produit : meilleures ventes, classes ABC (Pareto) et stock dormant.
+
+Deux requêtes groupées (ventes de la période par produit, dernière vente par
+produit en stock) ; classements et parts cumulées sont calculés avec numpy.
+Le résultat est mis en cache par période : 24 h pour une période close (seul le
+stock dormant, qui dépend du jour, peut encore bouger), ANALYSE_PRODUITS_CACHE
+secondes pour celle qui inclut aujourd'hui.
+"""
+from datetime import datetime, time, timedelta
+
+import numpy as np
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import F, Max, Q, Sum
+from django.utils import timezone
+
+# Parts cumulées du chiffre d'affaires délimitant les classes A et B.
+SEUILS_ABC = (0.80, 0.95)
+NB_MEILLEURES_VENTES = 20
+
+
+def _bornes(date_debut, date_fin):
+    return (timezone.make_aware(datetime.combine(date_debut, time.min)),
+            timezone.make_aware(datetime.combine(date_fin + timedelta(days=1), time.min)))
+
+
+def classer_abc(chiffres):
+    """Classe ABC de chaque valeur de `chiffres` selon sa contribution cumulée au total.
+
+    Retourne (classes, parts, parts_cumulees) dans l'ordre d'entrée. Un produit est
+    en A tant que la part cumulée des produits qui le précèdent est sous le premier
+    seuil, en B sous le second, en C au-delà.
+    """
+    chiffres = np.asarray(chiffres, dtype=np.float64)
+    total = chiffres.sum()
+    if not len(chiffres) or total <= 0:
+        return np.full(len(chiffres), 'C'), np.zeros(len(chiffres)), np.zeros(len(chiffres))
+    ordre = np.argsort(-chiffres, kind='stable')
+    parts = chiffres / total
+    cumul_trie = np.cumsum(parts[ordre])
+    avant_trie = cumul_trie - parts[ordre]
+    classes_triees = np.select(
+        [avant_trie < SEUILS_ABC[0], avant_trie < SEUILS_ABC[1]], ['A', 'B'], default='C'
+    )
+    classes = np.empty(len(chiffres), dtype='<U1')
+    cumul = np.empty(len(chiffres))
+    classes[ordre] = classes_triees
+    cumul[ordre] = cumul_trie
+    return classes, parts, cumul
+
+
+def _rangs(valeurs):
+    """Rang (1 = plus grande valeur) de chaque élément."""
+    rangs = np.empty(len(valeurs), dtype=np.int64)
+    rangs[np.argsort(-np.asarray(valeurs, dtype=np.float64), kind='stable')] = np.arange(1, len(valeurs) + 1)
+    return rangs
+
+
+def calculer(date_debut, date_fin, jours_dormant):
+    from .models import LigneVente, Produit
+
+    debut, fin = _bornes(date_debut, date_fin)
+    ventes = list(
+        LigneVente.objects.filter(vente__date_vente__gte=debut, vente__date_vente__lt=fin)
+        .values('produit_id', 'produit__designation', 'produit__fournisseur__designation')
+        .annotate(quantite_vendue=Sum('quantite'), ca=Sum('montant_ligne'))
+        .order_by()
+    )
+    chiffres = [float(v['ca'] or 0) for v in ventes]
+    quantites = [v['quantite_vendue'] or 0 for v in ventes]
+    classes, parts, cumul = classer_abc(chiffres)
+    rangs_ca, rangs_qte = _rangs(chiffres), _rangs(quantites)
+
+    classement = [
+        {
+            'produit_id': v['produit_id'],
+            'designation': v['produit__designation'],
+            'fournisseur': v['produit__fournisseur__designation'],
+            'quantite': v['quantite_vendue'],
+            'ca': v['ca'],
+            'part': float(parts[i]) * 100,
+            'part_cumulee': float(cumul[i]) * 100,
+            'classe': str(classes[i]),
+            'rang_ca': int(rangs_ca[i]),
+            'rang_quantite': int(rangs_qte[i]),
+        }
+        for i, v in enumerate(ventes)
+    ]
+    classement.sort(key=lambda c: c['rang_ca'])
+    total_ca = sum(chiffres)
+    resume_abc = {}
+    for classe in 'ABC':
+        membres = [c for c in classement if c['classe'] == classe]
+        ca = sum(float(c['ca'] or 0) for c in membres)
+        resume_abc[classe] = {
+            'nb': len(membres),
+            'ca': ca,
+            'part_ca': ca / total_ca * 100 if total_ca else 0,
+            'part_produits': len(membres) / len(classement) * 100 if classement else 0,
+        }
+
+    limite = timezone.now() - timedelta(days=jours_dormant)
+    dormants = list(
+        Produit.objects.filter(quantite_stock__gt=0)
+        .filter(Q(date_creation__lt=limite) | Q(date_creation__isnull=True))
+        .annotate(derniere_vente=Max('lignevente__vente__date_vente'))
+        .filter(Q(derniere_vente__lt=limite) | Q(derniere_vente__isnull=True))
+        .annotate(valeur_stock=F('quantite_stock') * F('prix_achat'))
+        .values('code_produit', 'designation', 'fournisseur__designation', 'quantite_stock',
+                'prix_achat', 'valeur_stock', 'derniere_vente')
+        .order_by('-valeur_stock')
+    )
+
+    return {
+        'classement': classement,
+        'meilleures_quantites': sorted(classement, key=lambda c: c['rang_quantite'])[:NB_MEILLEURES_VENTES],
+        'meilleurs_ca': classement[:NB_MEILLEURES_VENTES],
+        'resume_abc': resume_abc,
+        'total_ca': total_ca,
+        'total_quantite': sum(quantites),
+        'dormants': dormants,
+        'valeur_dormante': sum(d['valeur_stock'] or 0 for d in dormants),
+        'calcule_le': timezone.now(),
+    }
+
+
+def analyse_periode(date_debut, date_fin, jours_dormant, actualiser=False):
+    """Résultat de `calculer`, servi depuis le cache quand il existe."""
+    cle = f"analyse_produits:{date_debut:%Y%m%d}:{date_fin:%Y%m%d}:{jours_dormant}"
+    if not actualiser:
+        resultat = cache.get(cle)
+        if resultat is not None:
+            return resultat
+    resultat = calculer(date_debut, date_fin, jours_dormant)
+    duree = getattr(settings, 'ANALYSE_PRODUITS_CACHE', 900)
+    if date_fin < timezone.localdate():
+        duree = 24 * 3600
+    cache.set(cle, resultat, duree)
+    return resultat
@@ -3,3 +3,8 @@ from django.apps import AppConfig
 
 class PharmacyConfig(AppConfig):
     name = 'pharmacy'
+
+    def ready(self):
+        from django.core.signals import request_finished
+        from . import audit
+        request_finished.connect(audit.vider, dispatch_uid='pharmacy_audit_vider')
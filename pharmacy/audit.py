@@ -0,0 +1,371 @@
+"""
+Écriture tamponnée du journal d'audit (Historique).
+
+En mode 'tampon', chaque entrée est d'abord ajoutée à un fichier spool local
+(une ligne JSON, survit à un plantage du processus) puis gardée en mémoire.
+Le tampon est écrit en base par bulk_create quand il atteint AUDIT_TAMPON_TAILLE,
+après AUDIT_TAMPON_INTERVALLE secondes, ou en fin de requête (signal
+request_finished, donc après l'envoi de la réponse).
+
+En mode 'synchrone' (tests, dépannage), chaque entrée est écrite immédiatement.
+Les spools laissés par un processus mort sont rejoués au premier vidage suivant
+ou via `manage.py vider_audit`.
+
+Recherche : `rechercher_historique` s'appuie sur l'index plein texte du champ
+`detail` (table FTS5 sous SQLite, index FULLTEXT sous MySQL, cf. migration 0021).
+
+Rétention : `archiver_historique` déplace les entrées anciennes vers des fichiers
+mensuels compressés (historique-AAAA-MM.jsonl.gz) puis les supprime de la table.
+"""
+import atexit
+import gzip
+import json
+import logging
+import os
+import threading
+from pathlib import Path
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import DatabaseError, connection, models, transaction
+from django.db.models.expressions import RawSQL
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+logger = logging.getLogger(__name__)
+
+
+if os.name == 'nt':
+    # Sous Windows, os.kill(pid, 0) envoie CTRL_C_EVENT au lieu de tester l'existence du processus.
+    import ctypes
+    from ctypes import wintypes
+
+    _kernel32 = ctypes.WinDLL('kernel32', use_last_error=True)
+    _kernel32.OpenProcess.argtypes = (wintypes.DWORD, wintypes.BOOL, wintypes.DWORD)
+    _kernel32.OpenProcess.restype = wintypes.HANDLE
+    _kernel32.GetExitCodeProcess.argtypes = (wintypes.HANDLE, ctypes.POINTER(wintypes.DWORD))
+    _kernel32.GetExitCodeProcess.restype = wintypes.BOOL
+    _kernel32.CloseHandle.argtypes = (wintypes.HANDLE,)
+    PROCESS_QUERY_LIMITED_INFORMATION = 0x1000
+    STILL_ACTIVE = 259
+    ERROR_ACCESS_DENIED = 5
+
+    def _pid_actif(pid):
+        poignee = _kernel32.OpenProcess(PROCESS_QUERY_LIMITED_INFORMATION, False, pid)
+        if not poignee:
+            # Accès refusé : le processus existe mais appartient à un autre compte.
+            return ctypes.get_last_error() == ERROR_ACCESS_DENIED
+        try:
+            code = wintypes.DWORD()
+            if not _kernel32.GetExitCodeProcess(poignee, ctypes.byref(code)):
+                return True
+            return code.value == STILL_ACTIVE
+        finally:
+            _kernel32.CloseHandle(poignee)
+else:
+    def _pid_actif(pid):
+        try:
+            os.kill(pid, 0)
+        except ProcessLookupError:
+            return False
+        except (PermissionError, OSError):
+            return True
+        return True
+
+
+class AuditWriter:
+    def __init__(self):
+        self._pid = None
+        self._initialiser()
+
+    def _initialiser(self):
+        self._pid = os.getpid()
+        self._lock = threading.Lock()
+        self._tampon = []
+        self._spool = None
+        self._segment = 0
+        self._minuterie = None
+        self._recupere = False
+
+    # ---------- configuration ----------
+
+    @property
+    def synchrone(self):
+        return getattr(settings, 'AUDIT_MODE', 'synchrone') != 'tampon'
+
+    @property
+    def taille(self):
+        return getattr(settings, 'AUDIT_TAMPON_TAILLE', 50)
+
+    @property
+    def intervalle(self):
+        return getattr(settings, 'AUDIT_TAMPON_INTERVALLE', 5)
+
+    @property
+    def dossier_spool(self):
+        return Path(getattr(settings, 'AUDIT_SPOOL_DIR', Path(settings.BASE_DIR) / 'var' / 'audit'))
+
+    # ---------- API ----------
+
+    def enregistrer(self, utilisateur, action, modele='', detail='', cible=None, donnees=None):
+        entree = {
+            'utilisateur_id': getattr(utilisateur, 'pk', None),
+            'action': action,
+            'modele': modele,
+            'detail': detail,
+            'date_action': timezone.now().isoformat(),
+            'cible_type': cible._meta.model_name if cible is not None else '',
+            'cible_id': cible.pk if cible is not None else None,
+            'donnees': donnees or {},
+        }
+        if self.synchrone:
+            from .models import Historique
+            Historique.objects.create(**self._champs(entree))
+            return
+
+        with self._lock:
+            if os.getpid() != self._pid:
+                # Processus forké (gunicorn...) : ne pas partager le tampon ni le spool du parent.
+                self._initialiser()
+            self._ecrire_spool(entree)
+            self._tampon.append(entree)
+            plein = len(self._tampon) >= self.taille
+            if not plein and self._minuterie is None:
+                self._minuterie = threading.Timer(self.intervalle, self._sur_minuterie)
+                self._minuterie.daemon = True
+                self._minuterie.start()
+        if plein:
+            self.vider()
+
+    def vider(self):
+        """Écrit le tampon en base. Retourne le nombre d'entrées écrites."""
+        if not self._recupere:
+            self._recupere = True
+            self.recuperer_spools()
+
+        with self._lock:
+            if not self._tampon or os.getpid() != self._pid:
+                return 0
+            entrees, self._tampon = self._tampon, []
+            segment = self._clore_spool()
+            if self._minuterie is not None:
+                self._minuterie.cancel()
+                self._minuterie = None
+
+        try:
+            self._inserer(entrees)
+        except DatabaseError:
+            logger.exception("Échec d'écriture du journal d'audit, %s entrée(s) conservée(s)", len(entrees))
+            with self._lock:
+                for entree in entrees:
+                    self._ecrire_spool(entree)
+                self._tampon[:0] = entrees
+            self._supprimer(segment)
+            return 0
+        self._supprimer(segment)
+        return len(entrees)
+
+    def recuperer_spools(self):
+        """Rejoue les spools laissés par des processus terminés."""
+        dossier = self.dossier_spool
+        if not dossier.is_dir():
+            return 0
+        total = 0
+        for chemin in sorted(dossier.glob('audit-*')):
+            try:
+                pid = int(chemin.name.split('-')[1].split('.')[0])
+            except (IndexError, ValueError):
+                continue
+            if pid == os.getpid() or _pid_actif(pid):
+                continue
+            # Le renommage est atomique : un seul processus récupère le fichier.
+            reclame = chemin.with_name(f"recup-{os.getpid()}-{chemin.name}")
+            try:
+                chemin.rename(reclame)
+            except OSError:
+                continue
+            total += self._rejouer(reclame)
+        for chemin in dossier.glob('recup-*'):
+            try:
+                pid = int(chemin.name.split('-')[1])
+            except (IndexError, ValueError):
+                continue
+            if pid != os.getpid() and not _pid_actif(pid):
+                total += self._rejouer(chemin)
+        return total
+
+    # ---------- interne ----------
+
+    def _champs(self, entree):
+        return {
+            'utilisateur_id': entree['utilisateur_id'],
+            'action': entree['action'],
+            'modele': entree['modele'],
+            'detail': entree['detail'],
+            'date_action': parse_datetime(entree['date_action']),
+            'cible_type': entree.get('cible_type', ''),
+            'cible_id': entree.get('cible_id'),
+            'donnees': entree.get('donnees') or {},
+        }
+
+    def _inserer(self, entrees):
+        from .models import Historique
+        Historique.objects.bulk_create(
+            [Historique(**self._champs(e)) for e in entrees], batch_size=500
+        )
+
+    def _rejouer(self, chemin):
+        with open(chemin, encoding='utf-8') as f:
+            entrees = []
+            for ligne in f:
+                try:
+                    entrees.append(json.loads(ligne))
+                except ValueError:
+                    # Dernière ligne tronquée par le plantage.
+                    continue
+        try:
+            self._inserer(entrees)
+        except DatabaseError:
+            logger.exception("Échec du rejeu du spool d'audit %s", chemin)
+            return 0
+        self._supprimer(chemin)
+        return len(entrees)
+
+    def _chemin_spool(self):
+        return self.dossier_spool / f"audit-{self._pid}.jsonl"
+
+    def _ecrire_spool(self, entree):
+        try:
+            if self._spool is None:
+                self.dossier_spool.mkdir(parents=True, exist_ok=True)
+                self._spool = open(self._chemin_spool(), 'a', encoding='utf-8')
+            self._spool.write(json.dumps(entree, ensure_ascii=False, cls=DjangoJSONEncoder) + '\n')
+            self._spool.flush()
+            if getattr(settings, 'AUDIT_SPOOL_FSYNC', False):
+                os.fsync(self._spool.fileno())
+        except OSError:
+            logger.exception("Spool d'audit indisponible, entrée conservée en mémoire uniquement")
+
+    def _clore_spool(self):
+        """Met de côté le spool correspondant au tampon en cours d'écriture."""
+        if self._spool is None:
+            return None
+        self._spool.close()
+        self._spool = None
+        self._segment += 1
+        segment = self.dossier_spool / f"audit-{self._pid}.{self._segment}.flush"
+        try:
+            self._chemin_spool().rename(segment)
+        except OSError:
+            return None
+        return segment
+
+    @staticmethod
+    def _supprimer(chemin):
+        if chemin is None:
+            return
+        try:
+            chemin.unlink()
+        except OSError:
+            pass
+
+    def _sur_minuterie(self):
+        with self._lock:
+            self._minuterie = None
+        try:
+            self.vider()
+        finally:
+            connection.close()
+
+
+writer = AuditWriter()
+
+
+def journaliser(utilisateur, action, modele='', detail='', cible=None, donnees=None):
+    writer.enregistrer(utilisateur, action, modele, detail, cible=cible, donnees=donnees)
+
+
+def vider(**kwargs):
+    return writer.vider()
+
+
+CLE_CACHE_MODULES = 'historique_modules'
+
+
+def modules_historique():
+    """Liste des modules (valeurs distinctes de `modele`), mise en cache."""
+    from .models import Historique
+
+    def calculer():
+        return list(
+            Historique.objects.exclude(modele='').order_by('modele')
+            .values_list('modele', flat=True).distinct()
+        )
+    return cache.get_or_set(CLE_CACHE_MODULES, calculer, getattr(settings, 'HISTORIQUE_MODULES_CACHE', 600))
+
+
+TABLE_FTS_SQLITE = 'pharmacy_historique_fts'
+
+
+def rechercher_historique(qs, terme):
+    """Filtre un queryset d'Historique sur les mots de `terme` (tous requis, préfixes acceptés)."""
+    mots = [m for m in terme.split() if m.strip('"*+-<>()~@')]
+    if not mots:
+        return qs
+    vendor = connection.vendor
+    if vendor == 'sqlite':
+        requete = ' '.join('"{}"*'.format(m.replace('"', '""')) for m in mots)
+        return qs.filter(pk__in=RawSQL(
+            f"SELECT rowid FROM {TABLE_FTS_SQLITE} WHERE {TABLE_FTS_SQLITE} MATCH %s", [requete]
+        ))
+    if vendor == 'mysql':
+        requete = ' '.join('+{}*'.format(m.strip('"*+-<>()~@')) for m in mots)
+        return qs.alias(pertinence=RawSQL(
+            "MATCH(pharmacy_historique.detail) AGAINST (%s IN BOOLEAN MODE)", [requete],
+            output_field=models.FloatField(),
+        )).filter(pertinence__gt=0)
+    for mot in mots:
+        qs = qs.filter(detail__icontains=mot)
+    return qs
+
+
+def archiver_historique(date_limite, dossier=None, taille_lot=2000):
+    """Archive puis supprime les entrées antérieures à `date_limite`.
+
+    Traitement par lots de clés croissantes : chaque lot est ajouté aux archives
+    mensuelles (membres gzip concaténés) avant d'être supprimé. Retourne
+    {'AAAA-MM': nb_entrées}.
+    """
+    from .models import Historique
+    writer.vider()
+    dossier = Path(dossier or getattr(settings, 'HISTORIQUE_ARCHIVE_DIR',
+                                      Path(settings.BASE_DIR) / 'var' / 'archives' / 'historique'))
+    dossier.mkdir(parents=True, exist_ok=True)
+    champs = ('id', 'date_action', 'utilisateur_id', 'utilisateur__username', 'action', 'modele', 'detail',
+              'cible_type', 'cible_id', 'donnees')
+    anciennes = Historique.objects.filter(date_action__lt=date_limite).order_by('pk')
+    compteurs = {}
+    dernier_pk = 0
+    while True:
+        lot = list(anciennes.filter(pk__gt=dernier_pk).values(*champs)[:taille_lot])
+        if not lot:
+            break
+        par_mois = {}
+        for entree in lot:
+            mois = timezone.localtime(entree['date_action']).strftime('%Y-%m')
+            entree['date_action'] = entree['date_action'].isoformat()
+            par_mois.setdefault(mois, []).append(json.dumps(entree, ensure_ascii=False, cls=DjangoJSONEncoder))
+        for mois, lignes in par_mois.items():
+            with gzip.open(dossier / f"historique-{mois}.jsonl.gz", 'at', encoding='utf-8') as f:
+                f.write('\n'.join(lignes) + '\n')
+            compteurs[mois] = compteurs.get(mois, 0) + len(lignes)
+        dernier_pk = lot[-1]['id']
+        with transaction.atomic():
+            Historique.objects.filter(pk__in=[e['id'] for e in lot]).delete()
+    if compteurs:
+        cache.delete(CLE_CACHE_MODULES)
+    return compteurs
+
+
+atexit.register(vider)
@@ -0,0 +1,117 @@
+"""
+Cache disque des PDF déjà rendus (factures, inventaires validés).
+
+Un document est rangé sous un nom qui contient son identifiant et sa version
+(`Vente.version`, incrémentée à chaque enregistrement de la vente, donc après
+toute modification de ses lignes ; date de validation pour un inventaire) :
+une modification change le nom, l'ancienne version est supprimée à
+l'écriture de la nouvelle et n'est jamais relue.
+
+Éviction LRU à la taille : chaque lecture touche la date de modification du
+fichier ; quand le dossier dépasse PDF_CACHE_TAILLE_MAX octets, les fichiers
+les moins récemment servis sont supprimés jusqu'à 90 % de la limite.
+
+Les réponses portent ETag et Last-Modified ; `non_modifie` répond 304 à une
+requête conditionnelle dont la version n'a pas changé, sans lire le disque.
+"""
+import logging
+import os
+from pathlib import Path
+
+from django.conf import settings
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+
+logger = logging.getLogger(__name__)
+
+
+def _dossier():
+    dossier = Path(settings.PDF_CACHE_DIR)
+    dossier.mkdir(parents=True, exist_ok=True)
+    return dossier
+
+
+def nom_document(type_document, pk, version):
+    return f"{type_document}-{pk}-{version}.pdf"
+
+
+def lire(nom):
+    """Contenu du PDF en cache, ou None. Marque le fichier comme récemment utilisé."""
+    chemin = Path(settings.PDF_CACHE_DIR) / nom
+    try:
+        contenu = chemin.read_bytes()
+        os.utime(chemin)
+    except FileNotFoundError:
+        return None
+    return contenu
+
+
+def ecrire(nom, contenu):
+    """Range un PDF rendu, retire les autres versions du même document puis applique la limite de taille."""
+    dossier = _dossier()
+    chemin = dossier / nom
+    temporaire = chemin.with_name(f"{nom}.{os.getpid()}.part")
+    try:
+        temporaire.write_bytes(contenu)
+        os.replace(temporaire, chemin)
+    except OSError:
+        logger.exception("Écriture impossible dans le cache PDF (%s)", nom)
+        return
+    prefixe = nom.rsplit('-', 1)[0] + '-'
+    for ancien in dossier.glob(f"{prefixe}*.pdf"):
+        if ancien.name != nom:
+            _supprimer(ancien)
+    evincer()
+
+
+def _supprimer(chemin):
+    try:
+        chemin.unlink()
+    except FileNotFoundError:
+        pass
+
+
+def evincer(taille_max=None):
+    """Supprime les PDF les moins récemment servis tant que le cache dépasse sa taille maximale."""
+    taille_max = taille_max if taille_max is not None else settings.PDF_CACHE_TAILLE_MAX
+    fichiers = []
+    total = 0
+    with os.scandir(_dossier()) as entrees:
+        for entree in entrees:
+            if not entree.name.endswith('.pdf'):
+                continue
+            try:
+                stat = entree.stat()
+            except FileNotFoundError:
+                continue
+            fichiers.append((stat.st_mtime, stat.st_size, entree.path))
+            total += stat.st_size
+    if total <= taille_max:
+        return 0
+    nb = 0
+    cible = taille_max * 0.9
+    for _, taille, chemin in sorted(fichiers):
+        if total <= cible:
+            break
+        _supprimer(Path(chemin))
+        total -= taille
+        nb += 1
+    return nb
+
+
+def non_modifie(request, etag, derniere_modif):
+    """Réponse 304 si le client possède déjà cette version, sinon None."""
+    return get_conditional_response(
+        request, etag=etag, last_modified=int(derniere_modif.timestamp()) if derniere_modif else None,
+    )
+
+
+def reponse_pdf(contenu, nom_fichier, etag, derniere_modif):
+    response = HttpResponse(contenu, content_type='application/pdf')
+    response['Content-Disposition'] = f'filename="{nom_fichier}"'
+    response['ETag'] = etag
+    if derniere_modif:
+        response['Last-Modified'] = http_date(derniere_modif.timestamp())
+    response['Cache-Control'] = 'private, no-cache'
+    return response
@@ -1,13 +1,16 @@
 import openpyxl
+from copy import copy
+from itertools import chain, islice
+from openpyxl.cell import WriteOnlyCell
 from openpyxl.styles import Font, PatternFill, Alignment, Border, Side
 from openpyxl.utils import get_column_letter
 from django.shortcuts import redirect
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
-from django.http import HttpResponse
 from datetime import datetime
 from decimal import Decimal, InvalidOperation
-from .models import Fournisseur, Produit, Client, Vente, LigneVente
+from .models import Fournisseur, Produit, Client, Vente, LigneVente, Lot, Taux
+from .taches import fichier_temporaire, lancer
 
 
 def admin_required(view_func):
@@ -33,114 +36,180 @@ THIN_BORDER = Border(
     top=Side(style='thin'), bottom=Side(style='thin')
 )
 
+# Lignes lues par requête (QuerySet.iterator) et lignes servant à estimer la largeur des colonnes.
+TAILLE_LOT = 2000
+ECHANTILLON_LARGEUR = 200
 
-def style_header(ws, col_count):
-    for col in range(1, col_count + 1):
-        cell = ws.cell(row=1, column=col)
-        cell.font = HEADER_FONT
-        cell.fill = HEADER_FILL
-        cell.alignment = HEADER_ALIGNMENT
-        cell.border = THIN_BORDER
 
+# ===================== ÉCRITURE EN FLUX =====================
+# Les classeurs sont ouverts en mode write-only : chaque ligne est écrite sur
+# disque dès qu'elle est ajoutée, la mémoire ne dépend pas du nombre de lignes.
+# Les styles sont calculés une fois par feuille puis copiés sur chaque cellule ;
+# les largeurs de colonnes (à fixer avant la première ligne) sont estimées sur
+# les ECHANTILLON_LARGEUR premières lignes.
 
-def auto_width(ws):
-    for col in ws.columns:
-        max_len = 0
-        col_letter = get_column_letter(col[0].column)
-        for cell in col:
-            if cell.value:
-                max_len = max(max_len, len(str(cell.value)))
-            cell.border = THIN_BORDER
-        ws.column_dimensions[col_letter].width = min(max_len + 4, 40)
+def _style_de(ws, **attributs):
+    """Style (tableau d'indices du classeur) d'une cellule portant `attributs`, à copier sur d'autres cellules."""
+    modele = WriteOnlyCell(ws)
+    for nom, valeur in attributs.items():
+        setattr(modele, nom, valeur)
+    return modele._style
 
 
-def make_response(wb, filename):
-    response = HttpResponse(content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
-    response['Content-Disposition'] = f'attachment; filename="{filename}"'
-    wb.save(response)
-    return response
+def _cellules(ws, valeurs, style):
+    for valeur in valeurs:
+        cellule = WriteOnlyCell(ws, valeur)
+        cellule._style = copy(style)
+        yield cellule
+
+
+def ecrire_feuille(wb, titre, entetes, lignes, progression=None, nb_lignes=None, plage=(0, 100)):
+    """Ajoute au classeur write-only `wb` une feuille `titre` : en-tête stylé puis `lignes` (itérable de listes).
+
+    `progression` est appelée tous les TAILLE_LOT lignes, entre plage[0] et plage[1] % si `nb_lignes` est connu.
+    """
+    ws = wb.create_sheet(titre)
+    lignes = iter(lignes)
+    echantillon = list(islice(lignes, ECHANTILLON_LARGEUR))
+    for i, entete in enumerate(entetes):
+        longueur = max([len(str(entete))] + [len(str(l[i])) for l in echantillon if l[i] is not None])
+        ws.column_dimensions[get_column_letter(i + 1)].width = min(longueur + 4, 40)
+
+    style_entete = _style_de(ws, font=HEADER_FONT, fill=HEADER_FILL, alignment=HEADER_ALIGNMENT, border=THIN_BORDER)
+    style_cellule = _style_de(ws, border=THIN_BORDER)
+    ws.append(list(_cellules(ws, entetes, style_entete)))
+    for n, ligne in enumerate(chain(echantillon, lignes), start=1):
+        ws.append(list(_cellules(ws, ligne, style_cellule)))
+        if progression and nb_lignes and n % TAILLE_LOT == 0:
+            progression(plage[0] + (plage[1] - plage[0]) * min(n, nb_lignes) // nb_lignes)
+    return ws
+
+
+def classeur_en_fichier(wb):
+    """Enregistre le classeur dans un fichier temporaire de la file de tâches et retourne son chemin."""
+    chemin = fichier_temporaire('.xlsx')
+    wb.save(chemin)
+    return chemin
 
 
 # ===================== EXPORTS =====================
+# Les exports passent par la file de tâches (pharmacy/taches.py) : la vue met en
+# file, le worker appelle le générateur document_* correspondant. Le fichier est
+# écrit sur disque puis servi par morceaux, sans jamais être chargé en mémoire.
+
+def document_fournisseurs(parametres, utilisateur, progression):
+    wb = openpyxl.Workbook(write_only=True)
+    lignes = (
+        [code, designation, float(marge), delai]
+        for code, designation, marge, delai in Fournisseur.objects.values_list(
+            'code_fournisseur', 'designation', 'marge_beneficiaire', 'delai_livraison',
+        ).iterator(chunk_size=TAILLE_LOT)
+    )
+    ecrire_feuille(wb, 'Fournisseurs', ['Code', 'Désignation', 'Marge Bénéficiaire (%)', 'Délai Livraison (jours)'], lignes)
+    return 'fournisseurs.xlsx', classeur_en_fichier(wb)
+
 
 @admin_required
 def export_fournisseurs(request):
-    wb = openpyxl.Workbook()
-    ws = wb.active
-    ws.title = 'Fournisseurs'
-    ws.append(['Code', 'Désignation', 'Marge Bénéficiaire (%)'])
-    style_header(ws, 3)
-    for f in Fournisseur.objects.all():
-        ws.append([f.code_fournisseur, f.designation, float(f.marge_beneficiaire)])
-    auto_width(ws)
-    return make_response(wb, 'fournisseurs.xlsx')
+    return lancer(request, 'export_fournisseurs')
 
 
-@admin_required
-def export_produits(request):
-    wb = openpyxl.Workbook()
-    ws = wb.active
-    ws.title = 'Produits'
-    ws.append(['Code', 'Désignation', 'Prix Achat', 'Qté Initiale', 'Qté Stock',
-               'Qté Alerte', 'Jours Alerte Exp.', 'Fournisseur', 'Date Expiration', 'Prix Vente'])
-    style_header(ws, 10)
-    for p in Produit.objects.select_related('fournisseur').all():
-        ws.append([
+def document_produits(parametres, utilisateur, progression):
+    taux_usd = Taux.objects.filter(code_devise='USD').first()
+    produits = Produit.objects.select_related('fournisseur')
+    lignes = (
+        [
             p.code_produit, p.designation, float(p.prix_achat),
             p.quantite_initiale, p.quantite_stock, p.quantite_alerte,
             p.jours_alerte_expiration, p.fournisseur.designation,
             p.date_expiration.strftime('%d/%m/%Y') if p.date_expiration else '',
-            float(p.prix_vente)
-        ])
-    auto_width(ws)
-    return make_response(wb, 'produits.xlsx')
+            float(p.prix_vente_au_taux(taux_usd))
+        ]
+        for p in produits.iterator(chunk_size=TAILLE_LOT)
+    )
+    wb = openpyxl.Workbook(write_only=True)
+    ecrire_feuille(
+        wb, 'Produits',
+        ['Code', 'Désignation', 'Prix Achat', 'Qté Initiale', 'Qté Stock',
+         'Qté Alerte', 'Jours Alerte Exp.', 'Fournisseur', 'Date Expiration', 'Prix Vente'],
+        lignes, progression, produits.count(), (5, 95),
+    )
+    return 'produits.xlsx', classeur_en_fichier(wb)
 
 
 @admin_required
-def export_clients(request):
-    wb = openpyxl.Workbook()
-    ws = wb.active
-    ws.title = 'Clients'
-    ws.append(['Code', 'Nom', 'Téléphone', 'Adresse'])
-    style_header(ws, 4)
-    for c in Client.objects.all():
-        ws.append([c.code_client, c.nom, c.telephone, c.adresse])
-    auto_width(ws)
-    return make_response(wb, 'clients.xlsx')
+def export_produits(request):
+    return lancer(request, 'export_produits')
+
+
+def document_clients(parametres, utilisateur, progression):
+    wb = openpyxl.Workbook(write_only=True)
+    lignes = (
+        list(c) for c in Client.objects.values_list('code_client', 'nom', 'telephone', 'adresse').iterator(chunk_size=TAILLE_LOT)
+    )
+    ecrire_feuille(wb, 'Clients', ['Code', 'Nom', 'Téléphone', 'Adresse'], lignes)
+    return 'clients.xlsx', classeur_en_fichier(wb)
 
 
 @admin_required
-def export_ventes(request):
-    wb = openpyxl.Workbook()
+def export_clients(request):
+    return lancer(request, 'export_clients')
+
+
+def document_ventes(parametres, utilisateur, progression):
+    from .taux import serie_taux
+    avec_usd = parametres.get('usd', False)
+    serie_usd = serie_taux('USD') if avec_usd else None
+    types_vente = dict(Vente.TYPE_CHOICES)
+    wb = openpyxl.Workbook(write_only=True)
 
     # Feuille 1 : Ventes
-    ws = wb.active
-    ws.title = 'Ventes'
-    ws.append(['Code', 'Date', 'Client', 'Type', 'Vendeur', 'Montant Total'])
-    style_header(ws, 6)
-    for v in Vente.objects.select_related('client', 'vendeur').all():
-        ws.append([
-            v.code_vente,
-            v.date_vente.strftime('%d/%m/%Y %H:%M'),
-            str(v.client) if v.client else 'Client Anonyme',
-            v.get_type_vente_display(),
-            v.vendeur.get_full_name() or v.vendeur.username,
-            float(v.montant_total)
-        ])
-    auto_width(ws)
+    entetes = ['Code', 'Date', 'Client', 'Type', 'Vendeur', 'Montant Total']
+    if avec_usd:
+        entetes += ['Taux USD (FC)', 'Équivalent USD']
+    ventes = Vente.objects.values_list(
+        'code_vente', 'date_vente', 'client__nom', 'type_vente',
+        'vendeur__first_name', 'vendeur__last_name', 'vendeur__username', 'montant_total',
+    )
+
+    def lignes_ventes():
+        for code, date_vente, client, type_vente, prenom, nom, username, montant in ventes.iterator(chunk_size=TAILLE_LOT):
+            ligne = [
+                code,
+                date_vente.strftime('%d/%m/%Y %H:%M'),
+                client or 'Client Anonyme',
+                types_vente.get(type_vente, type_vente),
+                f"{prenom} {nom}".strip() or username,
+                float(montant)
+            ]
+            if avec_usd:
+                taux = serie_usd.au(date_vente)
+                ligne += [float(taux) if taux else None,
+                          float(montant / taux) if taux else None]
+            yield ligne
+
+    ecrire_feuille(wb, 'Ventes', entetes, lignes_ventes(), progression, ventes.count(), (5, 30))
 
     # Feuille 2 : Lignes de vente
-    ws2 = wb.create_sheet('Lignes de Vente')
-    ws2.append(['Code Vente', 'Produit', 'Quantité', 'Prix Unitaire', 'Montant Ligne'])
-    style_header(ws2, 5)
-    for l in LigneVente.objects.select_related('vente', 'produit').all():
-        ws2.append([
-            l.vente.code_vente, l.produit.designation,
-            l.quantite, float(l.prix_unitaire), float(l.montant_ligne)
-        ])
-    auto_width(ws2)
+    lignes_vente = LigneVente.objects.order_by('pk').values_list(
+        'vente_id', 'produit__designation', 'quantite', 'prix_unitaire', 'montant_ligne',
+    )
+    lignes = (
+        [vente_id, designation, quantite, float(prix), float(montant)]
+        for vente_id, designation, quantite, prix, montant in lignes_vente.iterator(chunk_size=TAILLE_LOT)
+    )
+    ecrire_feuille(
+        wb, 'Lignes de Vente', ['Code Vente', 'Produit', 'Quantité', 'Prix Unitaire', 'Montant Ligne'],
+        lignes, progression, lignes_vente.count(), (30, 95),
+    )
+
+    return 'ventes.xlsx', classeur_en_fichier(wb)
+
 
-    return make_response(wb, 'ventes.xlsx')
+@admin_required
+def export_ventes(request):
+    """Export des ventes ; `?usd=1` ajoute l'équivalent USD au taux en vigueur à la date de chaque vente."""
+    return lancer(request, 'export_ventes', {'usd': request.GET.get('usd') == '1'})
 
 
 # ===================== IMPORTS =====================
@@ -154,9 +223,12 @@ def import_fournisseurs(request):
             count = 0
             for row in ws.iter_rows(min_row=2, values_only=True):
                 if row[1] and row[2] is not None:
+                    defaults = {'marge_beneficiaire': Decimal(str(row[2]))}
+                    if len(row) > 3 and row[3]:
+                        defaults['delai_livraison'] = int(row[3])
                     Fournisseur.objects.get_or_create(
                         designation=str(row[1]).strip(),
-                        defaults={'marge_beneficiaire': Decimal(str(row[2]))}
+                        defaults=defaults
                     )
                     count += 1
             messages.success(request, f"{count} fournisseur(s) traité(s).")
@@ -209,7 +281,7 @@ def import_produits(request):
                     else:
                         date_exp = date_exp_raw
 
-                    Produit.objects.get_or_create(
+                    produit, cree = Produit.objects.get_or_create(
                         designation=designation,
                         defaults={
                             'prix_achat': prix_achat,
@@ -222,6 +294,8 @@ def import_produits(request):
                             'prix_vente': prix_vente or prix_achat * Decimal('1.2'),  # 20% marge par défaut
                         }
                     )
+                    if cree:
+                        Lot.ajuster(produit, produit.quantite_stock)
                     count += 1
                 except (ValueError, InvalidOperation, TypeError):
                     errors += 1
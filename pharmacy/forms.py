@@ -1,6 +1,6 @@
 from django import forms
 from django.forms import inlineformset_factory
-from .models import Taux, Fournisseur, Produit, Client, Vente, LigneVente
+from .models import Taux, Fournisseur, Produit, Client, Vente, LigneVente, Reception
 
 
 class TauxForm(forms.ModelForm):
@@ -24,18 +24,20 @@ class TauxForm(forms.ModelForm):
 class FournisseurForm(forms.ModelForm):
     class Meta:
         model = Fournisseur
-        fields = ['designation', 'marge_beneficiaire']
+        fields = ['designation', 'marge_beneficiaire', 'delai_livraison']
 
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
         placeholders = {
             'designation': 'Désignation Fournisseur',
             'marge_beneficiaire': 'Marge Bénéficiaire (%)',
+            'delai_livraison': 'Délai de livraison (jours)',
         }
         for field, ph in placeholders.items():
             self.fields[field].widget.attrs['placeholder'] = ph
             self.fields[field].label = ''
             self.fields[field].initial = None
+        self.fields['delai_livraison'].initial = 7
 
 
 class ProduitForm(forms.ModelForm):
@@ -181,3 +183,26 @@ class LigneVenteForm(forms.ModelForm):
         self.fields['quantite'].label = ''
         self.fields['quantite'].widget.attrs['placeholder'] = 'Quantité'
         self.fields['quantite'].initial = None
+
+
+class ReceptionForm(forms.ModelForm):
+    class Meta:
+        model = Reception
+        fields = ['fournisseur', 'numero_bl', 'date_reception', 'maj_prix_achat', 'observation']
+        widgets = {
+            'date_reception': forms.DateInput(attrs={'type': 'date'}, format='%Y-%m-%d'),
+            'observation': forms.Textarea(attrs={'rows': 2}),
+        }
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.fields['fournisseur'].empty_label = '-- Fournisseur --'
+        for nom, champ in self.fields.items():
+            if nom == 'maj_prix_achat':
+                champ.widget.attrs['class'] = 'form-check-input'
+            elif nom == 'fournisseur':
+                champ.widget.attrs['class'] = 'form-select'
+            else:
+                champ.widget.attrs['class'] = 'form-control'
+        self.fields['numero_bl'].widget.attrs['placeholder'] = 'N° bon de livraison (optionnel)'
+        self.fields['observation'].widget.attrs['placeholder'] = 'Observation (optionnel)'
@@ -0,0 +1,25 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from pharmacy.audit import archiver_historique
+
+
+class Command(BaseCommand):
+    help = "Archive les entrées d'historique anciennes dans des fichiers mensuels compressés."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--jours', type=int, default=getattr(settings, 'HISTORIQUE_RETENTION_JOURS', 365),
+            help="Durée de conservation en base (jours).",
+        )
+        parser.add_argument('--dossier', default=None, help="Dossier des archives.")
+
+    def handle(self, *args, **options):
+        limite = timezone.now() - timedelta(days=options['jours'])
+        compteurs = archiver_historique(limite, dossier=options['dossier'])
+        for mois, nb in sorted(compteurs.items()):
+            self.stdout.write(f"{mois} : {nb} entrée(s) archivée(s)")
+        self.stdout.write(self.style.SUCCESS(f"{sum(compteurs.values())} entrée(s) archivée(s) au total."))
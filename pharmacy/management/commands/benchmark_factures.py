@@ -0,0 +1,50 @@
+import statistics
+import time
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from pharmacy.factures import MOTEURS, rendre_facture
+from pharmacy.models import LigneVente, Produit, Vente
+
+
+def vente_fictive(nb_lignes):
+    """Vente et lignes en mémoire (rien n'est enregistré en base)."""
+    vendeur = get_user_model()(username='benchmark', first_name='Caisse', last_name='Test')
+    vente = Vente(code_vente=nb_lignes, vendeur=vendeur, date_vente=timezone.now())
+    lignes = []
+    for i in range(nb_lignes):
+        produit = Produit(designation=f"Paracetamol 500mg {i + 1}")
+        ligne = LigneVente(vente=vente, produit=produit, quantite=(i % 5) + 1, prix_unitaire=Decimal('1250.00'))
+        ligne.montant_ligne = ligne.quantite * ligne.prix_unitaire
+        lignes.append(ligne)
+    vente.montant_total = sum((l.montant_ligne for l in lignes), Decimal('0'))
+    return vente, lignes
+
+
+class Command(BaseCommand):
+    help = "Compare les moteurs de facture PDF ('html' et 'canvas') sur des ventes de 1, 15 et 100 lignes."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repetitions', type=int, default=10)
+        parser.add_argument('--lignes', type=int, nargs='+', default=[1, 15, 100])
+
+    def handle(self, *args, **options):
+        repetitions = max(options['repetitions'], 1)
+        self.stdout.write(f"{'Lignes':>7} {'Moteur':>8} {'Médiane (ms)':>13} {'Min (ms)':>9} {'Taille (Ko)':>12}")
+        for nb_lignes in options['lignes']:
+            vente, lignes = vente_fictive(nb_lignes)
+            for moteur in MOTEURS:
+                rendre_facture(vente, lignes, moteur)  # chauffe : gabarit compilé, polices chargées
+                durees = []
+                for _ in range(repetitions):
+                    debut = time.perf_counter()
+                    contenu = rendre_facture(vente, lignes, moteur)
+                    durees.append((time.perf_counter() - debut) * 1000)
+                self.stdout.write(
+                    f"{nb_lignes:>7} {moteur:>8} {statistics.median(durees):>13.1f} "
+                    f"{min(durees):>9.1f} {len(contenu) / 1024:>12.1f}"
+                )
+        self.stdout.write(self.style.SUCCESS("Benchmark terminé."))
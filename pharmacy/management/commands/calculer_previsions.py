@@ -0,0 +1,16 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from pharmacy.prevision import rafraichir_previsions
+
+
+class Command(BaseCommand):
+    help = "Recalcule les prévisions de ventes journalières de tout le catalogue. À planifier chaque nuit."
+
+    def handle(self, *args, **options):
+        debut = time.perf_counter()
+        nb = rafraichir_previsions()
+        self.stdout.write(self.style.SUCCESS(
+            f"{nb} produit(s) mis à jour en {time.perf_counter() - debut:.1f} s."
+        ))
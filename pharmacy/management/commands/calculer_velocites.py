@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from pharmacy.models import VelociteProduit
+
+
+class Command(BaseCommand):
+    help = "Recalcule les vitesses de vente (7/30/90 jours) et les seuils de réapprovisionnement. À planifier chaque nuit."
+
+    def handle(self, *args, **options):
+        nb = VelociteProduit.rafraichir()
+        self.stdout.write(self.style.SUCCESS(f"{nb} produit(s) mis à jour."))
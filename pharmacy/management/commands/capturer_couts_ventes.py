@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Max, Min, OuterRef, Subquery
+
+from pharmacy.models import LigneVente, Produit
+
+
+class Command(BaseCommand):
+    help = ("Renseigne le prix d'achat et le fournisseur des anciennes lignes de vente, par lots. "
+            "Le prix d'achat d'origine n'étant pas connu, le prix d'achat actuel du produit est utilisé.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--taille-lot', type=int, default=5000, help="Lignes par lot (défaut : 5000).")
+
+    def handle(self, *args, **options):
+        taille = options['taille_lot']
+        produit = Produit.objects.filter(pk=OuterRef('produit_id'))
+        a_traiter = LigneVente.objects.filter(prix_achat_unitaire__isnull=True)
+        bornes = a_traiter.aggregate(premier=Min('pk'), dernier=Max('pk'))
+        if bornes['premier'] is None:
+            self.stdout.write(self.style.SUCCESS("Aucune ligne de vente à compléter."))
+            return
+        debut, dernier = bornes['premier'] - 1, bornes['dernier']
+        total = 0
+        # Lots par plages de clés : chaque UPDATE reste court et verrouille peu de lignes.
+        while debut < dernier:
+            with transaction.atomic():
+                total += a_traiter.filter(pk__gt=debut, pk__lte=debut + taille).update(
+                    prix_achat_unitaire=Subquery(produit.values('prix_achat')[:1]),
+                    fournisseur_id=Subquery(produit.values('fournisseur_id')[:1]),
+                )
+            debut += taille
+            self.stdout.write(f"  … {min(debut, dernier)} / {dernier}", ending='\r')
+        self.stdout.write('')
+        self.stdout.write(self.style.SUCCESS(f"{total} ligne(s) de vente complétée(s)."))
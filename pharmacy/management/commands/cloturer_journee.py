@@ -0,0 +1,30 @@
+from datetime import date, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from accounts.models import User
+from pharmacy.models import ClotureImmuable, ClotureJournee
+
+
+class Command(BaseCommand):
+    help = "Clôture une journée de vente (rapport Z) sans comptage de caisse ; la veille par défaut."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--date', help="Journée à clôturer (AAAA-MM-JJ).")
+        parser.add_argument('--utilisateur', required=True, help="Nom d'utilisateur enregistré comme auteur de la clôture.")
+
+    def handle(self, *args, **options):
+        try:
+            jour = date.fromisoformat(options['date']) if options['date'] else timezone.localdate() - timedelta(days=1)
+            utilisateur = User.objects.get(username=options['utilisateur'])
+        except ValueError:
+            raise CommandError("Date invalide (format AAAA-MM-JJ).")
+        except User.DoesNotExist:
+            raise CommandError(f"Utilisateur inconnu : {options['utilisateur']}")
+        try:
+            cloture = ClotureJournee.cloturer(jour, utilisateur, observation="Clôture automatique")
+        except ClotureImmuable as e:
+            self.stdout.write(str(e))
+            return
+        self.stdout.write(self.style.SUCCESS(f"{cloture} : {cloture.lignes.count()} ligne(s) figée(s)."))
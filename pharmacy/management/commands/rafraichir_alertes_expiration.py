@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from pharmacy.models import AlerteExpiration
+
+
+class Command(BaseCommand):
+    help = "Recalcule la table des produits expirés ou proches de l'expiration. À planifier chaque nuit."
+
+    def handle(self, *args, **options):
+        nb = AlerteExpiration.rafraichir()
+        self.stdout.write(self.style.SUCCESS(f"{nb} produit(s) en alerte d'expiration."))
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from pharmacy.models import CubeVentes
+
+
+class Command(BaseCommand):
+    help = "Recalcule le cube des ventes pour les mois modifiés depuis le dernier passage."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--complet', action='store_true', help="Reconstruire tout l'historique.")
+
+    def handle(self, *args, **options):
+        nb = CubeVentes.rafraichir(complet=options['complet'])
+        self.stdout.write(self.style.SUCCESS(f"{nb} mois recalculé(s)."))
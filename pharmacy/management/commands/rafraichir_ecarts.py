@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from pharmacy.models import SuiviEcartProduit
+
+
+class Command(BaseCommand):
+    help = "Reconstruit l'historique cumulé des écarts d'inventaire par produit."
+
+    def handle(self, *args, **options):
+        nb = SuiviEcartProduit.rafraichir()
+        self.stdout.write(self.style.SUCCESS(f"{nb} produit(s) mis à jour."))
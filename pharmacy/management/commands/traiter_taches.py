@@ -0,0 +1,40 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from pharmacy import taches
+from pharmacy.models import Tache
+
+
+class Command(BaseCommand):
+    help = ("Worker des tâches de fond : produit les PDF et exports Excel mis en file "
+            "et supprime les fichiers expirés. À lancer en service (ou --une-fois depuis cron).")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--une-fois', action='store_true',
+                            help="Traite les tâches en attente puis s'arrête.")
+
+    def handle(self, *args, **options):
+        une_fois = options['une_fois']
+        nb_purgees = taches.purger()
+        if nb_purgees:
+            self.stdout.write(f"{nb_purgees} tâche(s) expirée(s) supprimée(s).")
+        derniere_purge = time.monotonic()
+        nb_traitees = 0
+        while True:
+            close_old_connections()
+            tache = Tache.prendre()
+            if tache is not None:
+                ok = taches.executer(tache)
+                nb_traitees += 1
+                self.stdout.write(f"Tâche #{tache.pk} ({tache.type_tache}) : {'terminée' if ok else 'échec'}.")
+                continue
+            if une_fois:
+                break
+            if time.monotonic() - derniere_purge > 3600:
+                taches.purger()
+                derniere_purge = time.monotonic()
+            time.sleep(settings.TACHES_INTERVALLE)
+        self.stdout.write(self.style.SUCCESS(f"{nb_traitees} tâche(s) traitée(s)."))
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from pharmacy import audit
+
+
+class Command(BaseCommand):
+    help = "Rejoue en base les entrées d'audit restées dans les spools locaux (processus arrêtés)."
+
+    def handle(self, *args, **options):
+        nb = audit.writer.recuperer_spools()
+        self.stdout.write(self.style.SUCCESS(f"{nb} entrée(s) d'audit récupérée(s)."))
@@ -0,0 +1,61 @@
+# Generated by Django 6.0.2 on 2026-10-19 09:00
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pharmacy', '0016_produit_date_creation'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='inventaire',
+            name='seuil_recomptage',
+            field=models.PositiveIntegerField(default=0, help_text='Un écart absolu supérieur ou égal déclenche un recomptage par un second compteur. 0 = désactivé.', verbose_name='Seuil de recomptage aveugle (unités)'),
+        ),
+        migrations.AddField(
+            model_name='ligneinventaire',
+            name='compte_par',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL, verbose_name='Compté par'),
+        ),
+        migrations.AddField(
+            model_name='ligneinventaire',
+            name='recomptage_requis',
+            field=models.BooleanField(default=False, verbose_name='Recomptage requis'),
+        ),
+        migrations.AddField(
+            model_name='ligneinventaire',
+            name='recompteur',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='recomptages_inventaire', to=settings.AUTH_USER_MODEL, verbose_name='Second compteur'),
+        ),
+        migrations.AddField(
+            model_name='ligneinventaire',
+            name='stock_recompte',
+            field=models.IntegerField(blank=True, null=True, verbose_name='Stock recompté'),
+        ),
+        migrations.CreateModel(
+            name='ZoneComptage',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('nom', models.CharField(max_length=100, verbose_name='Nom de la zone')),
+                ('ordre', models.PositiveIntegerField(default=0, verbose_name='Ordre')),
+                ('compteur', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='zones_comptage', to=settings.AUTH_USER_MODEL, verbose_name='Compteur assigné')),
+                ('inventaire', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='zones', to='pharmacy.inventaire', verbose_name='Inventaire')),
+            ],
+            options={
+                'verbose_name': 'Zone de comptage',
+                'verbose_name_plural': 'Zones de comptage',
+                'ordering': ['ordre', 'pk'],
+            },
+        ),
+        migrations.AddField(
+            model_name='ligneinventaire',
+            name='zone',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='lignes', to='pharmacy.zonecomptage', verbose_name='Zone de comptage'),
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 6.0.2 on 2026-10-19 09:30
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pharmacy', '0017_inventaire_zones_recomptage'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SuiviEcartProduit',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('nb_inventaires', models.IntegerField(default=0, verbose_name='Nb inventaires')),
+                ('nb_ecarts', models.IntegerField(default=0, verbose_name='Nb inventaires avec écart')),
+                ('nb_manquants', models.IntegerField(default=0, verbose_name='Nb inventaires en manquant')),
+                ('cumul_ecart', models.IntegerField(default=0, verbose_name='Écart cumulé (unités)')),
+                ('cumul_valeur_ecart', models.DecimalField(decimal_places=2, default=0, max_digits=15, verbose_name='Valeur écart cumulée (FC)')),
+                ('cumul_pertes', models.DecimalField(decimal_places=2, default=0, max_digits=15, verbose_name='Pertes cumulées (FC)')),
+                ('date_dernier_inventaire', models.DateTimeField(blank=True, null=True, verbose_name='Dernier inventaire validé')),
+                ('date_mise_a_jour', models.DateTimeField(auto_now=True, verbose_name='Date de mise à jour')),
+                ('produit', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='suivi_ecart', to='pharmacy.produit', verbose_name='Produit')),
+            ],
+            options={
+                'verbose_name': 'Suivi des écarts produit',
+                'verbose_name_plural': 'Suivi des écarts produits',
+                'ordering': ['cumul_valeur_ecart'],
+                'indexes': [models.Index(fields=['cumul_valeur_ecart'], name='suivi_ecart_valeur_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 6.0.2 on 2026-10-19 10:00
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pharmacy', '0018_suiviecartproduit'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='historique',
+            name='date_action',
+            field=models.DateTimeField(default=django.utils.timezone.now, editable=False, verbose_name='Date'),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 6.0.2 on 2026-10-19 10:30
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pharmacy', '0019_historique_date_action_default'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='historique',
+            index=models.Index(fields=['date_action', 'id'], name='historique_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='historique',
+            index=models.Index(fields=['modele', 'date_action'], name='historique_modele_date_idx'),
+        ),
+    ]
@@ -0,0 +1,103 @@
+# Generated by Django 6.0.2 on 2026-10-19 11:00
+
+import re
+
+import django.core.serializers.json
+from django.conf import settings
+from django.db import migrations, models
+
+
+FTS_SQLITE = [
+    """CREATE VIRTUAL TABLE IF NOT EXISTS pharmacy_historique_fts
+       USING fts5(detail, content='pharmacy_historique', content_rowid='id', tokenize='unicode61 remove_diacritics 2')""",
+    """CREATE TRIGGER IF NOT EXISTS pharmacy_historique_fts_ai AFTER INSERT ON pharmacy_historique BEGIN
+         INSERT INTO pharmacy_historique_fts(rowid, detail) VALUES (new.id, new.detail);
+       END""",
+    """CREATE TRIGGER IF NOT EXISTS pharmacy_historique_fts_ad AFTER DELETE ON pharmacy_historique BEGIN
+         INSERT INTO pharmacy_historique_fts(pharmacy_historique_fts, rowid, detail) VALUES ('delete', old.id, old.detail);
+       END""",
+    """CREATE TRIGGER IF NOT EXISTS pharmacy_historique_fts_au AFTER UPDATE OF detail ON pharmacy_historique BEGIN
+         INSERT INTO pharmacy_historique_fts(pharmacy_historique_fts, rowid, detail) VALUES ('delete', old.id, old.detail);
+         INSERT INTO pharmacy_historique_fts(rowid, detail) VALUES (new.id, new.detail);
+       END""",
+    "INSERT INTO pharmacy_historique_fts(pharmacy_historique_fts) VALUES ('rebuild')",
+]
+
+FTS_SQLITE_INVERSE = [
+    "DROP TRIGGER IF EXISTS pharmacy_historique_fts_au",
+    "DROP TRIGGER IF EXISTS pharmacy_historique_fts_ad",
+    "DROP TRIGGER IF EXISTS pharmacy_historique_fts_ai",
+    "DROP TABLE IF EXISTS pharmacy_historique_fts",
+]
+
+
+def creer_index_plein_texte(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        for sql in FTS_SQLITE:
+            schema_editor.execute(sql)
+    elif vendor == 'mysql':
+        schema_editor.execute(
+            "ALTER TABLE pharmacy_historique ADD FULLTEXT INDEX historique_detail_ft (detail)"
+        )
+
+
+def supprimer_index_plein_texte(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        for sql in FTS_SQLITE_INVERSE:
+            schema_editor.execute(sql)
+    elif vendor == 'mysql':
+        schema_editor.execute("ALTER TABLE pharmacy_historique DROP INDEX historique_detail_ft")
+
+
+MOTIFS_CIBLE = [
+    ('Vente', re.compile(r'[Vv]ente #(\d+)'), 'vente'),
+    ('Inventaire', re.compile(r'Inventaire #(\d+)'), 'inventaire'),
+]
+
+
+def renseigner_cibles(apps, schema_editor):
+    """Reprend la cible des anciennes entrées depuis le texte (« Vente #123 », « Inventaire #4 »)."""
+    Historique = apps.get_model('pharmacy', 'Historique')
+    for modele, motif, cible_type in MOTIFS_CIBLE:
+        a_maj = []
+        for h in Historique.objects.filter(modele=modele, cible_type='').only('pk', 'detail').iterator(chunk_size=2000):
+            trouve = motif.search(h.detail)
+            if trouve:
+                h.cible_type = cible_type
+                h.cible_id = int(trouve.group(1))
+                a_maj.append(h)
+        Historique.objects.bulk_update(a_maj, ['cible_type', 'cible_id'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pharmacy', '0020_historique_index'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='historique',
+            name='cible_id',
+            field=models.BigIntegerField(blank=True, null=True, verbose_name="Identifiant de l'objet"),
+        ),
+        migrations.AddField(
+            model_name='historique',
+            name='cible_type',
+            field=models.CharField(blank=True, max_length=50, verbose_name="Type d'objet"),
+        ),
+        migrations.AddField(
+            model_name='historique',
+            name='donnees',
+            field=models.JSONField(blank=True, default=dict, encoder=django.core.serializers.json.DjangoJSONEncoder, verbose_name='Données'),
+        ),
+        migrations.AddIndex(
+            model_name='historique',
+            index=models.Index(fields=['cible_type', 'cible_id'], name='historique_cible_idx'),
+        ),
+        migrations.RunPython(renseigner_cibles, migrations.RunPython.noop),
+        migrations.RunPython(creer_index_plein_texte, supprimer_index_plein_texte),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 6.0.2 on 2026-10-19 11:30
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pharmacy', '0021_historique_cible_fts'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='fournisseur',
+            name='delai_livraison',
+            field=models.PositiveIntegerField(default=7, verbose_name='Délai de livraison (jours)'),
+        ),
+        migrations.CreateModel(
+            name='VelociteProduit',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('qte_7j', models.IntegerField(default=0, verbose_name='Vendu sur 7 jours')),
+                ('qte_30j', models.IntegerField(default=0, verbose_name='Vendu sur 30 jours')),
+                ('qte_90j', models.IntegerField(default=0, verbose_name='Vendu sur 90 jours')),
+                ('velocite', models.DecimalField(decimal_places=3, default=0, max_digits=12, verbose_name='Ventes / jour')),
+                ('point_commande', models.IntegerField(default=0, verbose_name='Point de commande')),
+                ('stock_cible', models.IntegerField(default=0, verbose_name='Stock cible')),
+                ('date_calcul', models.DateField(verbose_name='Calculé le')),
+                ('produit', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='velocite', to='pharmacy.produit', verbose_name='Produit')),
+            ],
+            options={
+                'verbose_name': 'Vitesse de vente produit',
+                'verbose_name_plural': 'Vitesses de vente produits',
+                'ordering': ['-velocite'],
+            },
+        ),
+    ]
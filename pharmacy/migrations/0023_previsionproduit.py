@@ -0,0 +1,29 @@
+# Generated by Django 6.0.2 on 2026-10-19 12:00
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pharmacy', '0022_reapprovisionnement_velocite'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PrevisionProduit',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date_calcul', models.DateField(verbose_name='Calculée le')),
+                ('moyenne_jour', models.DecimalField(decimal_places=3, default=0, max_digits=12, verbose_name='Ventes prévues / jour')),
+                ('previsions', models.JSONField(blank=True, default=list, verbose_name='Prévisions journalières')),
+                ('produit', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='prevision', to='pharmacy.produit', verbose_name='Produit')),
+            ],
+            options={
+                'verbose_name': 'Prévision de ventes',
+                'verbose_name_plural': 'Prévisions de ventes',
+                'ordering': ['-moyenne_jour'],
+            },
+        ),
+    ]
@@ -0,0 +1,51 @@
+# Generated by Django 6.0.2 on 2026-10-19 12:30
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pharmacy', '0023_previsionproduit'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MoisCubeVentes',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('mois', models.DateField(unique=True, verbose_name='Mois')),
+                ('a_recalculer', models.BooleanField(default=True, verbose_name='À recalculer')),
+                ('version', models.PositiveIntegerField(default=0)),
+                ('derniere_vente', models.BigIntegerField(default=0, verbose_name='Dernière vente agrégée')),
+                ('date_calcul', models.DateTimeField(blank=True, null=True, verbose_name='Calculé le')),
+            ],
+            options={
+                'verbose_name': 'Mois du cube des ventes',
+                'verbose_name_plural': 'Mois du cube des ventes',
+                'ordering': ['-mois'],
+            },
+        ),
+        migrations.CreateModel(
+            name='CubeVentes',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('mois', models.DateField(verbose_name='Mois')),
+                ('quantite', models.IntegerField(default=0, verbose_name='Quantité')),
+                ('montant', models.DecimalField(decimal_places=2, default=0, max_digits=15, verbose_name='Montant brut (FC)')),
+                ('nb_lignes', models.IntegerField(default=0, verbose_name='Nb lignes')),
+                ('client', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='pharmacy.client', verbose_name='Client')),
+                ('fournisseur', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='pharmacy.fournisseur', verbose_name='Fournisseur')),
+                ('produit', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='pharmacy.produit', verbose_name='Produit')),
+                ('vendeur', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL, verbose_name='Vendeur')),
+            ],
+            options={
+                'verbose_name': 'Cube des ventes',
+                'verbose_name_plural': 'Cube des ventes',
+                'indexes': [models.Index(fields=['mois', 'fournisseur'], name='cube_mois_fournisseur_idx'), models.Index(fields=['mois', 'produit'], name='cube_mois_produit_idx'), models.Index(fields=['mois', 'vendeur'], name='cube_mois_vendeur_idx')],
+            },
+        ),
+    ]
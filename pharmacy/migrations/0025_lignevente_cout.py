@@ -0,0 +1,24 @@
+# Generated by Django 6.0.2 on 2026-10-19 13:00
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pharmacy', '0024_cube_ventes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='lignevente',
+            name='fournisseur',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='lignes_vente', to='pharmacy.fournisseur', verbose_name='Fournisseur'),
+        ),
+        migrations.AddField(
+            model_name='lignevente',
+            name='prix_achat_unitaire',
+            field=models.DecimalField(blank=True, decimal_places=2, max_digits=12, null=True, verbose_name="Prix d'achat unitaire (FC)"),
+        ),
+    ]
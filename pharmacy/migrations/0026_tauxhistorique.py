@@ -0,0 +1,40 @@
+# Generated by Django 6.0.2 on 2026-10-19 13:30
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+def initialiser_historique(apps, schema_editor):
+    """Point de départ de chaque série : le taux actuel (les valeurs antérieures sont perdues)."""
+    Taux = apps.get_model('pharmacy', 'Taux')
+    TauxHistorique = apps.get_model('pharmacy', 'TauxHistorique')
+    TauxHistorique.objects.bulk_create([
+        TauxHistorique(code_devise=t.code_devise, montant_fc=t.montant_fc, date_debut=t.date_mise_a_jour)
+        for t in Taux.objects.all()
+    ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pharmacy', '0025_lignevente_cout'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TauxHistorique',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('code_devise', models.CharField(max_length=10, verbose_name='Code Devise')),
+                ('montant_fc', models.DecimalField(decimal_places=2, max_digits=15, verbose_name='Montant en FC')),
+                ('date_debut', models.DateTimeField(default=django.utils.timezone.now, verbose_name='En vigueur depuis')),
+            ],
+            options={
+                'verbose_name': 'Historique des taux',
+                'verbose_name_plural': 'Historique des taux',
+                'ordering': ['code_devise', '-date_debut'],
+                'indexes': [models.Index(fields=['code_devise', 'date_debut'], name='taux_historique_idx')],
+            },
+        ),
+        migrations.RunPython(initialiser_historique, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 6.0.2 on 2026-10-19 11:05
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pharmacy', '0026_tauxhistorique'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AlerteExpiration',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('statut', models.CharField(choices=[('expire', 'Expiré'), ('alerte', 'Expiration proche')], max_length=10, verbose_name='Statut')),
+                ('date_expiration', models.DateField(verbose_name="Date d'expiration")),
+                ('mois_expiration', models.DateField(verbose_name="Mois d'expiration")),
+                ('jours_restants', models.IntegerField(verbose_name='Jours restants')),
+                ('quantite_stock', models.IntegerField(verbose_name='Stock')),
+                ('prix_achat', models.DecimalField(decimal_places=2, max_digits=12, verbose_name="Prix d'achat (FC)")),
+                ('valeur_risque', models.DecimalField(decimal_places=2, max_digits=15, verbose_name='Valeur à risque (FC)')),
+                ('date_calcul', models.DateField(verbose_name='Calculée le')),
+                ('fournisseur', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='pharmacy.fournisseur', verbose_name='Fournisseur')),
+                ('produit', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='alerte_expiration', to='pharmacy.produit', verbose_name='Produit')),
+            ],
+            options={
+                'verbose_name': "Alerte d'expiration",
+                'verbose_name_plural': "Alertes d'expiration",
+                'ordering': ['date_expiration'],
+                'indexes': [models.Index(fields=['statut', 'date_expiration'], name='alerte_exp_statut_idx'), models.Index(fields=['mois_expiration', 'fournisseur'], name='alerte_exp_mois_idx')],
+            },
+        ),
+    ]
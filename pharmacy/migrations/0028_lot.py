@@ -0,0 +1,84 @@
+# Generated by Django 6.0.2 on 2026-10-19 14:20
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+def creer_lots_initiaux(apps, schema_editor):
+    """Un lot par produit en stock, avec la quantité et l'expiration de la fiche."""
+    Produit = apps.get_model('pharmacy', 'Produit')
+    Lot = apps.get_model('pharmacy', 'Lot')
+    lots = [
+        Lot(produit_id=pk, date_expiration=expiration, quantite_initiale=stock, quantite=stock)
+        for pk, stock, expiration in Produit.objects.filter(quantite_stock__gt=0)
+        .values_list('pk', 'quantite_stock', 'date_expiration').iterator(chunk_size=2000)
+    ]
+    Lot.objects.bulk_create(lots, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pharmacy', '0027_alerteexpiration'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Lot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('numero_lot', models.CharField(blank=True, max_length=50, verbose_name='N° de lot')),
+                ('date_expiration', models.DateField(blank=True, null=True, verbose_name="Date d'expiration")),
+                ('quantite_initiale', models.IntegerField(default=0, verbose_name='Quantité reçue')),
+                ('quantite', models.IntegerField(default=0, verbose_name='Quantité restante')),
+                ('date_reception', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Date de réception')),
+                ('produit', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='lots', to='pharmacy.produit', verbose_name='Produit')),
+            ],
+            options={
+                'verbose_name': 'Lot',
+                'verbose_name_plural': 'Lots',
+                'ordering': ['produit', 'date_expiration', 'pk'],
+                'indexes': [models.Index(fields=['produit', 'date_expiration'], name='lot_produit_expiration_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='AllocationLot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('quantite', models.PositiveIntegerField(verbose_name='Quantité')),
+                ('ligne', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='allocations', to='pharmacy.lignevente', verbose_name='Ligne de vente')),
+                ('lot', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='allocations', to='pharmacy.lot', verbose_name='Lot')),
+            ],
+            options={
+                'verbose_name': 'Allocation de lot',
+                'verbose_name_plural': 'Allocations de lots',
+            },
+        ),
+        migrations.RunPython(creer_lots_initiaux, migrations.RunPython.noop),
+        # Table dérivée : recréée par lot, remplie au prochain rafraîchissement.
+        migrations.DeleteModel(name='AlerteExpiration'),
+        migrations.CreateModel(
+            name='AlerteExpiration',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('statut', models.CharField(choices=[('expire', 'Expiré'), ('alerte', 'Expiration proche')], max_length=10, verbose_name='Statut')),
+                ('date_expiration', models.DateField(verbose_name="Date d'expiration")),
+                ('mois_expiration', models.DateField(verbose_name="Mois d'expiration")),
+                ('jours_restants', models.IntegerField(verbose_name='Jours restants')),
+                ('quantite_stock', models.IntegerField(verbose_name='Stock')),
+                ('prix_achat', models.DecimalField(decimal_places=2, max_digits=12, verbose_name="Prix d'achat (FC)")),
+                ('valeur_risque', models.DecimalField(decimal_places=2, max_digits=15, verbose_name='Valeur à risque (FC)')),
+                ('date_calcul', models.DateField(verbose_name='Calculée le')),
+                ('fournisseur', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='pharmacy.fournisseur', verbose_name='Fournisseur')),
+                ('lot', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='alerte_expiration', to='pharmacy.lot', verbose_name='Lot')),
+                ('produit', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='pharmacy.produit', verbose_name='Produit')),
+            ],
+            options={
+                'verbose_name': "Alerte d'expiration",
+                'verbose_name_plural': "Alertes d'expiration",
+                'ordering': ['date_expiration'],
+                'indexes': [models.Index(fields=['statut', 'date_expiration'], name='alerte_exp_statut_idx'), models.Index(fields=['mois_expiration', 'fournisseur'], name='alerte_exp_mois_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,63 @@
+# Generated by Django 6.0.2 on 2026-10-19 16:40
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pharmacy', '0028_lot'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LigneReception',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('quantite', models.PositiveIntegerField(verbose_name='Quantité reçue')),
+                ('prix_achat', models.DecimalField(decimal_places=2, max_digits=12, verbose_name="Prix d'achat unitaire (FC)")),
+                ('numero_lot', models.CharField(blank=True, max_length=50, verbose_name='N° de lot')),
+                ('date_expiration', models.DateField(blank=True, null=True, verbose_name="Date d'expiration")),
+                ('produit', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='lignes_reception', to='pharmacy.produit', verbose_name='Produit')),
+            ],
+            options={
+                'verbose_name': 'Ligne de réception',
+                'verbose_name_plural': 'Lignes de réception',
+            },
+        ),
+        migrations.AddField(
+            model_name='lot',
+            name='ligne_reception',
+            field=models.OneToOneField(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='lot', to='pharmacy.lignereception', verbose_name='Ligne de réception'),
+        ),
+        migrations.CreateModel(
+            name='Reception',
+            fields=[
+                ('code_reception', models.AutoField(primary_key=True, serialize=False, verbose_name='Code Réception')),
+                ('numero_bl', models.CharField(blank=True, max_length=50, verbose_name='N° bon de livraison')),
+                ('date_reception', models.DateField(default=django.utils.timezone.localdate, verbose_name='Date de réception')),
+                ('statut', models.CharField(choices=[('brouillon', 'Brouillon'), ('validee', 'Validée')], default='brouillon', max_length=10, verbose_name='Statut')),
+                ('maj_prix_achat', models.BooleanField(default=False, verbose_name="Mettre à jour les prix d'achat")),
+                ('observation', models.TextField(blank=True, verbose_name='Observation')),
+                ('montant_total', models.DecimalField(decimal_places=2, default=0, max_digits=15, verbose_name='Montant total (FC)')),
+                ('date_creation', models.DateTimeField(auto_now_add=True, verbose_name='Date de création')),
+                ('date_validation', models.DateTimeField(blank=True, null=True, verbose_name='Date de validation')),
+                ('fournisseur', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='receptions', to='pharmacy.fournisseur', verbose_name='Fournisseur')),
+                ('utilisateur', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, to=settings.AUTH_USER_MODEL, verbose_name='Utilisateur')),
+            ],
+            options={
+                'verbose_name': 'Réception',
+                'verbose_name_plural': 'Réceptions',
+                'ordering': ['-date_creation'],
+            },
+        ),
+        migrations.AddField(
+            model_name='lignereception',
+            name='reception',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='lignes', to='pharmacy.reception', verbose_name='Réception'),
+        ),
+    ]
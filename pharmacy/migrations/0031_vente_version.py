@@ -0,0 +1,23 @@
+# Generated by Django 6.0.2 on 2026-10-19 14:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pharmacy', '0030_tache'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='vente',
+            name='date_modification',
+            field=models.DateTimeField(auto_now=True, verbose_name='Dernière modification'),
+        ),
+        migrations.AddField(
+            model_name='vente',
+            name='version',
+            field=models.PositiveIntegerField(default=1, verbose_name='Version'),
+        ),
+    ]
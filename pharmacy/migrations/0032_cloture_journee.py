@@ -0,0 +1,88 @@
+# Generated by Django 6.0.2 on 2026-10-19 16:05
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pharmacy', '0031_vente_version'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ClotureJournee',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('jour', models.DateField(unique=True, verbose_name='Journée')),
+                ('date_cloture', models.DateTimeField(auto_now_add=True, verbose_name='Clôturée le')),
+                ('observation', models.TextField(blank=True, verbose_name='Observation')),
+                ('cloture_par', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='+', to=settings.AUTH_USER_MODEL, verbose_name='Clôturée par')),
+            ],
+            options={
+                'verbose_name': 'Clôture de journée',
+                'verbose_name_plural': 'Clôtures de journée',
+                'ordering': ['-jour'],
+            },
+        ),
+        migrations.CreateModel(
+            name='AjustementCloture',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('code_vente', models.IntegerField(verbose_name='Vente')),
+                ('mode_paiement', models.CharField(choices=[('comptant', 'Comptant'), ('credit', 'À crédit')], max_length=10, verbose_name='Mode de paiement')),
+                ('action', models.CharField(choices=[('creation', 'Vente ajoutée'), ('modification', 'Vente modifiée'), ('suppression', 'Vente supprimée')], max_length=12, verbose_name='Action')),
+                ('nb_ventes', models.IntegerField(default=0, verbose_name='Écart nombre de ventes')),
+                ('montant_total', models.DecimalField(decimal_places=2, default=0, max_digits=15, verbose_name='Écart brut (FC)')),
+                ('montant_remise', models.DecimalField(decimal_places=2, default=0, max_digits=15, verbose_name='Écart remises (FC)')),
+                ('montant_net', models.DecimalField(decimal_places=2, default=0, max_digits=15, verbose_name='Écart net (FC)')),
+                ('montant_paye', models.DecimalField(decimal_places=2, default=0, max_digits=15, verbose_name='Écart encaissé (FC)')),
+                ('date_ajustement', models.DateTimeField(auto_now_add=True, verbose_name='Date')),
+                ('utilisateur', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL, verbose_name='Utilisateur')),
+                ('vendeur', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='+', to=settings.AUTH_USER_MODEL, verbose_name='Vendeur')),
+                ('cloture', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='ajustements', to='pharmacy.cloturejournee', verbose_name='Clôture')),
+            ],
+            options={
+                'verbose_name': 'Ajustement de clôture',
+                'verbose_name_plural': 'Ajustements de clôture',
+                'ordering': ['date_ajustement', 'pk'],
+            },
+        ),
+        migrations.CreateModel(
+            name='CaisseCloture',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('montant_attendu', models.DecimalField(decimal_places=2, default=0, max_digits=15, verbose_name="Encaissé d'après les ventes (FC)")),
+                ('montant_compte', models.DecimalField(blank=True, decimal_places=2, max_digits=15, null=True, verbose_name='Espèces comptées (FC)')),
+                ('vendeur', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='+', to=settings.AUTH_USER_MODEL, verbose_name='Vendeur')),
+                ('cloture', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='caisses', to='pharmacy.cloturejournee', verbose_name='Clôture')),
+            ],
+            options={
+                'verbose_name': 'Caisse à la clôture',
+                'verbose_name_plural': 'Caisses à la clôture',
+                'unique_together': {('cloture', 'vendeur')},
+            },
+        ),
+        migrations.CreateModel(
+            name='LigneCloture',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('mode_paiement', models.CharField(choices=[('comptant', 'Comptant'), ('credit', 'À crédit')], max_length=10, verbose_name='Mode de paiement')),
+                ('nb_ventes', models.IntegerField(default=0, verbose_name='Nombre de ventes')),
+                ('montant_total', models.DecimalField(decimal_places=2, default=0, max_digits=15, verbose_name='Montant brut (FC)')),
+                ('montant_remise', models.DecimalField(decimal_places=2, default=0, max_digits=15, verbose_name='Remises (FC)')),
+                ('montant_net', models.DecimalField(decimal_places=2, default=0, max_digits=15, verbose_name='Net (FC)')),
+                ('montant_paye', models.DecimalField(decimal_places=2, default=0, max_digits=15, verbose_name='Encaissé (FC)')),
+                ('cloture', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='lignes', to='pharmacy.cloturejournee', verbose_name='Clôture')),
+                ('vendeur', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='+', to=settings.AUTH_USER_MODEL, verbose_name='Vendeur')),
+            ],
+            options={
+                'verbose_name': 'Ligne de clôture',
+                'verbose_name_plural': 'Lignes de clôture',
+                'unique_together': {('cloture', 'vendeur', 'mode_paiement')},
+            },
+        ),
+    ]
@@ -1,7 +1,11 @@
 from django.db import models
 from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils import timezone
+from django.utils.functional import cached_property
+from collections import namedtuple
 from decimal import Decimal
-from datetime import date
+from datetime import date, timedelta
 
 
 class Taux(models.Model):
@@ -17,11 +21,47 @@ class Taux(models.Model):
     def __str__(self):
         return f"1 {self.code_devise} = {self.montant_fc} FC"
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._montant_charge = instance.__dict__.get('montant_fc')
+        return instance
+
+    def save(self, *args, **kwargs):
+        modifie = self._state.adding or self.montant_fc != getattr(self, '_montant_charge', None)
+        super().save(*args, **kwargs)
+        if modifie:
+            from . import taux
+            TauxHistorique.objects.create(
+                code_devise=self.code_devise, montant_fc=self.montant_fc, date_debut=self.date_mise_a_jour,
+            )
+            self._montant_charge = self.montant_fc
+            taux.invalider(self.code_devise)
+
+
+class TauxHistorique(models.Model):
+    """Valeur d'un taux de change à partir de `date_debut` (une ligne par changement de Taux)."""
+    code_devise = models.CharField(max_length=10, verbose_name="Code Devise")
+    montant_fc = models.DecimalField(max_digits=15, decimal_places=2, verbose_name="Montant en FC")
+    date_debut = models.DateTimeField(default=timezone.now, verbose_name="En vigueur depuis")
+
+    class Meta:
+        verbose_name = "Historique des taux"
+        verbose_name_plural = "Historique des taux"
+        ordering = ['code_devise', '-date_debut']
+        indexes = [
+            models.Index(fields=['code_devise', 'date_debut'], name='taux_historique_idx'),
+        ]
+
+    def __str__(self):
+        return f"1 {self.code_devise} = {self.montant_fc} FC depuis le {self.date_debut:%d/%m/%Y %H:%M}"
+
 
 class Fournisseur(models.Model):
     code_fournisseur = models.AutoField(primary_key=True, verbose_name="Code Fournisseur")
     designation = models.CharField(max_length=200, verbose_name="Désignation Fournisseur")
     marge_beneficiaire = models.DecimalField(max_digits=5, decimal_places=2, verbose_name="Marge Bénéficiaire (%)")
+    delai_livraison = models.PositiveIntegerField(default=7, verbose_name="Délai de livraison (jours)")
 
     class Meta:
         verbose_name = "Fournisseur"
@@ -38,6 +78,37 @@ class Fournisseur(models.Model):
             produit.save()
 
 
+def q_alerte_expiration(date_ref, date='date_expiration', jours='jours_alerte_expiration'):
+    """Condition SQL « `date` tombe dans les `jours` d'alerte de son produit à `date_ref` ».
+
+    Ajouter un nombre de jours variable à une date n'est pas portable entre
+    SQLite et MySQL : on énumère les seuils distincts (quelques valeurs) et on
+    combine une comparaison de dates par seuil.
+    """
+    seuils = Produit.objects.order_by().values_list('jours_alerte_expiration', flat=True).distinct()
+    q = models.Q(pk__in=[])
+    for j in seuils:
+        q |= models.Q(**{jours: j, f'{date}__lte': date_ref + timedelta(days=j)})
+    return q
+
+
+class ProduitQuerySet(models.QuerySet):
+    def en_alerte_expiration(self, date_ref=None):
+        """Produits expirés ou entrés dans leur fenêtre d'alerte à `date_ref`."""
+        date_ref = date_ref or timezone.localdate()
+        return self.filter(q_alerte_expiration(date_ref))
+
+    def avec_statut_expiration(self, date_ref=None):
+        """Annote `statut_expiration` : 'expire', 'alerte' ou ''."""
+        date_ref = date_ref or timezone.localdate()
+        return self.annotate(statut_expiration=models.Case(
+            models.When(date_expiration__lte=date_ref, then=models.Value('expire')),
+            models.When(q_alerte_expiration(date_ref), then=models.Value('alerte')),
+            default=models.Value(''),
+            output_field=models.CharField(),
+        ))
+
+
 class Produit(models.Model):
     code_produit = models.AutoField(primary_key=True, verbose_name="Code Produit")
     designation = models.CharField(max_length=200, unique=True, verbose_name="Désignation Produit")
@@ -51,6 +122,8 @@ class Produit(models.Model):
     date_expiration = models.DateField(null=True, blank=True, verbose_name="Date d'Expiration")
     prix_vente_usd = models.DecimalField(max_digits=16, decimal_places=10, default=0, verbose_name="Prix de Vente (USD)")
 
+    objects = ProduitQuerySet.as_manager()
+
     class Meta:
         verbose_name = "Produit"
         verbose_name_plural = "Produits"
@@ -62,28 +135,44 @@ class Produit(models.Model):
     @property
     def prix_vente(self):
         """Prix de vente = prix_vente_usd × taux FC actuel"""
-        if self.prix_vente_usd > 0:
-            try:
-                taux = Taux.objects.get(code_devise='USD')
-                return (self.prix_vente_usd * taux.montant_fc).quantize(Decimal('0.01'))
-            except Taux.DoesNotExist:
-                pass
+        return self.prix_vente_au_taux(Taux.objects.filter(code_devise='USD').first() if self.prix_vente_usd > 0 else None)
+
+    def prix_vente_au_taux(self, taux):
+        """Prix de vente au taux USD donné (instance Taux ou None), sans relire le taux : pour les listes."""
+        if self.prix_vente_usd > 0 and taux is not None:
+            return (self.prix_vente_usd * taux.montant_fc).quantize(Decimal('0.01'))
         # Fallback: ancien calcul
         marge = self.fournisseur.marge_beneficiaire
         return self.prix_achat + (self.prix_achat * marge / Decimal('100'))
 
-    def calculer_prix_vente_usd(self):
-        """Calcule et stocke le prix en USD: (prix_achat + marge) / taux"""
+    def calculer_prix_vente_usd(self, taux=None):
+        """Calcule et stocke le prix en USD: (prix_achat + marge) / taux
+
+        `taux` (instance Taux USD) évite de relire le taux pour chaque produit d'un lot.
+        """
         marge = self.fournisseur.marge_beneficiaire
         prix_avec_marge = self.prix_achat + (self.prix_achat * marge / Decimal('100'))
         try:
-            taux = Taux.objects.get(code_devise='USD')
+            taux = taux or Taux.objects.get(code_devise='USD')
             if taux.montant_fc > 0:
                 self.prix_vente_usd = (prix_avec_marge / taux.montant_fc).quantize(Decimal('0.0000000001'))
         except Taux.DoesNotExist:
             self.prix_vente_usd = Decimal('0')
         return self.prix_vente_usd
 
+    @classmethod
+    def recalculer_prix_vente(cls, produit_ids):
+        """Recalcule prix_vente_usd d'un ensemble de produits (un seul accès au taux, bulk_update)."""
+        taux = Taux.objects.filter(code_devise='USD').first()
+        produits = list(cls.objects.filter(pk__in=produit_ids).select_related('fournisseur'))
+        for produit in produits:
+            if taux is None:
+                produit.prix_vente_usd = Decimal('0')
+            else:
+                produit.calculer_prix_vente_usd(taux)
+        cls.objects.bulk_update(produits, ['prix_vente_usd'], batch_size=500)
+        return len(produits)
+
     @property
     def stock_alerte(self):
         return self.quantite_stock <= self.quantite_alerte
@@ -123,6 +212,10 @@ class Client(models.Model):
         return self.nom
 
 
+# Montants d'une vente figés par la clôture de sa journée (ClotureJournee).
+MONTANTS_CLOTURE = ('montant_total', 'montant_remise', 'montant_net', 'montant_paye')
+
+
 class Vente(models.Model):
     TYPE_CHOICES = (
         ('detail', 'Détail'),
@@ -145,6 +238,10 @@ class Vente(models.Model):
     est_solde = models.BooleanField(default=True, verbose_name="Soldé")
     observation = models.TextField(blank=True, verbose_name="Observation")
     vendeur = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.PROTECT, verbose_name="Vendeur")
+    # Incrémentée à chaque enregistrement ; toute modification des lignes se termine par
+    # calculer_total() ou save(). Sert de clé au cache des factures PDF (cache_pdf).
+    version = models.PositiveIntegerField(default=1, verbose_name="Version")
+    date_modification = models.DateTimeField(auto_now=True, verbose_name="Dernière modification")
 
     class Meta:
         verbose_name = "Vente"
@@ -154,6 +251,26 @@ class Vente(models.Model):
     def __str__(self):
         return f"Vente #{self.code_vente} - {self.date_vente.strftime('%d/%m/%Y %H:%M')}"
 
+    def save(self, *args, **kwargs):
+        if self._state.adding:
+            super().save(*args, **kwargs)
+            return
+        # Incrément en base : deux modifications parties de la même version obtiennent chacune la leur.
+        self.version = models.F('version') + 1
+        if kwargs.get('update_fields') is not None:
+            kwargs['update_fields'] = {*kwargs['update_fields'], 'version', 'date_modification'}
+        super().save(*args, **kwargs)
+        self.refresh_from_db(fields=['version'])
+
+    def etat_cloture(self):
+        """Chiffres de la vente repris par la clôture de sa journée (voir ClotureJournee.ajuster)."""
+        return {
+            'jour': timezone.localtime(self.date_vente).date(),
+            'vendeur_id': self.vendeur_id,
+            'mode_paiement': self.mode_paiement,
+            **{champ: getattr(self, champ) for champ in MONTANTS_CLOTURE},
+        }
+
     def calculer_total(self):
         total = sum(ligne.montant_ligne for ligne in self.lignes.all())
         self.montant_total = total
@@ -172,6 +289,11 @@ class LigneVente(models.Model):
     quantite = models.PositiveIntegerField(verbose_name="Quantité Vendue")
     prix_unitaire = models.DecimalField(max_digits=12, decimal_places=2, verbose_name="Prix Unitaire (FC)")
     montant_ligne = models.DecimalField(max_digits=15, decimal_places=2, verbose_name="Montant Ligne (FC)")
+    # Instantané au moment de la vente : la marge reste juste après un changement de prix ou de fournisseur.
+    prix_achat_unitaire = models.DecimalField(max_digits=12, decimal_places=2, null=True, blank=True,
+                                              verbose_name="Prix d'achat unitaire (FC)")
+    fournisseur = models.ForeignKey(Fournisseur, on_delete=models.SET_NULL, null=True, blank=True,
+                                    related_name='lignes_vente', verbose_name="Fournisseur")
 
     class Meta:
         verbose_name = "Ligne de Vente"
@@ -182,8 +304,282 @@ class LigneVente(models.Model):
 
     def save(self, *args, **kwargs):
         self.montant_ligne = self.quantite * self.prix_unitaire
+        if self.prix_achat_unitaire is None:
+            self.prix_achat_unitaire = self.produit.prix_achat
+            self.fournisseur_id = self.produit.fournisseur_id
         super().save(*args, **kwargs)
 
+    @property
+    def marge(self):
+        if self.prix_achat_unitaire is None:
+            return None
+        return self.montant_ligne - self.quantite * self.prix_achat_unitaire
+
+
+class StockInsuffisant(Exception):
+    """Les lots d'un produit ne couvrent pas la quantité demandée."""
+
+
+class Lot(models.Model):
+    """Lot reçu d'un produit, avec sa propre date d'expiration.
+
+    `Produit.quantite_stock` reste la somme des lots et `Produit.date_expiration`
+    la plus proche expiration d'un lot non vide : `synchroniser` les recalcule
+    après chaque mouvement. Les sorties consomment les lots par expiration
+    croissante (FEFO) et sont tracées dans AllocationLot pour pouvoir être
+    restituées.
+    """
+    produit = models.ForeignKey(Produit, on_delete=models.CASCADE, related_name='lots', verbose_name="Produit")
+    numero_lot = models.CharField(max_length=50, blank=True, verbose_name="N° de lot")
+    date_expiration = models.DateField(null=True, blank=True, verbose_name="Date d'expiration")
+    quantite_initiale = models.IntegerField(default=0, verbose_name="Quantité reçue")
+    quantite = models.IntegerField(default=0, verbose_name="Quantité restante")
+    date_reception = models.DateTimeField(default=timezone.now, verbose_name="Date de réception")
+    ligne_reception = models.OneToOneField('LigneReception', on_delete=models.SET_NULL, null=True, blank=True,
+                                           related_name='lot', verbose_name="Ligne de réception")
+
+    class Meta:
+        verbose_name = "Lot"
+        verbose_name_plural = "Lots"
+        ordering = ['produit', 'date_expiration', 'pk']
+        indexes = [
+            models.Index(fields=['produit', 'date_expiration'], name='lot_produit_expiration_idx'),
+        ]
+
+    def __str__(self):
+        numero = self.numero_lot or f"#{self.pk}"
+        return f"{self.produit} - lot {numero} ({self.quantite})"
+
+    @classmethod
+    def ordre_fefo(cls, produit_id):
+        """Lots non vides du produit, premier à expirer en tête (sans date en dernier)."""
+        return cls.objects.filter(produit_id=produit_id, quantite__gt=0).order_by(
+            models.F('date_expiration').asc(nulls_last=True), 'pk',
+        )
+
+    @classmethod
+    def synchroniser(cls, produit_ids):
+        """Recalcule stock et prochaine expiration des produits depuis leurs lots (une requête)."""
+        from django.db.models import Min, OuterRef, Subquery, Sum, Value
+        from django.db.models.functions import Coalesce
+        lots = cls.objects.filter(produit_id=OuterRef('pk')).order_by().values('produit_id')
+        Produit.objects.filter(pk__in=produit_ids).update(
+            quantite_stock=Coalesce(Subquery(lots.annotate(s=Sum('quantite')).values('s')), Value(0)),
+            # Sans lot daté en stock, la date saisie sur la fiche est conservée.
+            date_expiration=Coalesce(
+                Subquery(lots.filter(quantite__gt=0).annotate(m=Min('date_expiration')).values('m')),
+                'date_expiration',
+            ),
+        )
+
+    @classmethod
+    def entrer(cls, produit, quantite, date_expiration=None, numero_lot=''):
+        """Crée un lot de `quantite` unités pour le produit et met son stock à jour."""
+        lot = cls.objects.create(
+            produit=produit, numero_lot=numero_lot, date_expiration=date_expiration,
+            quantite_initiale=quantite, quantite=quantite,
+        )
+        cls.synchroniser([produit.pk])
+        return lot
+
+    @classmethod
+    def _consommer(cls, produit_id, quantite):
+        """Retire `quantite` unités des lots en FEFO ; retourne [(lot_id, quantité prise)].
+
+        À appeler dans une transaction : les lots sont verrouillés jusqu'à la fin.
+        """
+        prises = []
+        reste = quantite
+        for lot_id, disponible in cls.ordre_fefo(produit_id).select_for_update().values_list('pk', 'quantite'):
+            prise = min(reste, disponible)
+            prises.append((lot_id, prise))
+            reste -= prise
+            if not reste:
+                break
+        if reste:
+            raise StockInsuffisant(f"Stock insuffisant ({quantite - reste} disponible(s) sur {quantite})")
+        for lot_id, prise in prises:
+            cls.objects.filter(pk=lot_id).update(quantite=models.F('quantite') - prise)
+        return prises
+
+    @classmethod
+    def allouer(cls, ligne):
+        """Sort la quantité d'une ligne de vente des lots (FEFO) et trace l'allocation."""
+        from django.db import transaction
+        with transaction.atomic():
+            prises = cls._consommer(ligne.produit_id, ligne.quantite)
+            AllocationLot.objects.bulk_create(
+                [AllocationLot(ligne=ligne, lot_id=lot_id, quantite=q) for lot_id, q in prises]
+            )
+            cls.synchroniser([ligne.produit_id])
+
+    @classmethod
+    def restituer(cls, lignes):
+        """Remet dans leurs lots les quantités allouées aux lignes de vente (avant suppression)."""
+        from django.db import transaction
+        from django.db.models import Sum
+        lignes = list(lignes)
+        allocations = AllocationLot.objects.filter(ligne__in=lignes)
+        with transaction.atomic():
+            rendus = allocations.values('lot_id').annotate(q=Sum('quantite')).order_by()
+            for r in rendus:
+                cls.objects.filter(pk=r['lot_id']).update(quantite=models.F('quantite') + r['q'])
+            # Lignes antérieures aux lots (ou allocations perdues) : le reliquat forme un lot.
+            alloue = dict(allocations.values_list('ligne_id').annotate(q=Sum('quantite')).order_by())
+            for ligne in lignes:
+                reste = ligne.quantite - (alloue.get(ligne.pk) or 0)
+                if reste > 0:
+                    cls.objects.create(
+                        produit_id=ligne.produit_id, date_expiration=ligne.produit.date_expiration,
+                        quantite_initiale=reste, quantite=reste,
+                    )
+            allocations.delete()
+            cls.synchroniser({l.produit_id for l in lignes})
+
+    @classmethod
+    def ajuster(cls, produit, stock, date_expiration=None):
+        """Ramène la somme des lots à `stock` (saisie manuelle, inventaire).
+
+        Un manquant est retiré en FEFO ; un surplus forme un nouveau lot daté
+        `date_expiration` (par défaut la prochaine expiration connue du produit).
+        """
+        from django.db import transaction
+        from django.db.models import Sum
+        with transaction.atomic():
+            actuel = cls.objects.filter(produit=produit).aggregate(s=Sum('quantite'))['s'] or 0
+            if stock < actuel:
+                cls._consommer(produit.pk, actuel - stock)
+            elif stock > actuel:
+                cls.objects.create(
+                    produit=produit, date_expiration=date_expiration or produit.date_expiration,
+                    quantite_initiale=stock - actuel, quantite=stock - actuel,
+                )
+            cls.synchroniser([produit.pk])
+
+
+class AllocationLot(models.Model):
+    """Quantité d'une ligne de vente prise dans un lot."""
+    ligne = models.ForeignKey(LigneVente, on_delete=models.CASCADE, related_name='allocations', verbose_name="Ligne de vente")
+    lot = models.ForeignKey(Lot, on_delete=models.CASCADE, related_name='allocations', verbose_name="Lot")
+    quantite = models.PositiveIntegerField(verbose_name="Quantité")
+
+    class Meta:
+        verbose_name = "Allocation de lot"
+        verbose_name_plural = "Allocations de lots"
+
+    def __str__(self):
+        return f"{self.ligne} <- {self.lot} x {self.quantite}"
+
+
+class ReceptionDejaValidee(Exception):
+    """La réception a déjà été portée en stock."""
+
+
+class Reception(models.Model):
+    """Bon de réception fournisseur : une livraison saisie en un écran, portée en stock en une fois."""
+    STATUT_CHOICES = (
+        ('brouillon', 'Brouillon'),
+        ('validee', 'Validée'),
+    )
+    code_reception = models.AutoField(primary_key=True, verbose_name="Code Réception")
+    fournisseur = models.ForeignKey(Fournisseur, on_delete=models.PROTECT, related_name='receptions', verbose_name="Fournisseur")
+    numero_bl = models.CharField(max_length=50, blank=True, verbose_name="N° bon de livraison")
+    date_reception = models.DateField(default=timezone.localdate, verbose_name="Date de réception")
+    utilisateur = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.PROTECT, verbose_name="Utilisateur")
+    statut = models.CharField(max_length=10, choices=STATUT_CHOICES, default='brouillon', verbose_name="Statut")
+    maj_prix_achat = models.BooleanField(default=False, verbose_name="Mettre à jour les prix d'achat")
+    observation = models.TextField(blank=True, verbose_name="Observation")
+    montant_total = models.DecimalField(max_digits=15, decimal_places=2, default=0, verbose_name="Montant total (FC)")
+    date_creation = models.DateTimeField(auto_now_add=True, verbose_name="Date de création")
+    date_validation = models.DateTimeField(null=True, blank=True, verbose_name="Date de validation")
+
+    class Meta:
+        verbose_name = "Réception"
+        verbose_name_plural = "Réceptions"
+        ordering = ['-date_creation']
+
+    def __str__(self):
+        return f"Réception #{self.code_reception} - {self.fournisseur.designation}"
+
+    def valider(self):
+        """Porte toutes les lignes en stock dans une seule transaction.
+
+        Un lot par ligne (bulk_create), puis un seul UPDATE des produits : stock et
+        quantité initiale incrémentés par expressions F, prochaine expiration
+        recalculée depuis les lots et, si demandé, prix d'achat remplacé par le
+        coût de la livraison (suivi du recalcul des prix de vente).
+        """
+        from django.db import transaction
+        from django.db.models import Case, F, Min, OuterRef, Subquery, Value, When
+        from django.db.models.functions import Coalesce
+
+        with transaction.atomic():
+            recu = Reception.objects.select_for_update().get(pk=self.pk)
+            if recu.statut != 'brouillon':
+                raise ReceptionDejaValidee(f"La réception #{self.pk} est déjà validée.")
+            lignes = list(self.lignes.all())
+            maintenant = timezone.now()
+            Lot.objects.bulk_create([
+                Lot(
+                    produit_id=l.produit_id, numero_lot=l.numero_lot, date_expiration=l.date_expiration,
+                    quantite_initiale=l.quantite, quantite=l.quantite, date_reception=maintenant,
+                    ligne_reception=l,
+                )
+                for l in lignes
+            ], batch_size=500)
+
+            quantites, prix = {}, {}
+            for l in lignes:
+                quantites[l.produit_id] = quantites.get(l.produit_id, 0) + l.quantite
+                prix[l.produit_id] = l.prix_achat
+            produit_ids = list(quantites)
+            lots = Lot.objects.filter(produit_id=OuterRef('pk'), quantite__gt=0).order_by().values('produit_id')
+            for i in range(0, len(produit_ids), 500):
+                tranche = produit_ids[i:i + 500]
+                increment = Case(*[When(pk=pk, then=Value(quantites[pk])) for pk in tranche], default=Value(0))
+                maj = {
+                    'quantite_stock': F('quantite_stock') + increment,
+                    'quantite_initiale': F('quantite_initiale') + increment,
+                    'date_expiration': Coalesce(
+                        Subquery(lots.annotate(m=Min('date_expiration')).values('m')), 'date_expiration',
+                    ),
+                }
+                if self.maj_prix_achat:
+                    maj['prix_achat'] = Case(
+                        *[When(pk=pk, then=Value(prix[pk])) for pk in tranche],
+                        default=F('prix_achat'), output_field=models.DecimalField(max_digits=12, decimal_places=2),
+                    )
+                Produit.objects.filter(pk__in=tranche).update(**maj)
+            if self.maj_prix_achat:
+                Produit.recalculer_prix_vente(produit_ids)
+
+            self.statut = 'validee'
+            self.date_validation = maintenant
+            self.montant_total = sum((l.montant for l in lignes), Decimal('0'))
+            self.save(update_fields=['statut', 'date_validation', 'montant_total'])
+            AlerteExpiration.rafraichir(produit_ids=produit_ids)
+        return len(lignes)
+
+
+class LigneReception(models.Model):
+    reception = models.ForeignKey(Reception, on_delete=models.CASCADE, related_name='lignes', verbose_name="Réception")
+    produit = models.ForeignKey(Produit, on_delete=models.PROTECT, related_name='lignes_reception', verbose_name="Produit")
+    quantite = models.PositiveIntegerField(verbose_name="Quantité reçue")
+    prix_achat = models.DecimalField(max_digits=12, decimal_places=2, verbose_name="Prix d'achat unitaire (FC)")
+    numero_lot = models.CharField(max_length=50, blank=True, verbose_name="N° de lot")
+    date_expiration = models.DateField(null=True, blank=True, verbose_name="Date d'expiration")
+
+    class Meta:
+        verbose_name = "Ligne de réception"
+        verbose_name_plural = "Lignes de réception"
+
+    def __str__(self):
+        return f"{self.produit} x {self.quantite}"
+
+    @property
+    def montant(self):
+        return self.quantite * self.prix_achat
+
 
 class Historique(models.Model):
     ACTION_CHOICES = (
@@ -192,21 +588,66 @@ class Historique(models.Model):
         ('suppression', 'Suppression'),
         ('connexion', 'Connexion'),
     )
-    date_action = models.DateTimeField(auto_now_add=True, verbose_name="Date")
+    # default plutôt que auto_now_add : l'écriture tamponnée (audit.py) conserve l'heure de l'événement.
+    date_action = models.DateTimeField(default=timezone.now, editable=False, verbose_name="Date")
     utilisateur = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, verbose_name="Utilisateur")
     action = models.CharField(max_length=20, choices=ACTION_CHOICES, verbose_name="Action")
     modele = models.CharField(max_length=100, verbose_name="Modèle", blank=True)
     detail = models.TextField(verbose_name="Détail", blank=True)
+    cible_type = models.CharField(max_length=50, blank=True, verbose_name="Type d'objet")
+    cible_id = models.BigIntegerField(null=True, blank=True, verbose_name="Identifiant de l'objet")
+    donnees = models.JSONField(default=dict, blank=True, encoder=DjangoJSONEncoder, verbose_name="Données")
 
     class Meta:
         verbose_name = "Historique"
         verbose_name_plural = "Historiques"
         ordering = ['-date_action']
+        indexes = [
+            models.Index(fields=['date_action', 'id'], name='historique_date_idx'),
+            models.Index(fields=['modele', 'date_action'], name='historique_modele_date_idx'),
+            models.Index(fields=['cible_type', 'cible_id'], name='historique_cible_idx'),
+        ]
 
     def __str__(self):
         return f"{self.date_action:%d/%m/%Y %H:%M} - {self.utilisateur} - {self.get_action_display()}"
 
 
+InventaireStats = namedtuple(
+    'InventaireStats',
+    ['nb_ecarts', 'nb_manquants', 'nb_excedents', 'nb_comptees', 'nb_non_comptees',
+     'nb_recomptages', 'nb_divergences'],
+)
+
+
+def stats_lignes_inventaire(prefix=''):
+    """Agrégats conditionnels des lignes d'inventaire (un seul COUNT groupé).
+
+    `prefix` vaut 'lignes__' pour annoter des inventaires, '' pour agréger
+    directement un queryset de lignes.
+    """
+    ecart, pk = f"{prefix}ecart", f"{prefix}pk"
+    manquant = models.Q(**{f"{ecart}__lt": 0})
+    excedent = models.Q(**{f"{ecart}__gt": 0})
+    return {
+        'stat_ecarts': models.Count(pk, filter=manquant | excedent),
+        'stat_manquants': models.Count(pk, filter=manquant),
+        'stat_excedents': models.Count(pk, filter=excedent),
+        'stat_comptees': models.Count(pk, filter=models.Q(**{f"{prefix}comptee": True})),
+        'stat_non_comptees': models.Count(pk, filter=models.Q(**{f"{prefix}comptee": False})),
+        'stat_recomptages': models.Count(pk, filter=models.Q(**{f"{prefix}recomptage_requis": True})),
+        'stat_divergences': models.Count(pk, filter=(
+            models.Q(**{f"{prefix}stock_recompte__lt": models.F(f"{prefix}stock_physique")})
+            | models.Q(**{f"{prefix}stock_recompte__gt": models.F(f"{prefix}stock_physique")})
+        )),
+    }
+
+
+class InventaireQuerySet(models.QuerySet):
+    def avec_stats(self):
+        """Annote les compteurs d'écarts / comptages en une seule requête groupée."""
+        return self.annotate(**stats_lignes_inventaire('lignes__'))
+
+
 class Inventaire(models.Model):
     STATUT_CHOICES = (
         ('brouillon', 'Brouillon'),
@@ -227,6 +668,13 @@ class Inventaire(models.Model):
     observation = models.TextField(blank=True, verbose_name="Observation")
     nb_produits_comptes = models.IntegerField(default=0, verbose_name="Nb produits comptés")
     total_ecart_valeur = models.DecimalField(max_digits=15, decimal_places=2, default=0, verbose_name="Valeur totale écart (FC)")
+    seuil_recomptage = models.PositiveIntegerField(
+        default=0,
+        verbose_name="Seuil de recomptage aveugle (unités)",
+        help_text="Un écart absolu supérieur ou égal déclenche un recomptage par un second compteur. 0 = désactivé.",
+    )
+
+    objects = InventaireQuerySet.as_manager()
 
     class Meta:
         verbose_name = "Inventaire"
@@ -236,25 +684,121 @@ class Inventaire(models.Model):
     def __str__(self):
         return f"Inventaire #{self.code_inventaire} - {self.date_creation:%d/%m/%Y}"
 
+    @cached_property
+    def stats(self):
+        """Compteurs des lignes, lus depuis avec_stats() si annotés, sinon un seul aggregate."""
+        if hasattr(self, 'stat_ecarts'):
+            valeurs = {k: getattr(self, k) for k in stats_lignes_inventaire()}
+        else:
+            valeurs = self.lignes.aggregate(**stats_lignes_inventaire())
+        return InventaireStats(*(valeurs[k] or 0 for k in stats_lignes_inventaire()))
+
+    def invalider_stats(self):
+        self.__dict__.pop('stats', None)
+        for k in stats_lignes_inventaire():
+            self.__dict__.pop(k, None)
+
     @property
     def nb_ecarts(self):
-        return self.lignes.exclude(ecart=0).count()
+        return self.stats.nb_ecarts
 
     @property
     def nb_manquants(self):
-        return self.lignes.filter(ecart__lt=0).count()
+        return self.stats.nb_manquants
 
     @property
     def nb_excedents(self):
-        return self.lignes.filter(ecart__gt=0).count()
+        return self.stats.nb_excedents
 
     @property
     def nb_comptees(self):
-        return self.lignes.filter(comptee=True).count()
+        return self.stats.nb_comptees
 
     @property
     def nb_non_comptees(self):
-        return self.lignes.filter(comptee=False).count()
+        return self.stats.nb_non_comptees
+
+    @property
+    def nb_recomptages(self):
+        return self.stats.nb_recomptages
+
+    @property
+    def nb_divergences(self):
+        return self.stats.nb_divergences
+
+    def repartir_zones(self, compteurs, mode='alphabetique'):
+        """Découpe les lignes en zones de comptage, une par compteur, sans chevauchement.
+
+        - alphabetique : blocs contigus de taille égale par désignation ;
+        - fournisseur : fournisseurs entiers répartis sur la zone la moins chargée.
+        Les zones existantes sont remplacées ; les comptages déjà saisis sont conservés.
+        """
+        compteurs = list(compteurs)
+        self.zones.all().delete()
+        if not compteurs:
+            return []
+
+        lignes = list(
+            self.lignes.select_related('produit__fournisseur')
+            .order_by('produit__designation')
+            .only('pk', 'produit__designation', 'produit__fournisseur__designation')
+        )
+        groupes = [{'noms': [], 'ids': []} for _ in compteurs]
+        if mode == 'fournisseur':
+            par_fournisseur = {}
+            for ligne in lignes:
+                par_fournisseur.setdefault(ligne.produit.fournisseur.designation, []).append(ligne.pk)
+            for nom, ids in sorted(par_fournisseur.items(), key=lambda item: -len(item[1])):
+                groupe = min(groupes, key=lambda g: len(g['ids']))
+                groupe['noms'].append(nom)
+                groupe['ids'].extend(ids)
+        else:
+            taille, reste = divmod(len(lignes), len(compteurs))
+            debut = 0
+            for i, groupe in enumerate(groupes):
+                bloc = lignes[debut:debut + taille + (1 if i < reste else 0)]
+                debut += len(bloc)
+                if bloc:
+                    groupe['noms'] = [f"{bloc[0].produit.designation[:15]} → {bloc[-1].produit.designation[:15]}"]
+                    groupe['ids'] = [l.pk for l in bloc]
+
+        zones = []
+        for ordre, (compteur, groupe) in enumerate(zip(compteurs, groupes), start=1):
+            libelle = ', '.join(sorted(groupe['noms'])) or 'vide'
+            zone = ZoneComptage.objects.create(
+                inventaire=self,
+                nom=f"Zone {ordre} : {libelle}"[:100],
+                compteur=compteur,
+                ordre=ordre,
+            )
+            if groupe['ids']:
+                self.lignes.filter(pk__in=groupe['ids']).update(zone=zone)
+            zones.append(zone)
+        self.compteurs_autorises.add(*compteurs)
+        return zones
+
+    def planifier_recomptage(self, ligne, compteur):
+        """Place la ligne en file de recomptage aveugle si son écart dépasse le seuil.
+
+        Le second compteur est le compteur autorisé (autre que le premier) ayant le
+        moins de recomptages en attente ; à défaut, la ligne reste à arbitrer.
+        """
+        if not self.seuil_recomptage or abs(ligne.ecart) < self.seuil_recomptage:
+            return None
+        second = (
+            self.compteurs_autorises.exclude(pk=compteur.pk)
+            .annotate(charge=models.Count(
+                'recomptages_inventaire',
+                filter=models.Q(recomptages_inventaire__inventaire=self,
+                                recomptages_inventaire__recomptage_requis=True),
+            ))
+            .order_by('charge', 'pk')
+            .first()
+        )
+        ligne.recomptage_requis = True
+        ligne.recompteur = second
+        ligne.save(update_fields=['recomptage_requis', 'recompteur'])
+        return second
 
     def recalculer_totaux(self):
         from django.db.models import Sum
@@ -264,17 +808,54 @@ class Inventaire(models.Model):
         )
         self.nb_produits_comptes = agg['n'] or 0
         self.total_ecart_valeur = agg['v'] or Decimal('0')
+        self.invalider_stats()
+
+
+class ZoneComptage(models.Model):
+    inventaire = models.ForeignKey(Inventaire, on_delete=models.CASCADE, related_name='zones', verbose_name="Inventaire")
+    nom = models.CharField(max_length=100, verbose_name="Nom de la zone")
+    compteur = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='zones_comptage',
+        verbose_name="Compteur assigné"
+    )
+    ordre = models.PositiveIntegerField(default=0, verbose_name="Ordre")
+
+    class Meta:
+        verbose_name = "Zone de comptage"
+        verbose_name_plural = "Zones de comptage"
+        ordering = ['ordre', 'pk']
+
+    def __str__(self):
+        return self.nom
 
 
 class LigneInventaire(models.Model):
     inventaire = models.ForeignKey(Inventaire, on_delete=models.CASCADE, related_name='lignes', verbose_name="Inventaire")
     produit = models.ForeignKey(Produit, on_delete=models.PROTECT, verbose_name="Produit")
+    zone = models.ForeignKey(
+        ZoneComptage, on_delete=models.SET_NULL, null=True, blank=True,
+        related_name='lignes', verbose_name="Zone de comptage"
+    )
     stock_theorique = models.IntegerField(verbose_name="Stock théorique")
     stock_physique = models.IntegerField(verbose_name="Stock physique")
     ecart = models.IntegerField(default=0, verbose_name="Écart")
     prix_achat = models.DecimalField(max_digits=12, decimal_places=2, default=0, verbose_name="Prix d'achat (FC)")
     valeur_ecart = models.DecimalField(max_digits=15, decimal_places=2, default=0, verbose_name="Valeur écart (FC)")
     comptee = models.BooleanField(default=False, verbose_name="Comptée")
+    compte_par = models.ForeignKey(
+        settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True,
+        related_name='+', verbose_name="Compté par"
+    )
+    recomptage_requis = models.BooleanField(default=False, verbose_name="Recomptage requis")
+    recompteur = models.ForeignKey(
+        settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True,
+        related_name='recomptages_inventaire', verbose_name="Second compteur"
+    )
+    stock_recompte = models.IntegerField(null=True, blank=True, verbose_name="Stock recompté")
 
     class Meta:
         verbose_name = "Ligne d'inventaire"
@@ -285,8 +866,744 @@ class LigneInventaire(models.Model):
     def __str__(self):
         return f"{self.produit.designation} (théo: {self.stock_theorique}, phys: {self.stock_physique})"
 
+    @property
+    def recomptage_divergent(self):
+        return self.stock_recompte is not None and self.stock_recompte != self.stock_physique
+
+    def enregistrer_comptage(self, quantite, compteur):
+        """Premier comptage (ou arbitrage) : remplace toute reprise précédente."""
+        self.stock_physique = quantite
+        self.comptee = True
+        self.compte_par = compteur
+        self.recomptage_requis = False
+        self.recompteur = None
+        self.stock_recompte = None
+
+    def enregistrer_recomptage(self, quantite):
+        """Recomptage aveugle : conservé à côté du premier comptage pour rapprochement."""
+        self.stock_recompte = quantite
+        self.recomptage_requis = False
+
     def save(self, *args, **kwargs):
         self.ecart = self.stock_physique - self.stock_theorique
         self.valeur_ecart = (Decimal(self.ecart) * self.prix_achat).quantize(Decimal('0.01'))
         super().save(*args, **kwargs)
 
+
+
+class SuiviEcartProduit(models.Model):
+    """Historique cumulé des écarts d'inventaire d'un produit (inventaires validés uniquement).
+
+    Table précalculée : rafraîchie à chaque validation d'inventaire pour les produits
+    concernés, ou entièrement via `manage.py rafraichir_ecarts`.
+    """
+    produit = models.OneToOneField(Produit, on_delete=models.CASCADE, related_name='suivi_ecart', verbose_name="Produit")
+    nb_inventaires = models.IntegerField(default=0, verbose_name="Nb inventaires")
+    nb_ecarts = models.IntegerField(default=0, verbose_name="Nb inventaires avec écart")
+    nb_manquants = models.IntegerField(default=0, verbose_name="Nb inventaires en manquant")
+    cumul_ecart = models.IntegerField(default=0, verbose_name="Écart cumulé (unités)")
+    cumul_valeur_ecart = models.DecimalField(max_digits=15, decimal_places=2, default=0, verbose_name="Valeur écart cumulée (FC)")
+    cumul_pertes = models.DecimalField(max_digits=15, decimal_places=2, default=0, verbose_name="Pertes cumulées (FC)")
+    date_dernier_inventaire = models.DateTimeField(null=True, blank=True, verbose_name="Dernier inventaire validé")
+    date_mise_a_jour = models.DateTimeField(auto_now=True, verbose_name="Date de mise à jour")
+
+    class Meta:
+        verbose_name = "Suivi des écarts produit"
+        verbose_name_plural = "Suivi des écarts produits"
+        ordering = ['cumul_valeur_ecart']
+        indexes = [
+            models.Index(fields=['cumul_valeur_ecart'], name='suivi_ecart_valeur_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.produit} : {self.cumul_valeur_ecart} FC sur {self.nb_inventaires} inventaire(s)"
+
+    @classmethod
+    def rafraichir(cls, produit_ids=None):
+        """Recalcule l'historique en une requête groupée sur les inventaires validés."""
+        from django.db.models import Count, Sum, Max, Q
+        lignes = LigneInventaire.objects.filter(inventaire__statut='valide')
+        if produit_ids is not None:
+            lignes = lignes.filter(produit_id__in=produit_ids)
+        agregats = lignes.values('produit_id').annotate(
+            nb_inventaires=Count('pk'),
+            nb_ecarts=Count('pk', filter=Q(ecart__lt=0) | Q(ecart__gt=0)),
+            nb_manquants=Count('pk', filter=Q(ecart__lt=0)),
+            cumul_ecart=Sum('ecart'),
+            cumul_valeur_ecart=Sum('valeur_ecart'),
+            cumul_pertes=Sum('valeur_ecart', filter=Q(valeur_ecart__lt=0)),
+            date_dernier_inventaire=Max('inventaire__date_validation'),
+        ).order_by()
+        suivis = [
+            cls(
+                produit_id=a['produit_id'],
+                nb_inventaires=a['nb_inventaires'],
+                nb_ecarts=a['nb_ecarts'],
+                nb_manquants=a['nb_manquants'],
+                cumul_ecart=a['cumul_ecart'] or 0,
+                cumul_valeur_ecart=a['cumul_valeur_ecart'] or Decimal('0'),
+                cumul_pertes=a['cumul_pertes'] or Decimal('0'),
+                date_dernier_inventaire=a['date_dernier_inventaire'],
+            )
+            for a in agregats
+        ]
+        champs = ['nb_inventaires', 'nb_ecarts', 'nb_manquants', 'cumul_ecart',
+                  'cumul_valeur_ecart', 'cumul_pertes', 'date_dernier_inventaire', 'date_mise_a_jour']
+        # Produits sans plus aucune ligne validée (inventaire supprimé) : suivi obsolète.
+        obsoletes = cls.objects.exclude(produit_id__in=lignes.values('produit_id'))
+        if produit_ids is not None:
+            obsoletes = obsoletes.filter(produit_id__in=produit_ids)
+        obsoletes.delete()
+        cls.objects.bulk_create(
+            suivis, batch_size=500,
+            update_conflicts=True, unique_fields=['produit'], update_fields=champs,
+        )
+        return len(suivis)
+
+
+class VelociteProduit(models.Model):
+    """Vitesse de vente d'un produit et seuils de réapprovisionnement qui en découlent.
+
+    Table précalculée chaque nuit par `manage.py calculer_velocites` à partir des
+    lignes de vente des 90 derniers jours (journée en cours exclue). La réquisition
+    compare le stock courant à `point_commande` et propose de remonter à `stock_cible`.
+    """
+    PERIODES = (7, 30, 90)
+    # Poids des moyennes 7 / 30 / 90 jours dans la vitesse retenue.
+    PONDERATIONS = (Decimal('0.5'), Decimal('0.3'), Decimal('0.2'))
+
+    produit = models.OneToOneField(Produit, on_delete=models.CASCADE, related_name='velocite', verbose_name="Produit")
+    qte_7j = models.IntegerField(default=0, verbose_name="Vendu sur 7 jours")
+    qte_30j = models.IntegerField(default=0, verbose_name="Vendu sur 30 jours")
+    qte_90j = models.IntegerField(default=0, verbose_name="Vendu sur 90 jours")
+    velocite = models.DecimalField(max_digits=12, decimal_places=3, default=0, verbose_name="Ventes / jour")
+    point_commande = models.IntegerField(default=0, verbose_name="Point de commande")
+    stock_cible = models.IntegerField(default=0, verbose_name="Stock cible")
+    date_calcul = models.DateField(verbose_name="Calculé le")
+
+    class Meta:
+        verbose_name = "Vitesse de vente produit"
+        verbose_name_plural = "Vitesses de vente produits"
+        ordering = ['-velocite']
+
+    def __str__(self):
+        return f"{self.produit} : {self.velocite}/jour (commande à {self.point_commande})"
+
+    @property
+    def moyenne_7j(self):
+        return Decimal(self.qte_7j) / 7
+
+    @property
+    def moyenne_30j(self):
+        return Decimal(self.qte_30j) / 30
+
+    @property
+    def moyenne_90j(self):
+        return Decimal(self.qte_90j) / 90
+
+    @classmethod
+    def rafraichir(cls, date_ref=None):
+        """Recalcule les vitesses de tout le catalogue.
+
+        Les trois fenêtres sont agrégées en une seule requête groupée (sommes
+        conditionnelles) ; les seuils sont ensuite dérivés produit par produit :
+          point_commande = max(ceil(vitesse × (délai fournisseur + jours de sécurité)), quantite_alerte)
+          stock_cible    = max(ceil(vitesse × (délai + sécurité + couverture)), quantite_alerte)
+        Sans vente sur la période on retombe donc sur le seuil d'alerte fixe.
+        """
+        import math
+        from datetime import datetime, time, timedelta
+        from django.db.models import Sum, Q
+
+        date_ref = date_ref or timezone.localdate()
+        fin = timezone.make_aware(datetime.combine(date_ref, time.min))
+        debuts = {j: fin - timedelta(days=j) for j in cls.PERIODES}
+        agregats = (
+            LigneVente.objects
+            .filter(vente__date_vente__gte=debuts[90], vente__date_vente__lt=fin)
+            .values('produit_id')
+            .annotate(
+                qte_7j=Sum('quantite', filter=Q(vente__date_vente__gte=debuts[7])),
+                qte_30j=Sum('quantite', filter=Q(vente__date_vente__gte=debuts[30])),
+                qte_90j=Sum('quantite'),
+            )
+            .order_by()
+        )
+        ventes = {a['produit_id']: a for a in agregats}
+
+        securite = getattr(settings, 'REAPPRO_JOURS_SECURITE', 7)
+        couverture = getattr(settings, 'REAPPRO_JOURS_COUVERTURE', 30)
+        lignes = []
+        produits = Produit.objects.values_list('pk', 'quantite_alerte', 'fournisseur__delai_livraison')
+        for pk, alerte, delai in produits.iterator(chunk_size=2000):
+            a = ventes.get(pk, {})
+            qtes = [a.get(f'qte_{j}j') or 0 for j in cls.PERIODES]
+            velocite = sum(
+                (Decimal(q) / j * poids for q, j, poids in zip(qtes, cls.PERIODES, cls.PONDERATIONS)),
+                Decimal('0'),
+            ).quantize(Decimal('0.001'))
+            lignes.append(cls(
+                produit_id=pk,
+                qte_7j=qtes[0], qte_30j=qtes[1], qte_90j=qtes[2],
+                velocite=velocite,
+                point_commande=max(math.ceil(velocite * (delai + securite)), alerte),
+                stock_cible=max(math.ceil(velocite * (delai + securite + couverture)), alerte),
+                date_calcul=date_ref,
+            ))
+        cls.objects.bulk_create(
+            lignes, batch_size=500,
+            update_conflicts=True, unique_fields=['produit'],
+            update_fields=['qte_7j', 'qte_30j', 'qte_90j', 'velocite', 'point_commande', 'stock_cible', 'date_calcul'],
+        )
+        return len(lignes)
+
+
+class PrevisionProduit(models.Model):
+    """Prévision des ventes journalières d'un produit (cf. prevision.py).
+
+    `previsions[0]` correspond au jour `date_calcul`, premier jour non couvert par
+    l'historique. Recalculée chaque nuit par `manage.py calculer_previsions`.
+    """
+    produit = models.OneToOneField(Produit, on_delete=models.CASCADE, related_name='prevision', verbose_name="Produit")
+    date_calcul = models.DateField(verbose_name="Calculée le")
+    moyenne_jour = models.DecimalField(max_digits=12, decimal_places=3, default=0, verbose_name="Ventes prévues / jour")
+    previsions = models.JSONField(default=list, blank=True, verbose_name="Prévisions journalières")
+
+    class Meta:
+        verbose_name = "Prévision de ventes"
+        verbose_name_plural = "Prévisions de ventes"
+        ordering = ['-moyenne_jour']
+
+    def __str__(self):
+        return f"{self.produit} : {self.moyenne_jour}/jour prévu ({len(self.previsions)} j)"
+
+    def date_rupture(self, stock):
+        """Date à laquelle `stock` sera épuisé selon la prévision, None au-delà de l'horizon."""
+        from datetime import timedelta
+        if stock <= 0:
+            return self.date_calcul
+        cumul = 0
+        for jour, quantite in enumerate(self.previsions):
+            cumul += quantite
+            if cumul >= stock:
+                return self.date_calcul + timedelta(days=jour)
+        return None
+
+
+class AlerteExpiration(models.Model):
+    """Lot en stock expiré ou dans la fenêtre d'alerte d'expiration de son produit.
+
+    Table précalculée chaque nuit par `manage.py rafraichir_alertes_expiration`
+    (et pour un produit à chaque mouvement saisi sur sa fiche). Le tableau de bord
+    et le rapport des pertes lisent ces lignes plutôt que de tester chaque lot.
+    """
+    STATUT_CHOICES = (
+        ('expire', 'Expiré'),
+        ('alerte', 'Expiration proche'),
+    )
+
+    lot = models.OneToOneField(Lot, on_delete=models.CASCADE, related_name='alerte_expiration', verbose_name="Lot")
+    produit = models.ForeignKey(Produit, on_delete=models.CASCADE, related_name='+', verbose_name="Produit")
+    fournisseur = models.ForeignKey(Fournisseur, on_delete=models.CASCADE, related_name='+', verbose_name="Fournisseur")
+    statut = models.CharField(max_length=10, choices=STATUT_CHOICES, verbose_name="Statut")
+    date_expiration = models.DateField(verbose_name="Date d'expiration")
+    mois_expiration = models.DateField(verbose_name="Mois d'expiration")
+    jours_restants = models.IntegerField(verbose_name="Jours restants")
+    quantite_stock = models.IntegerField(verbose_name="Stock")
+    prix_achat = models.DecimalField(max_digits=12, decimal_places=2, verbose_name="Prix d'achat (FC)")
+    valeur_risque = models.DecimalField(max_digits=15, decimal_places=2, verbose_name="Valeur à risque (FC)")
+    date_calcul = models.DateField(verbose_name="Calculée le")
+
+    class Meta:
+        verbose_name = "Alerte d'expiration"
+        verbose_name_plural = "Alertes d'expiration"
+        ordering = ['date_expiration']
+        indexes = [
+            models.Index(fields=['statut', 'date_expiration'], name='alerte_exp_statut_idx'),
+            models.Index(fields=['mois_expiration', 'fournisseur'], name='alerte_exp_mois_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.lot} : {self.get_statut_display()} le {self.date_expiration:%d/%m/%Y}"
+
+    @classmethod
+    def rafraichir(cls, date_ref=None, produit_ids=None):
+        """Recalcule les alertes (tout le catalogue, ou seulement `produit_ids`).
+
+        Statut et valeur à risque (quantité du lot × prix d'achat) sont calculés par la
+        base en une requête sur les lots ; retourne le nombre de lots en alerte.
+        """
+        from django.db import transaction
+        from django.db.models.functions import TruncMonth
+        date_ref = date_ref or timezone.localdate()
+        lots = Lot.objects.filter(quantite__gt=0, date_expiration__isnull=False)
+        if produit_ids is not None:
+            lots = lots.filter(produit_id__in=produit_ids)
+        lignes = (
+            lots.filter(q_alerte_expiration(date_ref, jours='produit__jours_alerte_expiration'))
+            .annotate(
+                statut=models.Case(
+                    models.When(date_expiration__lte=date_ref, then=models.Value('expire')),
+                    default=models.Value('alerte'),
+                ),
+                valeur_risque=models.F('quantite') * models.F('produit__prix_achat'),
+                mois_expiration=TruncMonth('date_expiration', output_field=models.DateField()),
+            )
+            .values_list('pk', 'produit_id', 'produit__fournisseur_id', 'statut', 'date_expiration',
+                         'mois_expiration', 'quantite', 'produit__prix_achat', 'valeur_risque')
+            .order_by()
+        )
+        alertes = [
+            cls(
+                lot_id=pk, produit_id=produit_id, fournisseur_id=fournisseur_id, statut=statut,
+                date_expiration=expiration, mois_expiration=mois,
+                jours_restants=(expiration - date_ref).days,
+                quantite_stock=stock, prix_achat=prix, valeur_risque=valeur,
+                date_calcul=date_ref,
+            )
+            for pk, produit_id, fournisseur_id, statut, expiration, mois, stock, prix, valeur
+            in lignes.iterator(chunk_size=2000)
+        ]
+        anciennes = cls.objects.all()
+        if produit_ids is not None:
+            anciennes = anciennes.filter(produit_id__in=produit_ids)
+        with transaction.atomic():
+            anciennes.delete()
+            cls.objects.bulk_create(alertes, batch_size=500)
+        return len(alertes)
+
+    @classmethod
+    def rafraichir_si_perime(cls):
+        """Recalcule la table si elle n'a pas encore été calculée aujourd'hui (tâche de nuit manquée)."""
+        from django.core.cache import cache
+        aujourd_hui = timezone.localdate()
+        if cache.get('alertes_expiration:date_calcul') == aujourd_hui:
+            return
+        if cls.objects.filter(date_calcul__lt=aujourd_hui).exists() or not cls.objects.exists():
+            cls.rafraichir(aujourd_hui)
+        cache.set('alertes_expiration:date_calcul', aujourd_hui, 24 * 3600)
+
+
+def _bornes_mois(mois):
+    """(début, fin) en datetimes conscients du mois commençant le `mois` (un 1er du mois)."""
+    from datetime import datetime, time
+    suivant = (mois.replace(day=28) + timedelta(days=4)).replace(day=1)
+    return (timezone.make_aware(datetime.combine(mois, time.min)),
+            timezone.make_aware(datetime.combine(suivant, time.min)))
+
+
+class MoisCubeVentes(models.Model):
+    """État de rafraîchissement du cube des ventes, un enregistrement par mois.
+
+    Un mois est à recalculer quand une vente y est modifiée ou supprimée
+    (`invalider`) ; `version` évite de perdre une invalidation survenue pendant
+    un recalcul. Les ventes créées sont repérées par le filigrane `derniere_vente`
+    (plus grand code de vente agrégé), sans écriture à chaque vente.
+    """
+    mois = models.DateField(unique=True, verbose_name="Mois")
+    a_recalculer = models.BooleanField(default=True, verbose_name="À recalculer")
+    version = models.PositiveIntegerField(default=0)
+    derniere_vente = models.BigIntegerField(default=0, verbose_name="Dernière vente agrégée")
+    date_calcul = models.DateTimeField(null=True, blank=True, verbose_name="Calculé le")
+
+    class Meta:
+        verbose_name = "Mois du cube des ventes"
+        verbose_name_plural = "Mois du cube des ventes"
+        ordering = ['-mois']
+
+    def __str__(self):
+        return f"{self.mois:%m/%Y}{' (à recalculer)' if self.a_recalculer else ''}"
+
+    @classmethod
+    def invalider(cls, date_vente):
+        mois = timezone.localtime(date_vente).date().replace(day=1)
+        if not cls.objects.filter(mois=mois).update(a_recalculer=True, version=models.F('version') + 1):
+            cls.objects.get_or_create(mois=mois)
+
+
+class CubeVentes(models.Model):
+    """Ventes pré-agrégées par mois × produit × fournisseur × vendeur × client.
+
+    Les rapports de période lisent ces cellules au lieu des lignes de vente.
+    Rafraîchi mois par mois par `rafraichir` (`manage.py rafraichir_cube_ventes`).
+    """
+    mois = models.DateField(verbose_name="Mois")
+    produit = models.ForeignKey(Produit, on_delete=models.CASCADE, related_name='+', verbose_name="Produit")
+    fournisseur = models.ForeignKey(Fournisseur, on_delete=models.CASCADE, related_name='+', verbose_name="Fournisseur")
+    vendeur = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='+', verbose_name="Vendeur")
+    client = models.ForeignKey(Client, on_delete=models.SET_NULL, null=True, blank=True, related_name='+', verbose_name="Client")
+    quantite = models.IntegerField(default=0, verbose_name="Quantité")
+    montant = models.DecimalField(max_digits=15, decimal_places=2, default=0, verbose_name="Montant brut (FC)")
+    nb_lignes = models.IntegerField(default=0, verbose_name="Nb lignes")
+
+    class Meta:
+        verbose_name = "Cube des ventes"
+        verbose_name_plural = "Cube des ventes"
+        indexes = [
+            models.Index(fields=['mois', 'fournisseur'], name='cube_mois_fournisseur_idx'),
+            models.Index(fields=['mois', 'produit'], name='cube_mois_produit_idx'),
+            models.Index(fields=['mois', 'vendeur'], name='cube_mois_vendeur_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.mois:%m/%Y} - {self.produit_id} - {self.montant} FC"
+
+    @classmethod
+    def rafraichir(cls, complet=False):
+        """Recalcule les mois invalidés et ceux des ventes créées depuis le dernier passage.
+
+        `complet=True` reconstruit tout l'historique. Retourne le nombre de mois recalculés.
+        """
+        from django.db.models import Max
+        from django.db.models.functions import TruncMonth
+        ventes = Vente.objects.order_by()
+        if not complet:
+            filigrane = MoisCubeVentes.objects.aggregate(m=Max('derniere_vente'))['m'] or 0
+            ventes = ventes.filter(pk__gt=filigrane)
+        mois = set(
+            ventes.annotate(m=TruncMonth('date_vente', output_field=models.DateField()))
+            .values_list('m', flat=True).distinct()
+        )
+        etats = MoisCubeVentes.objects.all() if complet else MoisCubeVentes.objects.filter(a_recalculer=True)
+        mois.update(etats.values_list('mois', flat=True))
+        for m in sorted(mois):
+            cls.recalculer_mois(m)
+        return len(mois)
+
+    @classmethod
+    def recalculer_mois(cls, mois):
+        from django.db import transaction
+        from django.db.models import Count, Max, Sum
+        from django.db.models.functions import Coalesce
+        etat, _ = MoisCubeVentes.objects.get_or_create(mois=mois)
+        version = etat.version
+        debut, fin = _bornes_mois(mois)
+        # Filigrane lu avant l'agrégation : une vente enregistrée pendant le calcul a un code
+        # supérieur, elle est reprise au passage suivant sans invalider le mois.
+        derniere = Vente.objects.filter(date_vente__gte=debut, date_vente__lt=fin).aggregate(m=Max('pk'))['m'] or 0
+        agregats = (
+            LigneVente.objects
+            .filter(vente__date_vente__gte=debut, vente__date_vente__lt=fin, vente_id__lte=derniere)
+            .values('produit_id', 'vente__vendeur_id', 'vente__client_id',
+                    fournisseur_vente=Coalesce('fournisseur_id', 'produit__fournisseur_id'))
+            .annotate(quantite=Sum('quantite'), montant=Sum('montant_ligne'), nb_lignes=Count('pk'))
+            .order_by()
+        )
+        cellules = [
+            cls(
+                mois=mois,
+                produit_id=a['produit_id'],
+                fournisseur_id=a['fournisseur_vente'],
+                vendeur_id=a['vente__vendeur_id'],
+                client_id=a['vente__client_id'],
+                quantite=a['quantite'],
+                montant=a['montant'],
+                nb_lignes=a['nb_lignes'],
+            )
+            for a in agregats
+        ]
+        with transaction.atomic():
+            cls.objects.filter(mois=mois).delete()
+            cls.objects.bulk_create(cellules, batch_size=1000)
+            MoisCubeVentes.objects.filter(pk=etat.pk).update(
+                derniere_vente=derniere, date_calcul=timezone.now(),
+            )
+            MoisCubeVentes.objects.filter(pk=etat.pk, version=version).update(a_recalculer=False)
+        return len(cellules)
+
+
+def _bornes_jour(jour):
+    """(début, fin) en datetimes conscients de la journée `jour`."""
+    from datetime import datetime, time
+    debut = timezone.make_aware(datetime.combine(jour, time.min))
+    return debut, timezone.make_aware(datetime.combine(jour + timedelta(days=1), time.min))
+
+
+class ClotureImmuable(Exception):
+    """Une clôture de journée, ses lignes et ses ajustements ne se modifient ni ne se suppriment."""
+
+
+class EnregistrementFige(models.Model):
+    """Enregistrement créé une fois puis figé : `save` sur une ligne existante et `delete` sont refusés."""
+
+    class Meta:
+        abstract = True
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding:
+            raise ClotureImmuable(f"{self._meta.verbose_name} est figé et ne peut plus être modifié.")
+        super().save(*args, **kwargs)
+
+    def delete(self, *args, **kwargs):
+        raise ClotureImmuable(f"{self._meta.verbose_name} est figé et ne peut pas être supprimé.")
+
+
+class ClotureJournee(EnregistrementFige):
+    """Clôture (rapport Z) d'une journée de vente.
+
+    À la clôture, les totaux de la journée sont figés par vendeur et par mode de
+    paiement (LigneCloture) avec le comptage de caisse de chaque vendeur
+    (CaisseCloture). Une vente de la journée créée, modifiée ou supprimée ensuite
+    ne touche pas ces lignes : l'écart est ajouté en AjustementCloture
+    (`ajuster`). Les rapports de période lisent les clôtures et leurs
+    ajustements, quelques lignes par jour, au lieu des ventes (`totaux_periode`).
+    """
+    jour = models.DateField(unique=True, verbose_name="Journée")
+    cloture_par = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.PROTECT, related_name='+', verbose_name="Clôturée par")
+    date_cloture = models.DateTimeField(auto_now_add=True, verbose_name="Clôturée le")
+    observation = models.TextField(blank=True, verbose_name="Observation")
+
+    class Meta:
+        verbose_name = "Clôture de journée"
+        verbose_name_plural = "Clôtures de journée"
+        ordering = ['-jour']
+
+    def __str__(self):
+        return f"Clôture du {self.jour:%d/%m/%Y}"
+
+    @classmethod
+    def cloturer(cls, jour, utilisateur, especes=None, observation=''):
+        """Fige la journée `jour`. `especes` : {vendeur_id: montant compté en caisse}.
+
+        Lève ClotureImmuable si la journée est déjà clôturée.
+        """
+        from django.db import IntegrityError, transaction
+        from django.db.models import Count, Sum
+        especes = especes or {}
+        debut, fin = _bornes_jour(jour)
+        try:
+            with transaction.atomic():
+                cloture = cls.objects.create(jour=jour, cloture_par=utilisateur, observation=observation)
+                groupes = (
+                    Vente.objects.filter(date_vente__gte=debut, date_vente__lt=fin)
+                    .values('vendeur_id', 'mode_paiement')
+                    .annotate(nb_ventes=Count('pk'), **{champ: Sum(champ) for champ in MONTANTS_CLOTURE})
+                    .order_by()
+                )
+                lignes = [LigneCloture(cloture=cloture, **g) for g in groupes]
+                LigneCloture.objects.bulk_create(lignes)
+                attendu = {}
+                for l in lignes:
+                    attendu[l.vendeur_id] = attendu.get(l.vendeur_id, Decimal('0')) + l.montant_paye
+                CaisseCloture.objects.bulk_create([
+                    CaisseCloture(
+                        cloture=cloture, vendeur_id=vendeur_id,
+                        montant_attendu=attendu.get(vendeur_id, Decimal('0')),
+                        montant_compte=especes.get(vendeur_id),
+                    )
+                    for vendeur_id in sorted(attendu.keys() | especes.keys())
+                ])
+        except IntegrityError:
+            raise ClotureImmuable(f"La journée du {jour:%d/%m/%Y} est déjà clôturée.")
+        return cloture
+
+    @classmethod
+    def ajuster(cls, code_vente, avant, apres, utilisateur):
+        """Consigne l'écart d'une vente d'une journée clôturée entre deux états `Vente.etat_cloture()`.
+
+        `avant` vaut None pour une création, `apres` None pour une suppression.
+        Sans effet si la journée n'est pas clôturée ; retourne le nombre d'ajustements créés.
+        """
+        jours = {etat['jour'] for etat in (avant, apres) if etat}
+        clotures = {c.jour: c for c in cls.objects.filter(jour__in=jours)}
+        if not clotures:
+            return 0
+        action = 'creation' if avant is None else 'suppression' if apres is None else 'modification'
+        ecarts = {}
+        for etat, signe in ((avant, -1), (apres, 1)):
+            if etat is None or etat['jour'] not in clotures:
+                continue
+            cle = (etat['jour'], etat['vendeur_id'], etat['mode_paiement'])
+            ecart = ecarts.setdefault(cle, {'nb_ventes': 0, **dict.fromkeys(MONTANTS_CLOTURE, Decimal('0'))})
+            ecart['nb_ventes'] += signe
+            for champ in MONTANTS_CLOTURE:
+                ecart[champ] += signe * Decimal(etat[champ] or 0)
+        ajustements = [
+            AjustementCloture(
+                cloture=clotures[jour], code_vente=code_vente, vendeur_id=vendeur_id,
+                mode_paiement=mode, action=action, utilisateur=utilisateur, **ecart,
+            )
+            for (jour, vendeur_id, mode), ecart in ecarts.items()
+            if any(ecart.values())
+        ]
+        AjustementCloture.objects.bulk_create(ajustements)
+        return len(ajustements)
+
+    @classmethod
+    def totaux_periode(cls, date_debut=None, date_fin=None, vendeur_id=None):
+        """Nombre de ventes et montants par mode de paiement du `date_debut` au `date_fin` inclus.
+
+        Journées clôturées : lignes de clôture plus ajustements ; journées
+        ouvertes (en général les derniers jours) : agrégat des ventes, une plage
+        de dates par suite de jours ouverts.
+        """
+        from django.db.models import Count, Q, Sum
+        date_debut = date_debut or date(2000, 1, 1)
+        date_fin = date_fin or timezone.localdate()
+        totaux = {
+            mode: {'nb_ventes': 0, **dict.fromkeys(MONTANTS_CLOTURE, Decimal('0'))}
+            for mode, _ in Vente.MODE_PAIEMENT_CHOICES
+        }
+
+        def cumuler(groupes):
+            for g in groupes:
+                t = totaux[g.pop('mode_paiement')]
+                for champ, valeur in g.items():
+                    t[champ] += valeur or 0
+
+        sommes = {'nb_ventes': Sum('nb_ventes'), **{champ: Sum(champ) for champ in MONTANTS_CLOTURE}}
+        for modele in (LigneCloture, AjustementCloture):
+            figes = modele.objects.filter(cloture__jour__gte=date_debut, cloture__jour__lte=date_fin)
+            if vendeur_id:
+                figes = figes.filter(vendeur_id=vendeur_id)
+            cumuler(figes.values('mode_paiement').annotate(**sommes).order_by())
+
+        jours_clos = cls.objects.filter(jour__gte=date_debut, jour__lte=date_fin).order_by('jour').values_list('jour', flat=True)
+        plages, debut = Q(), date_debut
+        for jour in jours_clos:
+            if jour > debut:
+                plages |= Q(date_vente__gte=_bornes_jour(debut)[0], date_vente__lt=_bornes_jour(jour)[0])
+            debut = jour + timedelta(days=1)
+        if debut <= date_fin:
+            plages |= Q(date_vente__gte=_bornes_jour(debut)[0], date_vente__lt=_bornes_jour(date_fin)[1])
+        if plages:
+            ventes = Vente.objects.filter(plages)
+            if vendeur_id:
+                ventes = ventes.filter(vendeur_id=vendeur_id)
+            cumuler(
+                ventes.values('mode_paiement')
+                .annotate(nb_ventes=Count('pk'), **{champ: Sum(champ) for champ in MONTANTS_CLOTURE})
+                .order_by()
+            )
+        return totaux
+
+
+class LigneCloture(EnregistrementFige):
+    """Totaux figés d'un vendeur pour un mode de paiement, dans une clôture de journée."""
+    cloture = models.ForeignKey(ClotureJournee, on_delete=models.PROTECT, related_name='lignes', verbose_name="Clôture")
+    vendeur = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.PROTECT, related_name='+', verbose_name="Vendeur")
+    mode_paiement = models.CharField(max_length=10, choices=Vente.MODE_PAIEMENT_CHOICES, verbose_name="Mode de paiement")
+    nb_ventes = models.IntegerField(default=0, verbose_name="Nombre de ventes")
+    montant_total = models.DecimalField(max_digits=15, decimal_places=2, default=0, verbose_name="Montant brut (FC)")
+    montant_remise = models.DecimalField(max_digits=15, decimal_places=2, default=0, verbose_name="Remises (FC)")
+    montant_net = models.DecimalField(max_digits=15, decimal_places=2, default=0, verbose_name="Net (FC)")
+    montant_paye = models.DecimalField(max_digits=15, decimal_places=2, default=0, verbose_name="Encaissé (FC)")
+
+    class Meta:
+        verbose_name = "Ligne de clôture"
+        verbose_name_plural = "Lignes de clôture"
+        unique_together = ('cloture', 'vendeur', 'mode_paiement')
+
+    def __str__(self):
+        return f"{self.cloture} - {self.vendeur_id} - {self.get_mode_paiement_display()}"
+
+
+class CaisseCloture(EnregistrementFige):
+    """Comptage de caisse d'un vendeur à la clôture : encaissé d'après les ventes et espèces comptées."""
+    cloture = models.ForeignKey(ClotureJournee, on_delete=models.PROTECT, related_name='caisses', verbose_name="Clôture")
+    vendeur = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.PROTECT, related_name='+', verbose_name="Vendeur")
+    montant_attendu = models.DecimalField(max_digits=15, decimal_places=2, default=0, verbose_name="Encaissé d'après les ventes (FC)")
+    montant_compte = models.DecimalField(max_digits=15, decimal_places=2, null=True, blank=True, verbose_name="Espèces comptées (FC)")
+
+    class Meta:
+        verbose_name = "Caisse à la clôture"
+        verbose_name_plural = "Caisses à la clôture"
+        unique_together = ('cloture', 'vendeur')
+
+    def __str__(self):
+        return f"{self.cloture} - {self.vendeur_id}"
+
+    @property
+    def ecart(self):
+        return None if self.montant_compte is None else self.montant_compte - self.montant_attendu
+
+
+class AjustementCloture(EnregistrementFige):
+    """Écart apporté à une journée clôturée par une vente créée, modifiée ou supprimée après la clôture."""
+    ACTION_CHOICES = (
+        ('creation', 'Vente ajoutée'),
+        ('modification', 'Vente modifiée'),
+        ('suppression', 'Vente supprimée'),
+    )
+    cloture = models.ForeignKey(ClotureJournee, on_delete=models.PROTECT, related_name='ajustements', verbose_name="Clôture")
+    code_vente = models.IntegerField(verbose_name="Vente")
+    vendeur = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.PROTECT, related_name='+', verbose_name="Vendeur")
+    mode_paiement = models.CharField(max_length=10, choices=Vente.MODE_PAIEMENT_CHOICES, verbose_name="Mode de paiement")
+    action = models.CharField(max_length=12, choices=ACTION_CHOICES, verbose_name="Action")
+    nb_ventes = models.IntegerField(default=0, verbose_name="Écart nombre de ventes")
+    montant_total = models.DecimalField(max_digits=15, decimal_places=2, default=0, verbose_name="Écart brut (FC)")
+    montant_remise = models.DecimalField(max_digits=15, decimal_places=2, default=0, verbose_name="Écart remises (FC)")
+    montant_net = models.DecimalField(max_digits=15, decimal_places=2, default=0, verbose_name="Écart net (FC)")
+    montant_paye = models.DecimalField(max_digits=15, decimal_places=2, default=0, verbose_name="Écart encaissé (FC)")
+    utilisateur = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, related_name='+', verbose_name="Utilisateur")
+    date_ajustement = models.DateTimeField(auto_now_add=True, verbose_name="Date")
+
+    class Meta:
+        verbose_name = "Ajustement de clôture"
+        verbose_name_plural = "Ajustements de clôture"
+        ordering = ['date_ajustement', 'pk']
+
+    def __str__(self):
+        return f"{self.cloture} - {self.get_action_display()} #{self.code_vente}"
+
+
+class Tache(models.Model):
+    """Document lourd (PDF, Excel) demandé depuis l'interface et produit par `manage.py traiter_taches`."""
+    STATUT_CHOICES = (
+        ('en_attente', 'En attente'),
+        ('en_cours', 'En cours'),
+        ('terminee', 'Terminée'),
+        ('echec', 'Échec'),
+    )
+    type_tache = models.CharField(max_length=50, verbose_name="Type")
+    parametres = models.JSONField(default=dict, blank=True, encoder=DjangoJSONEncoder, verbose_name="Paramètres")
+    cle = models.CharField(max_length=40, db_index=True, verbose_name="Clé (type + paramètres)")
+    utilisateur = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='taches', verbose_name="Utilisateur")
+    statut = models.CharField(max_length=12, choices=STATUT_CHOICES, default='en_attente', verbose_name="Statut")
+    progression = models.PositiveSmallIntegerField(default=0, verbose_name="Progression (%)")
+    message = models.CharField(max_length=255, blank=True, verbose_name="Message")
+    fichier = models.CharField(max_length=255, blank=True, verbose_name="Fichier (relatif à TACHES_DIR)")
+    nom_fichier = models.CharField(max_length=150, blank=True, verbose_name="Nom du fichier")
+    date_creation = models.DateTimeField(auto_now_add=True, verbose_name="Date de création")
+    date_debut = models.DateTimeField(null=True, blank=True, verbose_name="Début")
+    date_fin = models.DateTimeField(null=True, blank=True, verbose_name="Fin")
+    date_expiration = models.DateTimeField(null=True, blank=True, verbose_name="Expiration du fichier")
+
+    class Meta:
+        verbose_name = "Tâche de fond"
+        verbose_name_plural = "Tâches de fond"
+        ordering = ['-date_creation']
+        indexes = [
+            models.Index(fields=['statut', 'date_creation'], name='tache_statut_idx'),
+        ]
+
+    def __str__(self):
+        return f"Tâche #{self.pk} - {self.type_tache} ({self.get_statut_display()})"
+
+    @property
+    def chemin(self):
+        from pathlib import Path
+        return Path(settings.TACHES_DIR) / self.fichier if self.fichier else None
+
+    @property
+    def disponible(self):
+        return self.statut == 'terminee' and bool(self.fichier)
+
+    @classmethod
+    def prendre(cls):
+        """Réserve la plus ancienne tâche en attente pour ce worker, ou None.
+
+        La réservation est un UPDATE conditionnel sur le statut : si deux workers
+        visent la même tâche, un seul voit une ligne modifiée.
+        """
+        candidates = cls.objects.filter(statut='en_attente').order_by('date_creation').values_list('pk', flat=True)[:10]
+        for pk in candidates:
+            if cls.objects.filter(pk=pk, statut='en_attente').update(
+                statut='en_cours', date_debut=timezone.now(), progression=0,
+            ):
+                return cls.objects.get(pk=pk)
+        return None
+
+    def avancer(self, progression):
+        self.progression = max(0, min(int(progression), 99))
+        Tache.objects.filter(pk=self.pk, statut='en_cours').update(progression=self.progression)
@@ -0,0 +1,121 @@
+"""
+Prévision de la demande par produit.
+
+L'historique des ventes est chargé en une seule requête groupée (produit, jour),
+lue en flux, dans une matrice dense numpy produits × jours. Le modèle est ensuite
+ajusté pour tout le catalogue en quelques opérations vectorisées, sans boucle
+par produit :
+
+- saisonnalité hebdomadaire : poids de chaque jour de la semaine sur les
+  PREVISION_SEMAINES_SAISON dernières semaines ;
+- niveau : lissage exponentiel simple (coefficient PREVISION_ALPHA) de la série
+  désaisonnalisée, calculé comme un produit matrice × vecteur de poids.
+
+Les prévisions journalières des PREVISION_HORIZON_JOURS prochains jours sont
+stockées dans PrevisionProduit par `manage.py calculer_previsions`.
+"""
+from datetime import datetime, time, timedelta
+
+import numpy as np
+from django.conf import settings
+from django.db.models import Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+
+def matrice_ventes(debut, fin):
+    """Quantités vendues par produit et par jour sur [debut, fin[.
+
+    Retourne (produit_ids, matrice) : produit_ids est trié, matrice[i, j] est la
+    quantité vendue du produit produit_ids[i] le jour debut + j.
+    """
+    from .models import Produit, LigneVente
+
+    produit_ids = np.fromiter(
+        Produit.objects.order_by('pk').values_list('pk', flat=True).iterator(chunk_size=5000),
+        dtype=np.int64,
+    )
+    nb_jours = (fin - debut).days
+    matrice = np.zeros((len(produit_ids), nb_jours), dtype=np.float32)
+    if not len(produit_ids) or nb_jours <= 0:
+        return produit_ids, matrice
+
+    ventes = (
+        LigneVente.objects
+        .filter(
+            vente__date_vente__gte=timezone.make_aware(datetime.combine(debut, time.min)),
+            vente__date_vente__lt=timezone.make_aware(datetime.combine(fin, time.min)),
+        )
+        .values('produit_id', jour=TruncDate('vente__date_vente'))
+        .annotate(quantite=Sum('quantite'))
+        .values_list('produit_id', 'jour', 'quantite')
+        .order_by()
+    )
+    index_jour = {debut + timedelta(days=j): j for j in range(nb_jours)}
+    produits, jours, quantites = [], [], []
+    for produit_id, jour, quantite in ventes.iterator(chunk_size=10000):
+        produits.append(produit_id)
+        jours.append(index_jour[jour])
+        quantites.append(quantite)
+    if produits:
+        lignes = np.searchsorted(produit_ids, np.asarray(produits, dtype=np.int64))
+        matrice[lignes, np.asarray(jours)] = np.asarray(quantites, dtype=np.float32)
+    return produit_ids, matrice
+
+
+def ajuster(matrice, horizon, alpha=0.1, semaines=8):
+    """Prévisions journalières (produits × horizon) à partir de la matrice des ventes.
+
+    La colonne 0 du résultat correspond au lendemain du dernier jour de la matrice.
+    """
+    nb_produits, nb_jours = matrice.shape
+    if nb_jours == 0:
+        return np.zeros((nb_produits, horizon), dtype=np.float32)
+
+    # Coefficients saisonniers indexés par phase (numéro de colonne modulo 7).
+    saison = np.ones((nb_produits, 7), dtype=np.float32)
+    nb_recents = min(semaines, nb_jours // 7) * 7
+    if nb_recents:
+        recents = matrice[:, nb_jours - nb_recents:].reshape(nb_produits, -1, 7).sum(axis=1)
+        moyenne = recents.mean(axis=1, keepdims=True)
+        phases = (nb_jours - nb_recents + np.arange(7)) % 7
+        saison[:, phases] = np.divide(recents, moyenne, out=np.ones_like(recents), where=moyenne > 0)
+
+    saison_jours = saison[:, np.arange(nb_jours) % 7]
+    desaisonnalise = np.divide(matrice, saison_jours, out=np.zeros_like(matrice), where=saison_jours > 0)
+
+    # Lissage exponentiel : niveau = Σ α(1-α)^k · y[T-1-k], normalisé par la somme des poids.
+    poids = (alpha * (1 - alpha) ** np.arange(nb_jours - 1, -1, -1)).astype(np.float32)
+    niveau = desaisonnalise @ poids / poids.sum()
+
+    return niveau[:, None] * saison[:, (nb_jours + np.arange(horizon)) % 7]
+
+
+def rafraichir_previsions(date_ref=None):
+    """Recalcule et enregistre les prévisions de tout le catalogue. Retourne le nombre de produits."""
+    from .models import PrevisionProduit
+
+    fin = date_ref or timezone.localdate()
+    historique = getattr(settings, 'PREVISION_HISTORIQUE_JOURS', 3 * 365)
+    horizon = getattr(settings, 'PREVISION_HORIZON_JOURS', 60)
+    produit_ids, matrice = matrice_ventes(fin - timedelta(days=historique), fin)
+    previsions = ajuster(
+        matrice, horizon,
+        alpha=getattr(settings, 'PREVISION_ALPHA', 0.1),
+        semaines=getattr(settings, 'PREVISION_SEMAINES_SAISON', 8),
+    ).astype(np.float64).round(2)
+    moyennes = previsions.mean(axis=1).round(3)
+
+    PrevisionProduit.objects.bulk_create(
+        [
+            PrevisionProduit(
+                produit_id=int(produit_id), date_calcul=fin,
+                moyenne_jour=float(moyenne), previsions=ligne,
+            )
+            for produit_id, moyenne, ligne in zip(produit_ids, moyennes, previsions.tolist())
+        ],
+        batch_size=500,
+        update_conflicts=True, unique_fields=['produit'],
+        update_fields=['date_calcul', 'moyenne_jour', 'previsions'],
+    )
+    return len(produit_ids)
@@ -0,0 +1,193 @@
+"""
+Préparation commune des documents PDF (xhtml2pdf).
+
+Les ressources statiques sont préparées une fois par processus : le logo
+(static/img/logo.png) est lu et encodé en URI data: au premier usage, les
+gabarits sont compilés une fois puis gardés en mémoire. Les gabarits PDF
+embarquent leur propre CSS et utilisent les polices standard de xhtml2pdf :
+il n'y a rien d'autre à charger.
+
+`rendre_pdf` est le seul point d'entrée vers pisa : il ajoute `logo_data` au
+contexte, chronomètre séparément le rendu HTML et la conversion PDF, journalise
+la mesure (logger « pharmacy.rapports_pdf ») et l'accumule par gabarit
+(`statistiques()`).
+
+Les longues listes passent par `rendre_pdf_par_morceaux` : les lignes sont lues
+par tranches de PDF_MORCEAU_LIGNES, chaque tranche est rendue comme un PDF
+séparé (en parallèle sur PDF_PROCESSUS processus, `rendre_en_parallele`) puis
+les PDF sont mis bout à bout (`assembler_pdf`). La mémoire de pisa reste bornée
+par la taille d'une tranche. Le gabarit reçoit `numero_debut` (numéro de la
+première ligne), `suite` (vrai sauf pour la première tranche : en-tête à
+omettre) et `a_suivre` (faux pour la dernière : totaux et signatures).
+"""
+import base64
+import logging
+import threading
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from io import BytesIO
+from itertools import chain, islice
+from pathlib import Path
+
+from django.conf import settings
+from django.template.loader import get_template
+from pypdf import PdfWriter
+from xhtml2pdf import pisa
+
+logger = logging.getLogger(__name__)
+
+_verrou = threading.Lock()
+_mesures = {}
+
+
+@lru_cache(maxsize=None)
+def logo_data_uri():
+    """Logo de la pharmacie en URI data:, ou '' si le fichier est absent."""
+    chemin = Path(settings.BASE_DIR) / 'static' / 'img' / 'logo.png'
+    try:
+        return 'data:image/png;base64,' + base64.b64encode(chemin.read_bytes()).decode('ascii')
+    except FileNotFoundError:
+        return ''
+
+
+@lru_cache(maxsize=32)
+def gabarit(nom):
+    return get_template(nom)
+
+
+def _mesurer(nom, duree_html, duree_pdf, taille):
+    with _verrou:
+        m = _mesures.setdefault(nom, {'nb': 0, 'html': 0.0, 'pdf': 0.0, 'octets': 0})
+        m['nb'] += 1
+        m['html'] += duree_html
+        m['pdf'] += duree_pdf
+        m['octets'] += taille
+    logger.info("PDF %s : HTML %.0f ms, pisa %.0f ms, %d octets",
+                nom, duree_html * 1000, duree_pdf * 1000, taille)
+
+
+def statistiques():
+    """Nombre de rendus et durées moyennes (ms) par gabarit depuis le démarrage du processus."""
+    with _verrou:
+        return {
+            nom: {
+                'nb': m['nb'],
+                'html_ms': m['html'] / m['nb'] * 1000,
+                'pdf_ms': m['pdf'] / m['nb'] * 1000,
+                'octets': m['octets'] // m['nb'],
+            }
+            for nom, m in _mesures.items()
+        }
+
+
+def html_en_pdf(html):
+    """Conversion xhtml2pdf d'une page HTML complète, en octets."""
+    from .taches import ErreurDocument
+    tampon = BytesIO()
+    if pisa.CreatePDF(html, dest=tampon).err:
+        raise ErreurDocument("Erreur lors de la génération du PDF")
+    return tampon.getvalue()
+
+
+def rendre_pdf(nom_gabarit, contexte):
+    """Rend `nom_gabarit` avec `contexte` (plus `logo_data`) et retourne le PDF en octets."""
+    debut = time.perf_counter()
+    html = gabarit(nom_gabarit).render({'logo_data': logo_data_uri(), **contexte})
+    milieu = time.perf_counter()
+    contenu = html_en_pdf(html)
+    _mesurer(nom_gabarit, milieu - debut, time.perf_counter() - milieu, len(contenu))
+    return contenu
+
+
+def _morceaux(lignes, taille):
+    """(numéro de la première ligne, lignes, dernier ?) par tranche de `taille`, en lisant une tranche d'avance."""
+    iterateur = iter(lignes)
+    morceau = list(islice(iterateur, taille))
+    numero = 1
+    while morceau:
+        suivant = list(islice(iterateur, taille))
+        yield numero, morceau, not suivant
+        numero += len(morceau)
+        morceau = suivant
+
+
+def _initialiser_processus():
+    """Processus de rendu : Django prêt, sans réutiliser la connexion base du parent."""
+    import django
+    from django.apps import apps
+    from django.db import connections
+    if not apps.ready:
+        django.setup()
+    for connexion in connections.all(initialized_only=True):
+        # Abandon sans fermeture : le socket appartient encore au processus parent.
+        connexion.connection = None
+
+
+def rendre_pdf_par_morceaux(nom_gabarit, contexte, cle_lignes, lignes, nb_lignes=None, progression=None):
+    """Rend `lignes` (itérable, idéalement un QuerySet.iterator()) sous `cle_lignes`, tranche par tranche.
+
+    Une liste qui tient dans une tranche est rendue directement par `rendre_pdf`.
+    """
+    debut = time.perf_counter()
+    taille = settings.PDF_MORCEAU_LIGNES
+    processus = settings.PDF_PROCESSUS
+    contextes = (
+        {**contexte, cle_lignes: morceau, 'numero_debut': numero, 'suite': numero > 1, 'a_suivre': not dernier}
+        for numero, morceau, dernier in _morceaux(lignes, taille)
+    )
+    premier = next(contextes, None)
+    if premier is None:
+        return rendre_pdf(nom_gabarit, {**contexte, cle_lignes: [], 'numero_debut': 1})
+    if not premier['a_suivre']:
+        return rendre_pdf(nom_gabarit, premier)
+
+    faits = 0
+
+    def tranches():
+        nonlocal faits
+        appels = ((rendre_pdf, nom_gabarit, ctx) for ctx in chain([premier], contextes))
+        for contenu in rendre_en_parallele(appels):
+            faits += 1
+            if progression and nb_lignes:
+                progression(10 + 85 * min(faits * taille, nb_lignes) // nb_lignes)
+            yield contenu
+
+    contenu = assembler_pdf(tranches())
+    logger.info("PDF %s : %d tranche(s) sur %d processus en %.0f ms",
+                nom_gabarit, faits, processus, (time.perf_counter() - debut) * 1000)
+    return contenu
+
+
+def rendre_en_parallele(appels):
+    """Exécute les rendus `(fonction, *arguments)` sur PDF_PROCESSUS processus.
+
+    Les résultats sont produits au fil de l'eau, dans l'ordre des appels ; au plus
+    deux rendus attendent par processus, la mémoire reste bornée. `fonction` et
+    ses arguments doivent pouvoir être transmis au processus (fonction de module,
+    instances de modèles, listes).
+    """
+    processus = settings.PDF_PROCESSUS
+    if processus <= 1:
+        for fonction, *arguments in appels:
+            yield fonction(*arguments)
+        return
+    with ProcessPoolExecutor(max_workers=processus, initializer=_initialiser_processus) as pool:
+        en_cours = deque()
+        for fonction, *arguments in appels:
+            if len(en_cours) >= processus * 2:
+                yield en_cours.popleft().result()
+            en_cours.append(pool.submit(fonction, *arguments))
+        while en_cours:
+            yield en_cours.popleft().result()
+
+
+def assembler_pdf(documents):
+    """Met bout à bout des PDF (itérable d'octets) en un seul document."""
+    assemblage = PdfWriter()
+    for contenu in documents:
+        assemblage.append(BytesIO(contenu))
+    tampon = BytesIO()
+    assemblage.write(tampon)
+    return tampon.getvalue()
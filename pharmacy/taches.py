@@ -0,0 +1,209 @@
+"""
+File de tâches de fond (table Tache) pour les documents lourds.
+
+Les rapports PDF et exports Excel volumineux ne sont plus produits dans le
+processus qui sert la requête : la vue enregistre une Tache (type + paramètres)
+et redirige vers une page d'attente qui interroge sa progression. Le worker
+`manage.py traiter_taches` réserve les tâches une à une, appelle le générateur
+déclaré dans TYPES_TACHES, écrit le fichier sous TACHES_DIR puis marque la
+tâche terminée. Les fichiers sont supprimés après TACHES_RETENTION_HEURES.
+
+Un générateur reçoit (parametres, utilisateur, progression) et retourne
+(nom_fichier, contenu) ; `progression(pourcentage)` met à jour la barre affichée.
+Le contenu est en octets, ou bien le chemin (Path) d'un fichier écrit sur disque
+obtenu par `fichier_temporaire` : les gros exports ne passent alors jamais en
+mémoire, le fichier est renommé en fichier de la tâche ou servi par morceaux.
+
+En mode 'synchrone' (TACHES_MODE, par défaut : poste sans worker) la vue appelle
+directement le générateur et renvoie le document, comme avant. Le mode 'file'
+n'est à activer qu'une fois le worker installé en service.
+
+La facture (facture_pdf), imprimée au comptoir, reste toujours synchrone.
+"""
+import hashlib
+import io
+import json
+import logging
+import os
+import tempfile
+from datetime import timedelta
+from pathlib import Path
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import FileResponse, HttpResponse
+from django.shortcuts import redirect
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger(__name__)
+
+# type → (libellé, générateur)
+TYPES_TACHES = {
+    'produits_liste_pdf': ("Liste des produits (PDF)", 'pharmacy.views.document_produits_liste'),
+    'rapport_journalier_pdf': ("Rapport journalier (PDF)", 'pharmacy.views.document_rapport_journalier'),
+    'inventaire_pdf': ("Inventaire (PDF)", 'pharmacy.views.document_inventaire'),
+    'requisition_pdf': ("Bons de commande (PDF)", 'pharmacy.views.document_requisition'),
+    'lot_factures': ("Lot de factures", 'pharmacy.views.document_lot_factures'),
+    'lot_rapports': ("Lot de rapports journaliers", 'pharmacy.views.document_lot_rapports'),
+    'export_fournisseurs': ("Export fournisseurs (Excel)", 'pharmacy.excel_views.document_fournisseurs'),
+    'export_produits': ("Export produits (Excel)", 'pharmacy.excel_views.document_produits'),
+    'export_clients': ("Export clients (Excel)", 'pharmacy.excel_views.document_clients'),
+    'export_ventes': ("Export ventes (Excel)", 'pharmacy.excel_views.document_ventes'),
+}
+
+TYPES_CONTENU = {
+    '.pdf': 'application/pdf',
+    '.xlsx': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+    '.zip': 'application/zip',
+}
+
+
+class ErreurDocument(Exception):
+    """Le générateur n'a pas pu produire le document ; le message est montré à l'utilisateur."""
+
+
+def libelle(type_tache):
+    return TYPES_TACHES.get(type_tache, (type_tache, None))[0]
+
+
+def type_contenu(nom_fichier):
+    return TYPES_CONTENU.get(Path(nom_fichier).suffix.lower(), 'application/octet-stream')
+
+
+def _cle(type_tache, parametres):
+    brut = json.dumps([type_tache, parametres], sort_keys=True, cls=DjangoJSONEncoder)
+    return hashlib.sha1(brut.encode('utf-8')).hexdigest()
+
+
+def _dossier():
+    dossier = Path(settings.TACHES_DIR)
+    dossier.mkdir(parents=True, exist_ok=True)
+    return dossier
+
+
+def fichier_temporaire(suffixe):
+    """Chemin d'un fichier vide sous TACHES_DIR, où un générateur écrit son document au lieu de le retourner en octets."""
+    descripteur, chemin = tempfile.mkstemp(suffix=f"{suffixe}.part", dir=_dossier())
+    os.close(descripteur)
+    return Path(chemin)
+
+
+class _FichierJetable(io.FileIO):
+    """Fichier temporaire supprimé à sa fermeture, c'est-à-dire une fois la réponse envoyée."""
+
+    def close(self):
+        super().close()
+        try:
+            os.unlink(self.name)
+        except FileNotFoundError:
+            pass
+
+
+def reponse_document(nom_fichier, contenu):
+    """Réponse HTTP d'un document produit par un générateur (mode synchrone)."""
+    if isinstance(contenu, Path):
+        return FileResponse(
+            _FichierJetable(contenu), content_type=type_contenu(nom_fichier),
+            as_attachment=not nom_fichier.lower().endswith('.pdf'), filename=nom_fichier,
+        )
+    response = HttpResponse(contenu, content_type=type_contenu(nom_fichier))
+    if nom_fichier.lower().endswith('.pdf'):
+        response['Content-Disposition'] = f'filename="{nom_fichier}"'
+    else:
+        response['Content-Disposition'] = f'attachment; filename="{nom_fichier}"'
+    return response
+
+
+def lancer(request, type_tache, parametres=None):
+    """Met le document en file et redirige vers sa page d'attente.
+
+    Une demande identique (même utilisateur, type et paramètres) encore en
+    attente ou en cours est réutilisée plutôt que dupliquée.
+    """
+    from .models import Tache
+
+    parametres = parametres or {}
+    if getattr(settings, 'TACHES_MODE', 'synchrone') == 'synchrone':
+        try:
+            nom_fichier, contenu = import_string(TYPES_TACHES[type_tache][1])(parametres, request.user, lambda p: None)
+        except ErreurDocument as e:
+            return HttpResponse(str(e), status=500)
+        return reponse_document(nom_fichier, contenu)
+
+    cle = _cle(type_tache, parametres)
+    tache = Tache.objects.filter(
+        utilisateur=request.user, cle=cle, statut__in=('en_attente', 'en_cours'),
+    ).first()
+    if tache is None:
+        tache = Tache.objects.create(
+            type_tache=type_tache, parametres=parametres, cle=cle, utilisateur=request.user,
+        )
+    return redirect('tache_detail', pk=tache.pk)
+
+
+def executer(tache):
+    """Produit le document d'une tâche réservée (statut 'en_cours') et l'enregistre."""
+    from .models import Tache
+
+    try:
+        generateur = import_string(TYPES_TACHES[tache.type_tache][1])
+        nom_fichier, contenu = generateur(tache.parametres, tache.utilisateur, tache.avancer)
+        fichier = f"{tache.pk}-{nom_fichier}"
+        chemin = _dossier() / fichier
+        if isinstance(contenu, Path):
+            os.replace(contenu, chemin)
+        else:
+            temporaire = chemin.with_name(chemin.name + '.part')
+            with open(temporaire, 'wb') as f:
+                f.write(contenu)
+            os.replace(temporaire, chemin)
+    except Exception as e:
+        logger.exception("Échec de la tâche %s (%s)", tache.pk, tache.type_tache)
+        message = str(e) if isinstance(e, ErreurDocument) else "Erreur lors de la génération du document."
+        fin = timezone.now()
+        Tache.objects.filter(pk=tache.pk).update(
+            statut='echec', message=message[:255], date_fin=fin,
+            date_expiration=fin + timedelta(hours=settings.TACHES_RETENTION_HEURES),
+        )
+        return False
+    fin = timezone.now()
+    Tache.objects.filter(pk=tache.pk).update(
+        statut='terminee', progression=100, fichier=fichier, nom_fichier=nom_fichier,
+        date_fin=fin, date_expiration=fin + timedelta(hours=settings.TACHES_RETENTION_HEURES),
+    )
+    return True
+
+
+def purger():
+    """Supprime les tâches expirées, leurs fichiers et les fichiers partiels abandonnés ; clôt les tâches bloquées.
+
+    Une tâche 'en_cours' depuis plus de TACHES_DELAI_BLOCAGE secondes appartient à
+    un worker arrêté en cours de route : elle passe en échec pour que
+    l'utilisateur puisse la relancer. Retourne le nombre de tâches supprimées.
+    """
+    from .models import Tache
+
+    maintenant = timezone.now()
+    Tache.objects.filter(
+        statut='en_cours', date_debut__lt=maintenant - timedelta(seconds=settings.TACHES_DELAI_BLOCAGE),
+    ).update(
+        statut='echec', message="Interrompue (worker arrêté).", date_fin=maintenant,
+        date_expiration=maintenant + timedelta(hours=settings.TACHES_RETENTION_HEURES),
+    )
+    expirees = Tache.objects.filter(date_expiration__lt=maintenant)
+    for fichier in expirees.exclude(fichier='').values_list('fichier', flat=True):
+        try:
+            (Path(settings.TACHES_DIR) / fichier).unlink()
+        except FileNotFoundError:
+            pass
+    nb, _ = expirees.delete()
+    # Fichiers temporaires laissés par un générateur interrompu
+    limite = maintenant.timestamp() - settings.TACHES_DELAI_BLOCAGE
+    for partiel in Path(settings.TACHES_DIR).glob('*.part'):
+        try:
+            if partiel.stat().st_mtime < limite:
+                partiel.unlink()
+        except FileNotFoundError:
+            pass
+    return nb
@@ -0,0 +1,82 @@
+"""
+Tickets de caisse pour imprimantes thermiques 58/80 mm.
+
+Le ticket est composé directement depuis la vente et ses lignes, en texte à
+largeur fixe (32 colonnes en 58 mm, 48 en 80 mm, police A), sans gabarit ni
+PDF. `ticket_texte` donne le texte brut, `ticket_escpos` le même contenu en
+flux ESC/POS (initialisation, page de code PC850 pour les accents, gras et
+centrage de l'en-tête et des totaux, avance papier et coupe partielle).
+"""
+import textwrap
+from decimal import Decimal
+
+from django.utils import timezone
+
+COLONNES = {58: 32, 80: 48}
+ENTETE = ("PHARMACIE NDOSI-PHAR", "VENTE DES PRODUITS PHARMACEUTIQUES", "AV.MOBUTU No 11 MBANZA NGUNGU")
+
+ESC = b'\x1b'
+GS = b'\x1d'
+INITIALISER = ESC + b'@'
+PAGE_CODE_PC850 = ESC + b't\x02'
+GRAS = (ESC + b'E\x00', ESC + b'E\x01')
+ALIGNEMENT = {'gauche': ESC + b'a\x00', 'centre': ESC + b'a\x01'}
+COUPE = GS + b'V\x42\x00'  # avance jusqu'au couteau puis coupe partielle
+
+
+def _montant(valeur):
+    return f"{Decimal(valeur or 0):,.2f}".replace(',', ' ')
+
+
+def _deux_colonnes(gauche, droite, largeur):
+    espace = max(largeur - len(gauche) - len(droite), 1)
+    return f"{gauche}{' ' * espace}{droite}"
+
+
+def composer(vente, lignes, largeur_mm=80):
+    """Lignes du ticket : liste de (texte, centré, gras)."""
+    largeur = COLONNES.get(largeur_mm, COLONNES[80])
+    trait = '-' * largeur
+    sortie = [(morceau, True, True) for texte in ENTETE for morceau in textwrap.wrap(texte, largeur)]
+    sortie.append((trait, False, False))
+    sortie.append((f"Ticket No {vente.code_vente}", False, True))
+    sortie.append((timezone.localtime(vente.date_vente).strftime('%d/%m/%Y %H:%M'), False, False))
+    sortie.append((f"Client : {vente.client or 'ANONYME'}"[:largeur], False, False))
+    vendeur = vente.vendeur.get_full_name() or vente.vendeur.username
+    sortie.append((f"Vendeur : {vendeur}"[:largeur], False, False))
+    sortie.append((trait, False, False))
+
+    for ligne in lignes:
+        for morceau in textwrap.wrap(ligne.produit.designation.upper(), largeur) or ['']:
+            sortie.append((morceau, False, False))
+        detail = f"  {ligne.quantite} x {_montant(ligne.prix_unitaire)}"
+        sortie.append((_deux_colonnes(detail, _montant(ligne.montant_ligne), largeur), False, False))
+
+    sortie.append((trait, False, False))
+    sortie.append((_deux_colonnes("TOTAL", _montant(vente.montant_total), largeur), False, False))
+    if vente.montant_remise:
+        remise = f"REMISE {vente.remise_pourcent.normalize():f} %"
+        sortie.append((_deux_colonnes(remise, '-' + _montant(vente.montant_remise), largeur), False, False))
+    sortie.append((_deux_colonnes("NET A PAYER", _montant(vente.montant_net), largeur), False, True))
+    sortie.append((_deux_colonnes("PAYE", _montant(vente.montant_paye), largeur), False, False))
+    if not vente.est_solde:
+        reste = (vente.montant_net or 0) - (vente.montant_paye or 0)
+        sortie.append((_deux_colonnes("RESTE A PAYER (CREDIT)", _montant(reste), largeur), False, True))
+    sortie.append((trait, False, False))
+    sortie.append(("Merci de votre visite", True, False))
+    return sortie
+
+
+def ticket_texte(vente, lignes, largeur_mm=80):
+    largeur = COLONNES.get(largeur_mm, COLONNES[80])
+    return '\n'.join(texte.center(largeur).rstrip() if centre else texte
+                     for texte, centre, _ in composer(vente, lignes, largeur_mm)) + '\n'
+
+
+def ticket_escpos(vente, lignes, largeur_mm=80):
+    flux = bytearray(INITIALISER + PAGE_CODE_PC850)
+    for texte, centre, gras in composer(vente, lignes, largeur_mm):
+        flux += ALIGNEMENT['centre' if centre else 'gauche'] + GRAS[gras]
+        flux += texte.encode('cp850', errors='replace') + b'\n'
+    flux += ALIGNEMENT['gauche'] + GRAS[False] + b'\n\n\n' + COUPE
+    return bytes(flux)
@@ -47,8 +47,18 @@ urlpatterns = [
     path('ventes/<int:pk>/supprimer-ligne/<int:ligne_pk>/', views.vente_remove_ligne, name='vente_remove_ligne'),
     path('ventes/<int:pk>/supprimer/', views.vente_delete, name='vente_delete'),
     path('ventes/<int:pk>/facture/', views.facture_pdf, name='facture_pdf'),
+    path('ventes/<int:pk>/ticket/', views.vente_ticket, name='vente_ticket'),
     path('ventes/rapport-journalier/', views.rapport_journalier_pdf, name='rapport_journalier'),
+    path('ventes/lots/', views.lot_documents, name='lot_documents'),
+    path('ventes/cloture/', views.cloture_journaliere, name='cloture_journaliere'),
+    path('ventes/cloture/detail/', views.cloture_journaliere_detail, name='cloture_journaliere_detail'),
     
+    # Documents (tâches de fond)
+    path('documents/', views.tache_list, name='tache_list'),
+    path('documents/<int:pk>/', views.tache_detail, name='tache_detail'),
+    path('documents/<int:pk>/statut/', views.tache_statut, name='tache_statut'),
+    path('documents/<int:pk>/telecharger/', views.tache_telecharger, name='tache_telecharger'),
+
     # Analyse
     path('analyse-clients/', views.analyse_clients, name='analyse_clients'),
 
@@ -61,14 +71,23 @@ urlpatterns = [
     path('clients/import/', excel_views.import_clients, name='import_clients'),
     path('ventes/export/', excel_views.export_ventes, name='export_ventes'),
 
+    # Réceptions fournisseurs
+    path('receptions/', views.reception_list, name='reception_list'),
+    path('receptions/nouvelle/', views.reception_create, name='reception_create'),
+    path('receptions/<int:pk>/', views.reception_detail, name='reception_detail'),
+    path('receptions/<int:pk>/valider/', views.reception_valider, name='reception_valider'),
+    path('receptions/<int:pk>/supprimer/', views.reception_delete, name='reception_delete'),
+
     # Inventaire
     path('inventaires/', views.inventaire_list, name='inventaire_list'),
+    path('inventaires/ecarts/', views.ecarts_inventaire, name='ecarts_inventaire'),
     path('inventaires/mes-comptages/', views.inventaire_mes_comptages, name='inventaire_mes_comptages'),
     path('inventaires/nouveau/', views.inventaire_create, name='inventaire_create'),
     path('inventaires/<int:pk>/saisie/', views.inventaire_saisie, name='inventaire_saisie'),
     path('inventaires/<int:pk>/ligne/<int:ligne_pk>/compter/', views.inventaire_ligne_compter, name='inventaire_ligne_compter'),
     path('inventaires/<int:pk>/valider/', views.inventaire_valider, name='inventaire_valider'),
     path('inventaires/<int:pk>/', views.inventaire_detail, name='inventaire_detail'),
+    path('inventaires/<int:pk>/zones/', views.inventaire_zones, name='inventaire_zones'),
     path('inventaires/<int:pk>/annuler/', views.inventaire_annuler, name='inventaire_annuler'),
     path('inventaires/<int:pk>/supprimer/', views.inventaire_delete, name='inventaire_delete'),
     path('inventaires/<int:pk>/pdf/', views.inventaire_pdf, name='inventaire_pdf'),
@@ -79,4 +98,10 @@ urlpatterns = [
     # Réquisition
     path('requisition/', views.requisition_list, name='requisition_list'),
     path('requisition/pdf/', views.requisition_pdf, name='requisition_pdf'),
+
+    # Rapports
+    path('rapports/ventes/', views.rapport_cube_ventes, name='rapport_cube_ventes'),
+    path('rapports/marges/', views.rapport_marges, name='rapport_marges'),
+    path('rapports/produits/', views.rapport_produits, name='rapport_produits'),
+    path('rapports/expirations/', views.rapport_expirations, name='rapport_expirations'),
 ]
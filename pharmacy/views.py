@@ -3,18 +3,21 @@ from django.contrib.auth.decorators import login_required
 from django.contrib import messages
 from django.http import HttpResponse, JsonResponse, HttpResponseForbidden
 from functools import wraps
-from django.template.loader import get_template
 from django.utils import timezone
-from xhtml2pdf import pisa
-from io import BytesIO
 from django.db import models
 from datetime import date, timedelta
 from decimal import Decimal
 import json
-from .models import Taux, Fournisseur, Produit, Client, Vente, LigneVente, Historique, Inventaire, LigneInventaire
+from .models import (Taux, TauxHistorique, Fournisseur, Produit, Client, Vente, LigneVente, Historique, Inventaire,
+                     LigneInventaire, SuiviEcartProduit, VelociteProduit,
+                     CubeVentes, MoisCubeVentes, AlerteExpiration, Lot, StockInsuffisant,
+                     Reception, LigneReception, ReceptionDejaValidee, Tache,
+                     ClotureJournee, ClotureImmuable, _bornes_jour)
 from django.conf import settings
+from . import audit
+from .rapports_pdf import rendre_pdf, rendre_pdf_par_morceaux
 from .forms import (TauxForm, FournisseurForm, ProduitForm,
-                    ClientForm, VenteForm, VenteCompletForm, LigneVenteForm)
+                    ClientForm, VenteForm, VenteCompletForm, LigneVenteForm, ReceptionForm)
 
 
 def non_vendeur_required(view_func):
@@ -62,6 +65,19 @@ def can_count_inventory(user, inventaire):
     return inventaire.compteurs_autorises.filter(pk=user.pk).exists()
 
 
+def lignes_assignees(user, inventaire):
+    """Lignes qu'un compteur doit saisir : sa zone et ses recomptages en attente.
+
+    Sans zones définies (ou pour l'admin/gérant), toutes les lignes restent visibles.
+    """
+    lignes = inventaire.lignes.all()
+    if is_admin_or_gerant(user) or not inventaire.zones.exists():
+        return lignes
+    return lignes.filter(
+        models.Q(zone__compteur=user) | models.Q(recomptage_requis=True, recompteur=user)
+    )
+
+
 @login_required
 def dashboard(request):
     aujourd_hui = date.today()
@@ -70,10 +86,14 @@ def dashboard(request):
 
     ventes_jour = Vente.objects.filter(date_vente__date=aujourd_hui).aggregate(
         total=models.Sum('montant_total'), nombre=models.Count('pk'))
-    ventes_semaine = Vente.objects.filter(date_vente__date__gte=debut_semaine).aggregate(
-        total=models.Sum('montant_total'), nombre=models.Count('pk'))
-    ventes_mois = Vente.objects.filter(date_vente__date__gte=debut_mois).aggregate(
-        total=models.Sum('montant_total'), nombre=models.Count('pk'))
+    # Semaine et mois : journées clôturées lues dans leurs clôtures, les autres dans les ventes
+    ventes_semaine, ventes_mois = (
+        {
+            'total': sum(t['montant_total'] for t in totaux.values()),
+            'nombre': sum(t['nb_ventes'] for t in totaux.values()),
+        }
+        for totaux in (ClotureJournee.totaux_periode(debut, aujourd_hui) for debut in (debut_semaine, debut_mois))
+    )
 
     # Vérifier si le vendeur doit confirmer le taux de change
     afficher_modal_taux = False
@@ -90,28 +110,31 @@ def dashboard(request):
     if request.method == 'POST' and 'confirmer_taux' in request.POST:
         nouveau_taux = request.POST.get('montant_fc')
         if nouveau_taux:
+            from decimal import InvalidOperation
             try:
-                nouveau_taux = float(nouveau_taux.replace(',', '.'))
+                nouveau_taux = Decimal(nouveau_taux.replace(',', '.'))
+                if not nouveau_taux.is_finite():
+                    raise ValueError(nouveau_taux)
                 if taux_usd:
                     taux_usd.montant_fc = nouveau_taux
                     taux_usd.save()
                 else:
                     taux_usd = Taux.objects.create(code_devise='USD', montant_fc=nouveau_taux)
-                Historique.objects.create(
-                    utilisateur=request.user,
-                    action='modification_taux',
-                    modele='Taux',
-                    detail=f"Taux USD mis à jour à {nouveau_taux} FC par {request.user.username}"
+                enregistrer_historique(
+                    request.user, 'modification_taux', 'Taux',
+                    f"Taux USD mis à jour à {nouveau_taux} FC par {request.user.username}",
+                    cible=taux_usd, donnees={'devise': 'USD', 'montant_fc': nouveau_taux},
                 )
                 request.session['taux_confirme_aujourd_hui'] = str(aujourd_hui)
                 messages.success(request, f"Taux de change mis à jour : 1 USD = {nouveau_taux} FC")
-            except (ValueError, TypeError):
+            except (ValueError, TypeError, InvalidOperation):
                 messages.error(request, "Valeur de taux invalide.")
         else:
             request.session['taux_confirme_aujourd_hui'] = str(aujourd_hui)
             messages.info(request, "Taux de change confirmé.")
         return redirect('dashboard')
 
+    AlerteExpiration.rafraichir_si_perime()
     context = {
         'total_produits': Produit.objects.count(),
         'total_fournisseurs': Fournisseur.objects.count(),
@@ -127,9 +150,7 @@ def dashboard(request):
         'ventes_mois_nombre': ventes_mois['nombre'],
         'produits_alerte': Produit.objects.filter(quantite_stock__lte=models.F('quantite_alerte')),
         'nb_requisition': Produit.objects.filter(quantite_stock__lte=models.F('quantite_alerte')).count(),
-        'produits_expiration': Produit.objects.filter(
-            date_expiration__lte=date.today() + timedelta(days=30)
-        ).order_by('date_expiration'),
+        'alertes_expiration': AlerteExpiration.objects.select_related('produit', 'lot').order_by('date_expiration')[:20],
         'ventes_recentes': Vente.objects.all()[:5],
         'produits_recents': Produit.objects.select_related('fournisseur').order_by('-date_creation', '-code_produit')[:10],
         'afficher_modal_taux': afficher_modal_taux,
@@ -145,7 +166,8 @@ def dashboard(request):
 @login_required
 def taux_list(request):
     taux = Taux.objects.all()
-    return render(request, 'pharmacy/taux_list.html', {'taux': taux})
+    historique = TauxHistorique.objects.order_by('-date_debut', '-pk')[:20]
+    return render(request, 'pharmacy/taux_list.html', {'taux': taux, 'historique': historique})
 
 
 @non_vendeur_required
@@ -168,11 +190,10 @@ def taux_edit(request, pk):
         form = TauxForm(request.POST, instance=taux)
         if form.is_valid():
             form.save()
-            Historique.objects.create(
-                utilisateur=request.user,
-                action='modification_taux',
-                modele='Taux',
-                detail=f"Taux {taux.code_devise} modifié à {taux.montant_fc} FC par {request.user.username}"
+            enregistrer_historique(
+                request.user, 'modification_taux', 'Taux',
+                f"Taux {taux.code_devise} modifié à {taux.montant_fc} FC par {request.user.username}",
+                cible=taux, donnees={'devise': taux.code_devise, 'montant_fc': taux.montant_fc},
             )
             messages.success(request, "Taux modifié avec succès.")
             return redirect('taux_list')
@@ -247,7 +268,7 @@ def fournisseur_delete(request, pk):
 
 @non_vendeur_required
 def produit_list(request):
-    produits = Produit.objects.select_related('fournisseur').all().order_by('designation')
+    produits = Produit.objects.select_related('fournisseur').avec_statut_expiration().order_by('designation')
     
     # Gérer la soumission du formulaire de saisie rapide
     if request.method == 'POST':
@@ -266,6 +287,8 @@ def produit_list(request):
             produit = form.save()
             produit.calculer_prix_vente_usd()
             produit.save()
+            Lot.ajuster(produit, produit.quantite_stock)
+            AlerteExpiration.rafraichir(produit_ids=[produit.pk])
             messages.success(request, "Produit créé avec succès.")
             return redirect('produit_list')
     else:
@@ -345,15 +368,20 @@ def produit_ajouter_stock(request, pk):
     if request.method == 'POST':
         try:
             quantite = int(request.POST.get('quantite', 0))
+            date_expiration = date.fromisoformat(request.POST['date_expiration']) if request.POST.get('date_expiration') else None
             if quantite > 0:
-                produit.quantite_stock += quantite
-                produit.quantite_initiale += quantite
-                produit.save()
-                Historique.objects.create(
-                    utilisateur=request.user,
-                    action='ajout_stock',
-                    modele='Produit',
-                    detail=f"Ajout de {quantite} unités au stock de {produit.designation} (nouveau stock: {produit.quantite_stock})"
+                from django.db import transaction
+                with transaction.atomic():
+                    # Incrément en base : deux ajouts simultanés (ou une réception) ne s'écrasent pas.
+                    Produit.objects.filter(pk=produit.pk).update(quantite_initiale=models.F('quantite_initiale') + quantite)
+                    Lot.entrer(produit, quantite, date_expiration=date_expiration or produit.date_expiration,
+                               numero_lot=request.POST.get('numero_lot', '').strip()[:50])
+                produit.refresh_from_db()
+                AlerteExpiration.rafraichir(produit_ids=[produit.pk])
+                enregistrer_historique(
+                    request.user, 'ajout_stock', 'Produit',
+                    f"Ajout de {quantite} unités au stock de {produit.designation} (nouveau stock: {produit.quantite_stock})",
+                    cible=produit, donnees={'quantite': quantite, 'stock': produit.quantite_stock},
                 )
                 messages.success(request, f"{quantite} unités ajoutées au stock de {produit.designation}. Nouveau stock: {produit.quantite_stock}")
             else:
@@ -373,6 +401,16 @@ def produit_edit(request, pk):
             produit = form.save()
             produit.calculer_prix_vente_usd()
             produit.save()
+            if 'date_expiration' in form.changed_data:
+                # Un seul lot en stock : la date saisie sur la fiche est la sienne.
+                lots = Lot.ordre_fefo(produit.pk)
+                if lots.count() == 1:
+                    lots.update(date_expiration=produit.date_expiration)
+            try:
+                Lot.ajuster(produit, produit.quantite_stock)
+            except StockInsuffisant as e:
+                messages.warning(request, f"Stock non modifié : {e}")
+            AlerteExpiration.rafraichir(produit_ids=[produit.pk])
             messages.success(request, "Produit modifié avec succès.")
             return redirect('produit_list')
     else:
@@ -403,6 +441,7 @@ def produit_detail(request, pk):
     return render(request, 'pharmacy/produit_detail.html', {
         'produit': produit,
         'taux_usd': taux_usd,
+        'lots': Lot.ordre_fefo(produit.pk),
     })
 
 
@@ -492,6 +531,7 @@ def vente_home(request):
 def vente_edit(request, pk):
     """Modifier une vente existante"""
     vente = get_object_or_404(Vente, pk=pk)
+    avant = vente.etat_cloture()
     lignes = vente.lignes.select_related('produit').all()
     
     if request.method == 'POST':
@@ -500,39 +540,53 @@ def vente_edit(request, pk):
         lignes_data = json.loads(request.POST.get('lignes_json', '[]'))
         
         if form.is_valid() and lignes_data:
-            # Supprimer les anciennes lignes
-            vente.lignes.all().delete()
-            
-            # Remettre en stock les anciennes quantités (déjà fait lors de la suppression)
-            
-            # Recréer les lignes
-            total_vente = 0
-            for ligne_data in lignes_data:
-                produit = Produit.objects.get(pk=ligne_data['produit_id'])
-                quantite = ligne_data['quantite']
-                prix_unitaire = ligne_data['prix_unitaire']
-                montant_ligne = ligne_data['montant_ligne']
-                
-                LigneVente.objects.create(
-                    vente=vente,
-                    produit=produit,
-                    quantite=quantite,
-                    prix_unitaire=prix_unitaire,
-                    montant_ligne=montant_ligne
-                )
-                
-                produit.quantite_stock -= quantite
-                produit.save()
-                total_vente += montant_ligne
-            
-            vente.montant_total = total_vente
-            if total_vente >= Decimal('10000'):
-                vente.montant_remise = (total_vente * vente.remise_pourcent / Decimal('100')).quantize(Decimal('0.01'))
-            else:
-                vente.montant_remise = Decimal('0')
-            vente.montant_net = total_vente - vente.montant_remise
-            vente.save()
-            
+            from django.db import transaction
+            try:
+                with transaction.atomic():
+                    # Coût d'achat figé des lignes existantes : il est reporté sur les lignes recréées,
+                    # seuls les produits ajoutés prennent le coût actuel.
+                    couts = {l.produit_id: (l.prix_achat_unitaire, l.fournisseur_id) for l in lignes}
+                    # Remettre les anciennes quantités dans leurs lots, puis supprimer les lignes
+                    Lot.restituer(lignes)
+                    vente.lignes.all().delete()
+
+                    # Recréer les lignes
+                    total_vente = 0
+                    for ligne_data in lignes_data:
+                        produit = Produit.objects.get(pk=ligne_data['produit_id'])
+                        quantite = ligne_data['quantite']
+                        prix_unitaire = ligne_data['prix_unitaire']
+                        montant_ligne = ligne_data['montant_ligne']
+                        prix_achat_unitaire, fournisseur_id = couts.get(produit.pk, (None, None))
+
+                        ligne = LigneVente.objects.create(
+                            vente=vente,
+                            produit=produit,
+                            quantite=quantite,
+                            prix_unitaire=prix_unitaire,
+                            montant_ligne=montant_ligne,
+                            prix_achat_unitaire=prix_achat_unitaire,
+                            fournisseur_id=fournisseur_id
+                        )
+                        try:
+                            Lot.allouer(ligne)
+                        except StockInsuffisant as e:
+                            raise StockInsuffisant(f"{produit.designation} : {e}")
+                        total_vente += montant_ligne
+
+                    vente.montant_total = total_vente
+                    if total_vente >= Decimal('10000'):
+                        vente.montant_remise = (total_vente * vente.remise_pourcent / Decimal('100')).quantize(Decimal('0.01'))
+                    else:
+                        vente.montant_remise = Decimal('0')
+                    vente.montant_net = total_vente - vente.montant_remise
+                    vente.save()
+                    ClotureJournee.ajuster(vente.pk, avant, vente.etat_cloture(), request.user)
+            except StockInsuffisant as e:
+                messages.error(request, f"Modification annulée. {e}")
+                return redirect('vente_edit', pk=vente.pk)
+            MoisCubeVentes.invalider(vente.date_vente)
+
             messages.success(request, f"Vente #{vente.code_vente} modifiée avec succès.")
             return redirect('vente_detail', pk=vente.pk)
     else:
@@ -554,7 +608,6 @@ def vente_edit(request, pk):
     produits_disponibles = Produit.objects.filter(quantite_stock__gt=0).select_related('fournisseur').order_by('designation')
     
     # Préparer les données JSON pour l'autocomplétion
-    import json
     produits_data = []
     for p in produits_disponibles:
         produits_data.append({
@@ -631,11 +684,19 @@ def vente_credit_payer(request, pk):
             elif montant > reste:
                 messages.error(request, f"Le montant dépasse le reste à payer ({reste} FC).")
             else:
-                vente.montant_paye += montant
-                if vente.montant_paye >= vente.montant_total:
-                    vente.est_solde = True
-                vente.save()
-                enregistrer_historique(request.user, 'paiement', 'Vente', f"Paiement {montant} FC sur vente #{vente.code_vente}")
+                from django.db import transaction
+                avant = vente.etat_cloture()
+                with transaction.atomic():
+                    vente.montant_paye += montant
+                    if vente.montant_paye >= vente.montant_total:
+                        vente.est_solde = True
+                    vente.save()
+                    ClotureJournee.ajuster(vente.pk, avant, vente.etat_cloture(), request.user)
+                enregistrer_historique(
+                    request.user, 'paiement', 'Vente', f"Paiement {montant} FC sur vente #{vente.code_vente}",
+                    cible=vente, donnees={'montant': montant, 'montant_paye': vente.montant_paye,
+                                          'est_solde': vente.est_solde},
+                )
                 messages.success(request, f"Paiement de {montant} FC enregistré. Reste: {vente.montant_total - vente.montant_paye} FC")
         except (ValueError, Exception) as e:
             messages.error(request, f"Erreur: {e}")
@@ -727,41 +788,51 @@ def vente_create(request):
                     adresse=form.cleaned_data.get('nouveau_client_adresse', ''),
                 )
 
-            vente = form.save(commit=False)
-            vente.client = client
-            vente.vendeur = request.user
-            vente.save()
-
+            from django.db import transaction
             erreurs = []
-            for ld in lignes_data:
-                try:
-                    produit = Produit.objects.get(pk=ld['produit_id'])
-                    qte = int(ld['quantite'])
-                    if qte > produit.quantite_stock:
-                        erreurs.append(f"Stock insuffisant pour {produit.designation} (dispo: {produit.quantite_stock})")
+            with transaction.atomic():
+                vente = form.save(commit=False)
+                vente.client = client
+                vente.vendeur = request.user
+                vente.save()
+
+                for ld in lignes_data:
+                    try:
+                        qte = int(ld['quantite'])
+                        # Verrou sur le produit : deux ventes simultanées ne prennent pas les mêmes unités.
+                        produit = Produit.objects.select_for_update().get(pk=ld['produit_id'])
+                        if qte > produit.quantite_stock:
+                            erreurs.append(f"Stock insuffisant pour {produit.designation} (dispo: {produit.quantite_stock})")
+                            continue
+                        prix = produit.prix_vente
+                        with transaction.atomic():
+                            ligne = LigneVente.objects.create(
+                                vente=vente, produit=produit, quantite=qte,
+                                prix_unitaire=prix, montant_ligne=qte * prix
+                            )
+                            Lot.allouer(ligne)
+                    except StockInsuffisant as e:
+                        erreurs.append(f"{produit.designation} : {e}")
+                    except (Produit.DoesNotExist, ValueError, KeyError):
                         continue
-                    prix = produit.prix_vente
-                    LigneVente.objects.create(
-                        vente=vente, produit=produit, quantite=qte,
-                        prix_unitaire=prix, montant_ligne=qte * prix
-                    )
-                    produit.quantite_stock -= qte
-                    produit.save()
-                except (Produit.DoesNotExist, ValueError, KeyError):
-                    continue
 
-            vente.calculer_total()
-            
-            # Gérer le mode de paiement
-            if vente.mode_paiement == 'comptant':
-                vente.montant_paye = vente.montant_net
-                vente.est_solde = True
-            else:
-                vente.montant_paye = 0
-                vente.est_solde = False
-            vente.save()
+                vente.calculer_total()
+
+                # Gérer le mode de paiement
+                if vente.mode_paiement == 'comptant':
+                    vente.montant_paye = vente.montant_net
+                    vente.est_solde = True
+                else:
+                    vente.montant_paye = 0
+                    vente.est_solde = False
+                vente.save()
+                ClotureJournee.ajuster(vente.pk, None, vente.etat_cloture(), request.user)
             
-            enregistrer_historique(request.user, 'creation', 'Vente', f"Vente #{vente.code_vente} - {vente.montant_total} FC")
+            enregistrer_historique(
+                request.user, 'creation', 'Vente', f"Vente #{vente.code_vente} - {vente.montant_total} FC",
+                cible=vente, donnees={'montant_total': vente.montant_total, 'montant_paye': vente.montant_paye,
+                                      'type_vente': vente.type_vente},
+            )
             for err in erreurs:
                 messages.warning(request, err)
             messages.success(request, f"Vente #{vente.code_vente} enregistrée avec succès.")
@@ -771,6 +842,7 @@ def vente_create(request):
                     'success': True,
                     'detail_url': reverse('vente_detail', args=[vente.pk]),
                     'facture_url': reverse('facture_pdf', args=[vente.pk]),
+                    'ticket_url': reverse('vente_ticket', args=[vente.pk]),
                     'montant_total': float(vente.montant_total or 0),
                     'montant_remise': float(vente.montant_remise or 0),
                     'montant_net': float(vente.montant_net or 0),
@@ -818,6 +890,7 @@ def vente_detail(request, pk):
 @login_required
 def vente_add_ligne(request, pk):
     vente = get_object_or_404(Vente, pk=pk)
+    avant = vente.etat_cloture()
     if request.method == 'POST':
         form = LigneVenteForm(request.POST)
         if form.is_valid():
@@ -829,24 +902,35 @@ def vente_add_ligne(request, pk):
                 return redirect('vente_detail', pk=pk)
             ligne.prix_unitaire = produit.prix_vente
             ligne.montant_ligne = ligne.quantite * ligne.prix_unitaire
-            ligne.save()
-            produit.quantite_stock -= ligne.quantite
-            produit.save()
-            vente.calculer_total()
+            from django.db import transaction
+            try:
+                with transaction.atomic():
+                    ligne.save()
+                    Lot.allouer(ligne)
+                    vente.calculer_total()
+                    ClotureJournee.ajuster(vente.pk, avant, vente.etat_cloture(), request.user)
+            except StockInsuffisant as e:
+                messages.error(request, f"{produit.designation} : {e}")
+                return redirect('vente_detail', pk=pk)
+            MoisCubeVentes.invalider(vente.date_vente)
             messages.success(request, f"{produit.designation} ajouté à la vente.")
     return redirect('vente_detail', pk=pk)
 
 
 @non_vendeur_required
 def vente_remove_ligne(request, pk, ligne_pk):
-    ligne = get_object_or_404(LigneVente, pk=ligne_pk, vente__pk=pk)
+    ligne = get_object_or_404(LigneVente.objects.select_related('vente', 'produit'), pk=ligne_pk, vente__pk=pk)
     if request.method == 'POST':
-        produit = ligne.produit
-        produit.quantite_stock += ligne.quantite
-        produit.save()
-        ligne.delete()
-        vente = get_object_or_404(Vente, pk=pk)
-        vente.calculer_total()
+        from django.db import transaction
+        vente = ligne.vente
+        avant = vente.etat_cloture()
+        # Stock restitué, ligne supprimée et total recalculé ensemble, ou pas du tout
+        with transaction.atomic():
+            Lot.restituer([ligne])
+            ligne.delete()
+            vente.calculer_total()
+            ClotureJournee.ajuster(vente.pk, avant, vente.etat_cloture(), request.user)
+        MoisCubeVentes.invalider(vente.date_vente)
         messages.success(request, "Ligne supprimée.")
     return redirect('vente_detail', pk=pk)
 
@@ -855,11 +939,13 @@ def vente_remove_ligne(request, pk, ligne_pk):
 def vente_delete(request, pk):
     vente = get_object_or_404(Vente, pk=pk)
     if request.method == 'POST':
-        for ligne in vente.lignes.all():
-            produit = ligne.produit
-            produit.quantite_stock += ligne.quantite
-            produit.save()
-        vente.delete()
+        from django.db import transaction
+        code_vente, avant = vente.pk, vente.etat_cloture()
+        with transaction.atomic():
+            Lot.restituer(vente.lignes.select_related('produit'))
+            vente.delete()
+            ClotureJournee.ajuster(code_vente, avant, None, request.user)
+        MoisCubeVentes.invalider(vente.date_vente)
         messages.success(request, "Vente supprimée avec succès.")
         return redirect('vente_list')
     return render(request, 'pharmacy/confirm_delete.html', {'object': vente, 'type': 'Vente'})
@@ -867,101 +953,101 @@ def vente_delete(request, pk):
 
 # ============ LISTE PRODUITS PDF ============
 
-@login_required
-def produits_liste_pdf(request):
-    """Générer un PDF avec la liste de tous les produits en stock"""
+def document_produits_liste(parametres, utilisateur, progression):
+    """Générateur de tâche : liste de tous les produits en stock."""
     from django.db.models import Sum
-    
-    produits = Produit.objects.select_related('fournisseur').all().order_by('designation')
-    
+
+    produits = Produit.objects.select_related('fournisseur').avec_statut_expiration().order_by('designation')
+
     total_qte_initiale = produits.aggregate(total=Sum('quantite_initiale'))['total'] or 0
     total_qte_stock = produits.aggregate(total=Sum('quantite_stock'))['total'] or 0
-    
-    template = get_template('pharmacy/produits_liste_pdf.html')
+    progression(10)
+
+    total_produits = produits.count()
     context = {
-        'produits': produits,
-        'total_produits': produits.count(),
+        'total_produits': total_produits,
         'total_qte_initiale': total_qte_initiale,
         'total_qte_stock': total_qte_stock,
         'date_impression': timezone.now(),
-        'utilisateur': request.user.get_full_name() or request.user.username,
+        'utilisateur': utilisateur.get_full_name() or utilisateur.username,
     }
-    html = template.render(context)
-    response = HttpResponse(content_type='application/pdf')
-    response['Content-Disposition'] = 'filename="liste_produits.pdf"'
-    pisa_status = pisa.CreatePDF(html, dest=response)
-    if pisa_status.err:
-        return HttpResponse("Erreur lors de la génération du PDF", status=500)
-    return response
+    contenu = rendre_pdf_par_morceaux(
+        'pharmacy/produits_liste_pdf.html', context, 'produits',
+        produits.iterator(chunk_size=settings.PDF_MORCEAU_LIGNES), nb_lignes=total_produits, progression=progression,
+    )
+    return 'liste_produits.pdf', contenu
+
+
+@login_required
+def produits_liste_pdf(request):
+    """Générer un PDF avec la liste de tous les produits en stock"""
+    from .taches import lancer
+    return lancer(request, 'produits_liste_pdf')
 
 
 # ============ FACTURE PDF ============
 
 @login_required
 def facture_pdf(request, pk):
+    """Facture d'une vente, servie depuis le cache disque tant que la vente n'a pas changé.
+
+    La facture porte la date du jour d'impression : la clé inclut donc le jour,
+    une réimpression le lendemain est rendue à nouveau.
+    """
+    from datetime import datetime, time
+    from . import cache_pdf
+    from .factures import moteur_facture, rendre_facture
+    from .taches import ErreurDocument
     vente = get_object_or_404(Vente, pk=pk)
-    lignes = list(vente.lignes.select_related('produit').all())
-    heure_facture = vente.date_vente.strftime('%H:%M:%S')
-    LIGNES_PAR_PAGE = 15
-    pages = []
-    for i in range(0, len(lignes), LIGNES_PAR_PAGE):
-        chunk = lignes[i:i + LIGNES_PAR_PAGE]
-        pages.append({
-            'lignes': chunk,
-            'start_num': i + 1,
-        })
-    if not pages:
-        pages = [{'lignes': [], 'start_num': 1}]
-    template = get_template('pharmacy/facture_pdf.html')
-    context = {
-        'vente': vente,
-        'pages': pages,
-        'total_pages': len(pages),
-        'date_du_jour': timezone.now(),
-        'heure_facture': heure_facture,
-    }
-    html = template.render(context)
-    response = HttpResponse(content_type='application/pdf')
-    response['Content-Disposition'] = f'filename="facture_{vente.code_vente}.pdf"'
-    pisa_status = pisa.CreatePDF(html, dest=response)
-    if pisa_status.err:
-        return HttpResponse("Erreur lors de la génération du PDF", status=500)
-    return response
+    aujourd_hui = timezone.localdate()
+    moteur = moteur_facture()
+    version = f"{vente.version}_{aujourd_hui:%Y%m%d}_{moteur}"
+    etag = f'"facture-{vente.pk}-{version}"'
+    debut_jour = timezone.make_aware(datetime.combine(aujourd_hui, time.min))
+    derniere_modif = max(vente.date_modification, debut_jour)
+    non_modifie = cache_pdf.non_modifie(request, etag, derniere_modif)
+    if non_modifie is not None:
+        return non_modifie
+    nom_cache = cache_pdf.nom_document('facture', vente.pk, version)
+    contenu = cache_pdf.lire(nom_cache)
+    if contenu is None:
+        lignes = list(vente.lignes.select_related('produit').all())
+        try:
+            contenu = rendre_facture(vente, lignes, moteur)
+        except ErreurDocument as e:
+            return HttpResponse(str(e), status=500)
+        cache_pdf.ecrire(nom_cache, contenu)
+    return cache_pdf.reponse_pdf(contenu, f"facture_{vente.code_vente}.pdf", etag, derniere_modif)
+
+
+@login_required
+def vente_ticket(request, pk):
+    """Ticket de caisse thermique : texte brut (?format=texte) ou flux ESC/POS (?format=escpos).
+
+    `?largeur=58|80` (mm) ; par défaut TICKET_LARGEUR_MM.
+    """
+    from .tickets import ticket_escpos, ticket_texte
+    vente = get_object_or_404(Vente.objects.select_related('client', 'vendeur'), pk=pk)
+    lignes = list(vente.lignes.select_related('produit'))
+    try:
+        largeur_mm = int(request.GET.get('largeur', settings.TICKET_LARGEUR_MM))
+    except ValueError:
+        largeur_mm = settings.TICKET_LARGEUR_MM
+    if request.GET.get('format') == 'escpos':
+        response = HttpResponse(ticket_escpos(vente, lignes, largeur_mm), content_type='application/octet-stream')
+        response['Content-Disposition'] = f'attachment; filename="ticket_{vente.code_vente}.bin"'
+        return response
+    return HttpResponse(ticket_texte(vente, lignes, largeur_mm), content_type='text/plain; charset=utf-8')
 
 
 # ============ RAPPORT JOURNALIER PDF ============
 
-@login_required
-def rapport_journalier_pdf(request):
-    """Générer le rapport journalier PDF pour un vendeur"""
-    import os, base64
-    from datetime import date as dt_date
-    
-    # Date du rapport (aujourd'hui par défaut, ou paramètre GET)
-    date_str = request.GET.get('date')
-    if date_str:
-        try:
-            from datetime import datetime
-            date_rapport = datetime.strptime(date_str, '%Y-%m-%d').date()
-        except ValueError:
-            date_rapport = dt_date.today()
-    else:
-        date_rapport = dt_date.today()
-    
-    # Vendeur (soi-même par défaut, ou paramètre GET pour admin)
-    vendeur_id = request.GET.get('vendeur')
-    if vendeur_id and request.user.is_admin:
-        from accounts.models import CustomUser
-        vendeur = get_object_or_404(CustomUser, pk=vendeur_id)
-    else:
-        vendeur = request.user
-    
-    # Ventes du jour pour ce vendeur
-    ventes_jour = Vente.objects.filter(
-        vendeur=vendeur,
-        date_vente__date=date_rapport
-    ).select_related('client').prefetch_related('lignes__produit').order_by('date_vente')
-    
+def _contexte_rapport_journalier(vendeur, date_rapport, ventes_jour, historiques, cloture=None):
+    """Contexte du gabarit rapport_journalier_pdf.html pour un vendeur et un jour.
+
+    Si la journée est clôturée, le rapport reprend aussi la part du vendeur dans
+    le rapport Z (lignes figées, caisse, ajustements).
+    """
     ventes_comptant = [v for v in ventes_jour if v.mode_paiement == 'comptant']
     ventes_credit = [v for v in ventes_jour if v.mode_paiement == 'credit']
     
@@ -976,20 +1062,18 @@ def rapport_journalier_pdf(request):
     total_net_comptant = sum(v.montant_net for v in ventes_comptant)
     total_net_credit = sum(v.montant_net for v in ventes_credit)
     total_net = total_net_comptant + total_net_credit
+
+    if cloture is not None:
+        cloture_vendeur = {
+            'cloture': cloture,
+            'cloture_lignes': [l for l in cloture.lignes.all() if l.vendeur_id == vendeur.pk],
+            'cloture_caisse': next((c for c in cloture.caisses.all() if c.vendeur_id == vendeur.pk), None),
+            'cloture_ajustements': [a for a in cloture.ajustements.all() if a.vendeur_id == vendeur.pk],
+        }
+    else:
+        cloture_vendeur = {}
     
-    # Historique du jour (suppressions, modifications, etc.)
-    historiques = Historique.objects.filter(
-        utilisateur=vendeur,
-        date_action__date=date_rapport
-    ).exclude(action='creation').exclude(action='connexion').order_by('date_action')
-    
-    logo_path = os.path.join(settings.BASE_DIR, 'static', 'img', 'logo.png')
-    logo_data = ''
-    if os.path.exists(logo_path):
-        with open(logo_path, 'rb') as f:
-            logo_data = 'data:image/png;base64,' + base64.b64encode(f.read()).decode('utf-8')
-    template = get_template('pharmacy/rapport_journalier_pdf.html')
-    context = {
+    return {
         'vendeur': vendeur,
         'date_rapport': date_rapport,
         'date_impression': timezone.now(),
@@ -1005,29 +1089,460 @@ def rapport_journalier_pdf(request):
         'total_net_credit': total_net_credit,
         'total_net': total_net,
         'historiques': historiques,
-        'logo_data': logo_data,
+        **cloture_vendeur,
     }
-    html = template.render(context)
-    response = HttpResponse(content_type='application/pdf')
-    response['Content-Disposition'] = f'filename="rapport_{vendeur.username}_{date_rapport}.pdf"'
-    pisa_status = pisa.CreatePDF(html, dest=response)
-    if pisa_status.err:
-        return HttpResponse("Erreur lors de la génération du PDF", status=500)
-    return response
 
 
-# ============ HISTORIQUE / AUDIT ============
+def document_rapport_journalier(parametres, utilisateur, progression):
+    """Générateur de tâche : rapport journalier d'un vendeur."""
+    from datetime import datetime
+    from django.contrib.auth import get_user_model
+
+    date_rapport = datetime.strptime(parametres['date'], '%Y-%m-%d').date()
+    vendeur = get_user_model().objects.get(pk=parametres['vendeur'])
+
+    # Ventes du jour pour ce vendeur
+    ventes_jour = Vente.objects.filter(
+        vendeur=vendeur,
+        date_vente__date=date_rapport
+    ).select_related('client').prefetch_related('lignes__produit').order_by('date_vente')
+
+    # Historique du jour (suppressions, modifications, etc.)
+    audit.vider()
+    historiques = Historique.objects.filter(
+        utilisateur=vendeur,
+        date_action__date=date_rapport
+    ).exclude(action='creation').exclude(action='connexion').order_by('date_action')
+    progression(20)
+
+    cloture = ClotureJournee.objects.filter(jour=date_rapport).first()
+    context = _contexte_rapport_journalier(vendeur, date_rapport, ventes_jour, historiques, cloture)
+    return f"rapport_{vendeur.username}_{date_rapport}.pdf", rendre_pdf('pharmacy/rapport_journalier_pdf.html', context)
+
+
+@login_required
+def rapport_journalier_pdf(request):
+    """Générer le rapport journalier PDF pour un vendeur"""
+    from datetime import date as dt_date
+    from .taches import lancer
+    
+    # Date du rapport (aujourd'hui par défaut, ou paramètre GET)
+    date_str = request.GET.get('date')
+    if date_str:
+        try:
+            from datetime import datetime
+            date_rapport = datetime.strptime(date_str, '%Y-%m-%d').date()
+        except ValueError:
+            date_rapport = dt_date.today()
+    else:
+        date_rapport = dt_date.today()
+    
+    # Vendeur (soi-même par défaut, ou paramètre GET pour admin/gérant)
+    vendeur_id = request.GET.get('vendeur')
+    if vendeur_id and is_admin_or_gerant(request.user):
+        from accounts.models import User as UserModel
+        vendeur = get_object_or_404(UserModel, pk=vendeur_id)
+    else:
+        vendeur = request.user
+    
+    return lancer(request, 'rapport_journalier_pdf', {'date': date_rapport.isoformat(), 'vendeur': vendeur.pk})
+
+
+# ============ LOTS DE DOCUMENTS ============
+
+LOT_JOURS_MAX = 31
+TYPES_LOT = {
+    'factures': "Factures des ventes",
+    'rapports': "Rapports journaliers des vendeurs",
+}
+FORMATS_LOT = {
+    'pdf': "Un seul PDF",
+    'zip': "Archive ZIP (un PDF par document)",
+}
+
+
+def _periode_lot(parametres):
+    from datetime import datetime, time
+    date_debut = date.fromisoformat(parametres['date_debut'])
+    date_fin = date.fromisoformat(parametres['date_fin'])
+    return (
+        date_debut, date_fin,
+        timezone.make_aware(datetime.combine(date_debut, time.min)),
+        timezone.make_aware(datetime.combine(date_fin + timedelta(days=1), time.min)),
+    )
+
+
+def _ventes_lot(parametres, debut, fin):
+    """Ventes de la période avec client, vendeur, lignes et produits : deux requêtes en tout."""
+    ventes = Vente.objects.filter(date_vente__gte=debut, date_vente__lt=fin)
+    if parametres.get('vendeur'):
+        ventes = ventes.filter(vendeur_id=parametres['vendeur'])
+    return list(
+        ventes.select_related('client', 'vendeur')
+        .prefetch_related(models.Prefetch('lignes', queryset=LigneVente.objects.select_related('produit')))
+        .order_by('date_vente', 'pk')
+    )
 
-def enregistrer_historique(user, action, modele='', detail=''):
-    Historique.objects.create(
-        utilisateur=user, action=action, modele=modele, detail=detail
+
+def _emballer_lot(nom_base, format_lot, noms, contenus):
+    """Un seul PDF (documents mis bout à bout) ou une archive ZIP d'un PDF par document."""
+    import zipfile
+    from io import BytesIO
+    from .rapports_pdf import assembler_pdf
+    if format_lot == 'zip':
+        tampon = BytesIO()
+        with zipfile.ZipFile(tampon, 'w', zipfile.ZIP_DEFLATED) as archive:
+            for nom, contenu in zip(noms, contenus):
+                archive.writestr(nom, contenu)
+        return f"{nom_base}.zip", tampon.getvalue()
+    return f"{nom_base}.pdf", assembler_pdf(contenus)
+
+
+def _suivre(contenus, nb, progression):
+    for i, contenu in enumerate(contenus, start=1):
+        progression(10 + 85 * i // nb)
+        yield contenu
+
+
+def document_lot_factures(parametres, utilisateur, progression):
+    """Générateur de tâche : toutes les factures d'une période (éventuellement d'un vendeur).
+
+    Les ventes, leurs lignes et produits sont lus en deux requêtes ; les factures
+    sont rendues en parallèle (rendre_en_parallele) avec le moteur FACTURE_MOTEUR.
+    """
+    from .factures import moteur_facture, rendre_facture
+    from .rapports_pdf import rendre_en_parallele
+    from .taches import ErreurDocument
+
+    date_debut, date_fin, debut, fin = _periode_lot(parametres)
+    ventes = _ventes_lot(parametres, debut, fin)
+    if not ventes:
+        raise ErreurDocument("Aucune vente sur la période choisie.")
+    progression(10)
+    moteur = moteur_facture()
+    appels = ((rendre_facture, v, list(v.lignes.all()), moteur) for v in ventes)
+    noms = [f"facture_{v.code_vente}.pdf" for v in ventes]
+    contenus = _suivre(rendre_en_parallele(appels), len(ventes), progression)
+    return _emballer_lot(f"factures_{date_debut}_{date_fin}", parametres.get('format'), noms, contenus)
+
+
+def document_lot_rapports(parametres, utilisateur, progression):
+    """Générateur de tâche : rapport journalier de chaque vendeur, pour chaque jour de la période où il a vendu.
+
+    Un nombre fixe de requêtes (ventes, lignes avec produits, historique,
+    clôtures de la période) quel que soit le nombre de rapports ; le tout est
+    réparti par vendeur et par jour en mémoire, puis les rapports rendus en
+    parallèle.
+    """
+    from .rapports_pdf import rendre_en_parallele
+    from .taches import ErreurDocument
+
+    date_debut, date_fin, debut, fin = _periode_lot(parametres)
+    ventes = _ventes_lot(parametres, debut, fin)
+    if not ventes:
+        raise ErreurDocument("Aucune vente sur la période choisie.")
+
+    groupes = {}
+    for v in ventes:
+        cle = (v.vendeur_id, timezone.localtime(v.date_vente).date())
+        groupes.setdefault(cle, {'vendeur': v.vendeur, 'ventes': [], 'historiques': []})['ventes'].append(v)
+
+    audit.vider()
+    historiques = Historique.objects.filter(
+        utilisateur_id__in={vendeur_id for vendeur_id, _ in groupes},
+        date_action__gte=debut, date_action__lt=fin,
+    ).exclude(action='creation').exclude(action='connexion').order_by('date_action')
+    for h in historiques:
+        groupe = groupes.get((h.utilisateur_id, timezone.localtime(h.date_action).date()))
+        if groupe is not None:
+            groupe['historiques'].append(h)
+    clotures = {
+        c.jour: c
+        for c in ClotureJournee.objects.filter(jour__gte=date_debut, jour__lte=date_fin)
+        .prefetch_related('lignes', 'caisses', 'ajustements')
+    }
+    progression(10)
+
+    cles = sorted(groupes, key=lambda c: (c[1], groupes[c]['vendeur'].username))
+    appels = (
+        (rendre_pdf, 'pharmacy/rapport_journalier_pdf.html', _contexte_rapport_journalier(
+            groupes[c]['vendeur'], c[1], groupes[c]['ventes'], groupes[c]['historiques'], clotures.get(c[1]),
+        ))
+        for c in cles
     )
+    noms = [f"rapport_{groupes[c]['vendeur'].username}_{c[1]}.pdf" for c in cles]
+    contenus = _suivre(rendre_en_parallele(appels), len(cles), progression)
+    return _emballer_lot(f"rapports_{date_debut}_{date_fin}", parametres.get('format'), noms, contenus)
+
+
+@admin_gerant_required
+def lot_documents(request):
+    """Réimpression groupée : factures ou rapports journaliers d'une période, en un PDF ou un ZIP."""
+    from accounts.models import User as UserModel
+    from .taches import lancer
+
+    aujourd_hui = timezone.localdate()
+    form = {
+        'type': request.GET.get('type', 'factures'),
+        'format': request.GET.get('format', 'pdf'),
+        'date_debut': request.GET.get('date_debut', aujourd_hui.isoformat()),
+        'date_fin': request.GET.get('date_fin', aujourd_hui.isoformat()),
+        'vendeur': request.GET.get('vendeur', ''),
+    }
+    if 'generer' in request.GET:
+        try:
+            date_debut = date.fromisoformat(form['date_debut'])
+            date_fin = date.fromisoformat(form['date_fin'])
+        except ValueError:
+            messages.error(request, "Dates invalides.")
+        else:
+            if form['type'] not in TYPES_LOT or form['format'] not in FORMATS_LOT:
+                messages.error(request, "Type de document ou format inconnu.")
+            elif date_fin < date_debut:
+                messages.error(request, "La date de fin précède la date de début.")
+            elif (date_fin - date_debut).days >= LOT_JOURS_MAX:
+                messages.error(request, f"La période est limitée à {LOT_JOURS_MAX} jours.")
+            else:
+                return lancer(request, f"lot_{form['type']}", {
+                    'date_debut': date_debut.isoformat(),
+                    'date_fin': date_fin.isoformat(),
+                    'vendeur': int(form['vendeur']) if form['vendeur'].isdigit() else None,
+                    'format': form['format'],
+                })
+
+    return render(request, 'pharmacy/lot_documents.html', {
+        'form': form,
+        'types_lot': TYPES_LOT.items(),
+        'formats_lot': FORMATS_LOT.items(),
+        'vendeurs': UserModel.objects.filter(is_active=True).order_by('username'),
+        'jours_max': LOT_JOURS_MAX,
+    })
+
+
+# ============ CLÔTURE JOURNALIÈRE ============
+
+def totaux_cloture(jour):
+    """Totaux de la journée par vendeur, en une seule requête groupée (agrégats conditionnels).
+
+    Une ligne par vendeur ayant vendu : nombre de ventes, montants bruts, remises
+    et nets au comptant et à crédit, montant encaissé.
+    """
+    from django.db.models import Count, DecimalField, Q, Sum, Value
+    from django.db.models.functions import Coalesce
+
+    montant = DecimalField(max_digits=15, decimal_places=2)
+    modes = {'comptant': Q(mode_paiement='comptant'), 'credit': Q(mode_paiement='credit')}
+
+    def somme(champ, filtre=None):
+        return Coalesce(Sum(champ, filter=filtre), Value(Decimal('0')), output_field=montant)
+
+    agregats = {'encaisse': somme('montant_paye')}
+    for mode, filtre in modes.items():
+        agregats[f'nb_{mode}'] = Count('pk', filter=filtre)
+        agregats[f'total_{mode}'] = somme('montant_total', filtre)
+        agregats[f'remise_{mode}'] = somme('montant_remise', filtre)
+        agregats[f'net_{mode}'] = somme('montant_net', filtre)
+
+    debut, fin = _bornes_jour(jour)
+    lignes = list(
+        Vente.objects.filter(date_vente__gte=debut, date_vente__lt=fin)
+        .values('vendeur_id', 'vendeur__username', 'vendeur__first_name', 'vendeur__last_name')
+        .annotate(**agregats)
+        .order_by('vendeur__username')
+    )
+    for l in lignes:
+        _completer_ligne_cloture(l)
+    return lignes
+
+
+def totaux_cloture_figes(cloture):
+    """Mêmes lignes que `totaux_cloture`, lues dans le rapport Z d'une journée clôturée, avec la caisse comptée."""
+    par_vendeur = {}
+    for lc in cloture.lignes.select_related('vendeur'):
+        l = par_vendeur.setdefault(lc.vendeur_id, {
+            'vendeur_id': lc.vendeur_id,
+            'vendeur__username': lc.vendeur.username,
+            'vendeur__first_name': lc.vendeur.first_name,
+            'vendeur__last_name': lc.vendeur.last_name,
+            'encaisse': Decimal('0'),
+            **{f'{cle}_{mode}': 0 for cle in ('nb', 'total', 'remise', 'net') for mode in ('comptant', 'credit')},
+        })
+        l[f'nb_{lc.mode_paiement}'] = lc.nb_ventes
+        l[f'total_{lc.mode_paiement}'] = lc.montant_total
+        l[f'remise_{lc.mode_paiement}'] = lc.montant_remise
+        l[f'net_{lc.mode_paiement}'] = lc.montant_net
+        l['encaisse'] += lc.montant_paye
+    caisses = {c.vendeur_id: c for c in cloture.caisses.all()}
+    lignes = sorted(par_vendeur.values(), key=lambda l: l['vendeur__username'])
+    for l in lignes:
+        _completer_ligne_cloture(l)
+        l['caisse'] = caisses.get(l['vendeur_id'])
+    return lignes
+
+
+def _completer_ligne_cloture(l):
+    l['nom'] = f"{l['vendeur__first_name']} {l['vendeur__last_name']}".strip() or l['vendeur__username']
+    l['nb_ventes'] = l['nb_comptant'] + l['nb_credit']
+    l['total'] = l['total_comptant'] + l['total_credit']
+    l['remise'] = l['remise_comptant'] + l['remise_credit']
+    l['net'] = l['net_comptant'] + l['net_credit']
+    l['reste'] = l['net'] - l['encaisse']
+
+
+@admin_gerant_required
+def cloture_journaliere(request):
+    """Rapport de clôture consolidé : tous les vendeurs de la journée côte à côte.
+
+    Tant que la journée est ouverte, les totaux sont calculés sur les ventes et
+    un formulaire permet de la clôturer avec les espèces comptées par vendeur.
+    Une journée clôturée est lue dans son rapport Z figé, avec ses ajustements.
+    """
+    from django.urls import reverse
+    try:
+        jour = date.fromisoformat(request.GET.get('date', ''))
+    except ValueError:
+        jour = timezone.localdate()
+    cloture = ClotureJournee.objects.select_related('cloture_par').filter(jour=jour).first()
+
+    if request.method == 'POST' and cloture is None:
+        especes = {}
+        try:
+            for cle, valeur in request.POST.items():
+                if cle.startswith('especes_') and valeur.strip():
+                    especes[int(cle.removeprefix('especes_'))] = Decimal(valeur.replace(' ', '').replace(',', '.'))
+        except (ValueError, ArithmeticError):
+            messages.error(request, "Montant d'espèces invalide.")
+        else:
+            if jour > timezone.localdate():
+                messages.error(request, "Impossible de clôturer une journée future.")
+            else:
+                try:
+                    cloture = ClotureJournee.cloturer(jour, request.user, especes, request.POST.get('observation', '').strip())
+                except ClotureImmuable as e:
+                    messages.error(request, str(e))
+                else:
+                    enregistrer_historique(
+                        request.user, 'creation', 'Clôture', f"Clôture de la journée du {jour:%d/%m/%Y}",
+                        cible=cloture, donnees={'especes': especes},
+                    )
+                    messages.success(request, f"Journée du {jour:%d/%m/%Y} clôturée.")
+        return redirect(f"{reverse('cloture_journaliere')}?date={jour.isoformat()}")
+
+    vendeurs = totaux_cloture_figes(cloture) if cloture else totaux_cloture(jour)
+    cles = ('nb_comptant', 'nb_credit', 'nb_ventes', 'total_comptant', 'total_credit', 'total',
+            'remise', 'net_comptant', 'net_credit', 'net', 'encaisse', 'reste')
+    totaux = {cle: sum(v[cle] for v in vendeurs) for cle in cles}
+    if cloture:
+        caisses = [v['caisse'] for v in vendeurs if v['caisse'] and v['caisse'].montant_compte is not None]
+        totaux['compte'] = sum(c.montant_compte for c in caisses) if caisses else None
+        totaux['ecart'] = sum(c.ecart for c in caisses) if caisses else None
+
+    return render(request, 'pharmacy/cloture_journaliere.html', {
+        'jour': jour,
+        'jour_precedent': jour - timedelta(days=1),
+        'jour_suivant': jour + timedelta(days=1) if jour < timezone.localdate() else None,
+        'vendeurs': vendeurs,
+        'totaux': totaux,
+        'cloture': cloture,
+        'ajustements': cloture.ajustements.select_related('vendeur', 'utilisateur') if cloture else [],
+        'peut_cloturer': cloture is None and jour <= timezone.localdate(),
+    })
+
+
+@admin_gerant_required
+def cloture_journaliere_detail(request):
+    """Ventes d'un vendeur pour une journée (JSON), chargées à l'ouverture de sa ligne."""
+    try:
+        jour = date.fromisoformat(request.GET.get('date', ''))
+        vendeur_id = int(request.GET.get('vendeur', ''))
+    except ValueError:
+        return JsonResponse({'error': "Paramètres invalides."}, status=400)
+    debut, fin = _bornes_jour(jour)
+    ventes = Vente.objects.filter(
+        vendeur_id=vendeur_id, date_vente__gte=debut, date_vente__lt=fin,
+    ).order_by('date_vente').values(
+        'code_vente', 'date_vente', 'client__nom', 'mode_paiement',
+        'montant_total', 'montant_remise', 'montant_net', 'montant_paye',
+    )
+    return JsonResponse({'ventes': [
+        {
+            'code': v['code_vente'],
+            'heure': timezone.localtime(v['date_vente']).strftime('%H:%M'),
+            'client': v['client__nom'] or 'ANONYME',
+            'mode': v['mode_paiement'],
+            'total': float(v['montant_total']),
+            'remise': float(v['montant_remise']),
+            'net': float(v['montant_net']),
+            'paye': float(v['montant_paye']),
+        }
+        for v in ventes
+    ]})
+
+
+# ============ TÂCHES DE FOND ============
+
+def _tache_de(request, pk):
+    taches = Tache.objects.all() if request.user.is_admin else Tache.objects.filter(utilisateur=request.user)
+    return get_object_or_404(taches, pk=pk)
+
+
+@login_required
+def tache_list(request):
+    """Documents demandés par l'utilisateur, gardés TACHES_RETENTION_HEURES après leur production."""
+    from .taches import libelle
+    taches = list(Tache.objects.filter(utilisateur=request.user)[:50])
+    for t in taches:
+        t.libelle = libelle(t.type_tache)
+    return render(request, 'pharmacy/tache_list.html', {'taches': taches})
+
+
+@login_required
+def tache_detail(request, pk):
+    """Page d'attente : suit la progression et ouvre le document dès qu'il est prêt."""
+    from .taches import libelle
+    tache = _tache_de(request, pk)
+    return render(request, 'pharmacy/tache_detail.html', {
+        'tache': tache,
+        'libelle': libelle(tache.type_tache),
+    })
+
+
+@login_required
+def tache_statut(request, pk):
+    from django.urls import reverse
+    tache = _tache_de(request, pk)
+    return JsonResponse({
+        'statut': tache.statut,
+        'statut_libelle': tache.get_statut_display(),
+        'progression': tache.progression,
+        'message': tache.message,
+        'telechargement': reverse('tache_telecharger', args=[tache.pk]) if tache.disponible else None,
+    })
+
+
+@login_required
+def tache_telecharger(request, pk):
+    from django.http import FileResponse
+    from .taches import type_contenu
+    tache = _tache_de(request, pk)
+    if not tache.disponible or not tache.chemin.exists():
+        messages.error(request, "Ce document n'est plus disponible, relancez-le.")
+        return redirect('tache_list')
+    return FileResponse(
+        open(tache.chemin, 'rb'), content_type=type_contenu(tache.nom_fichier),
+        as_attachment=not tache.nom_fichier.lower().endswith('.pdf'), filename=tache.nom_fichier,
+    )
+
+
+# ============ HISTORIQUE / AUDIT ============
+
+def enregistrer_historique(user, action, modele='', detail='', cible=None, donnees=None):
+    audit.journaliser(user, action, modele, detail, cible=cible, donnees=donnees)
 
 
 @login_required
 def historique_ventes(request):
     """Historique complet de toutes les ventes avec total des montants"""
-    from django.db.models import Sum, Count
     ventes = Vente.objects.select_related('client', 'vendeur').prefetch_related('lignes__produit').all()
 
     # Filtres optionnels
@@ -1045,9 +1560,19 @@ def historique_ventes(request):
     if mode and mode in ('comptant', 'credit'):
         ventes = ventes.filter(mode_paiement=mode)
 
-    total_montant = ventes.aggregate(total=Sum('montant_total'))['total'] or 0
-    total_comptant = ventes.filter(mode_paiement='comptant').aggregate(total=Sum('montant_total'))['total'] or 0
-    total_credit = ventes.filter(mode_paiement='credit').aggregate(total=Sum('montant_total'))['total'] or 0
+    # Totaux : journées clôturées lues dans leurs clôtures (plus ajustements), les autres dans les ventes
+    try:
+        totaux = ClotureJournee.totaux_periode(
+            date.fromisoformat(date_debut) if date_debut else None,
+            date.fromisoformat(date_fin) if date_fin else None,
+            vendeur_id=vendeur_id if vendeur_id and vendeur_id.isdigit() else None,
+        )
+    except ValueError:
+        messages.error(request, "Date de filtre invalide.")
+        totaux = ClotureJournee.totaux_periode()
+    total_comptant = totaux['comptant']['montant_total'] if mode != 'credit' else 0
+    total_credit = totaux['credit']['montant_total'] if mode != 'comptant' else 0
+    total_montant = total_comptant + total_credit
 
     from accounts.models import User
     vendeurs = User.objects.filter(is_active=True)
@@ -1066,6 +1591,20 @@ def historique_ventes(request):
     })
 
 
+HISTORIQUE_PAR_PAGE = 100
+
+
+def _lire_curseur(valeur):
+    """Curseur de pagination « date_iso|id » → (datetime, id) ou None."""
+    from django.utils.dateparse import parse_datetime
+    try:
+        date_str, pk = valeur.rsplit('|', 1)
+        date_action = parse_datetime(date_str)
+        return (date_action, int(pk)) if date_action else None
+    except (ValueError, AttributeError):
+        return None
+
+
 @login_required
 def historique_list(request):
     if not request.user.is_admin and not request.user.is_gestionnaire:
@@ -1073,26 +1612,89 @@ def historique_list(request):
         return redirect('dashboard')
 
     from accounts.models import User as UserModel
+    audit.vider()
     qs = Historique.objects.select_related('utilisateur').all()
 
     filtre_user = request.GET.get('utilisateur', '').strip()
     filtre_module = request.GET.get('module', '').strip()
+    date_debut = request.GET.get('date_debut', '').strip()
+    date_fin = request.GET.get('date_fin', '').strip()
+    recherche = request.GET.get('q', '').strip()
+    filtre_cible_type = request.GET.get('cible_type', '').strip()
+    filtre_cible_id = request.GET.get('cible_id', '').strip()
 
     if filtre_user:
         qs = qs.filter(utilisateur__pk=filtre_user)
     if filtre_module:
         qs = qs.filter(modele=filtre_module)
+    if filtre_cible_type:
+        qs = qs.filter(cible_type=filtre_cible_type)
+        if filtre_cible_id.isdigit():
+            qs = qs.filter(cible_id=int(filtre_cible_id))
+    if recherche:
+        qs = audit.rechercher_historique(qs, recherche)
+    # Bornes en datetime (et non __date) pour que l'index sur date_action serve.
+    from datetime import datetime, time
+    try:
+        if date_debut:
+            debut = datetime.combine(date.fromisoformat(date_debut), time.min)
+            qs = qs.filter(date_action__gte=timezone.make_aware(debut))
+        if date_fin:
+            fin = datetime.combine(date.fromisoformat(date_fin) + timedelta(days=1), time.min)
+            qs = qs.filter(date_action__lt=timezone.make_aware(fin))
+    except ValueError:
+        messages.error(request, "Date de filtre invalide.")
+
+    # Pagination par clé (date_action, id) : coût constant quelle que soit la page,
+    # via les index (date_action, id) et (modele, date_action).
+    avant = _lire_curseur(request.GET.get('avant', ''))
+    apres = _lire_curseur(request.GET.get('apres', ''))
+    if apres:
+        d, pk = apres
+        page = list(
+            qs.filter(models.Q(date_action__gt=d) | models.Q(date_action=d, pk__gt=pk))
+            .order_by('date_action', 'pk')[:HISTORIQUE_PAR_PAGE + 1]
+        )
+        a_plus_recents = len(page) > HISTORIQUE_PAR_PAGE
+        historiques = list(reversed(page[:HISTORIQUE_PAR_PAGE]))
+        a_plus_anciens = True
+    else:
+        if avant:
+            d, pk = avant
+            qs = qs.filter(models.Q(date_action__lt=d) | models.Q(date_action=d, pk__lt=pk))
+        page = list(qs.order_by('-date_action', '-pk')[:HISTORIQUE_PAR_PAGE + 1])
+        a_plus_anciens = len(page) > HISTORIQUE_PAR_PAGE
+        historiques = page[:HISTORIQUE_PAR_PAGE]
+        a_plus_recents = avant is not None
+
+    curseur = lambda h: f"{h.date_action.isoformat()}|{h.pk}"
+    filtres = request.GET.copy()
+    filtres.pop('avant', None)
+    filtres.pop('apres', None)
+    lien_anciens = lien_recents = None
+    if historiques and a_plus_anciens:
+        filtres['avant'] = curseur(historiques[-1])
+        lien_anciens = filtres.urlencode()
+        filtres.pop('avant')
+    if historiques and a_plus_recents:
+        filtres['apres'] = curseur(historiques[0])
+        lien_recents = filtres.urlencode()
 
-    historiques = qs[:500]
     utilisateurs = UserModel.objects.filter(is_active=True).order_by('first_name', 'last_name', 'username')
-    modules = Historique.objects.values_list('modele', flat=True).distinct().exclude(modele='').order_by('modele')
 
     return render(request, 'pharmacy/historique_list.html', {
         'historiques': historiques,
         'utilisateurs': utilisateurs,
-        'modules': modules,
+        'modules': audit.modules_historique(),
         'filtre_user': filtre_user,
         'filtre_module': filtre_module,
+        'filtre_date_debut': date_debut,
+        'filtre_date_fin': date_fin,
+        'recherche': recherche,
+        'filtre_cible_type': filtre_cible_type,
+        'filtre_cible_id': filtre_cible_id,
+        'lien_anciens': lien_anciens,
+        'lien_recents': lien_recents,
     })
 
 
@@ -1101,7 +1703,7 @@ def historique_list(request):
 @admin_gerant_required
 def inventaire_list(request):
     """Liste de tous les inventaires."""
-    inventaires = Inventaire.objects.select_related('utilisateur').all()
+    inventaires = Inventaire.objects.select_related('utilisateur').avec_stats()
     return render(request, 'pharmacy/inventaire_list.html', {
         'inventaires': inventaires,
     })
@@ -1133,14 +1735,19 @@ def inventaire_create(request):
 
     if request.method == 'POST':
         observation = request.POST.get('observation', '').strip()
+        try:
+            seuil_recomptage = max(int(request.POST.get('seuil_recomptage') or 0), 0)
+        except ValueError:
+            seuil_recomptage = 0
         inv = Inventaire.objects.create(
             utilisateur=request.user,
             statut='brouillon',
             observation=observation,
+            seuil_recomptage=seuil_recomptage,
         )
         user_ids = request.POST.getlist('compteurs')
+        eligibles = compteurs_disponibles.filter(pk__in=user_ids) if user_ids else compteurs_disponibles.none()
         if user_ids:
-            eligibles = compteurs_disponibles.filter(pk__in=user_ids)
             inv.compteurs_autorises.set(eligibles)
         # Snapshot: une ligne par produit avec stock théorique = stock actuel
         produits = Produit.objects.all().order_by('designation')
@@ -1158,8 +1765,12 @@ def inventaire_create(request):
         # bulk_create ne déclenche pas save() → on recalcule l'écart manuellement (déjà 0)
         inv.recalculer_totaux()
         inv.save()
+        repartition = request.POST.get('repartition', '')
+        if repartition in ('alphabetique', 'fournisseur') and eligibles:
+            inv.repartir_zones(eligibles, mode=repartition)
         enregistrer_historique(request.user, 'creation', 'Inventaire',
-                               f"Inventaire #{inv.code_inventaire} démarré ({inv.nb_produits_comptes} produits)")
+                               f"Inventaire #{inv.code_inventaire} démarré ({inv.nb_produits_comptes} produits)",
+                               cible=inv, donnees={'nb_produits': inv.nb_produits_comptes})
         messages.success(request, f"Inventaire #{inv.code_inventaire} créé. Procédez à la saisie du comptage.")
         return redirect('inventaire_saisie', pk=inv.pk)
     return render(request, 'pharmacy/inventaire_form.html', {
@@ -1181,10 +1792,19 @@ def inventaire_saisie(request, pk):
         messages.warning(request, "Cet inventaire est déjà validé et ne peut plus être modifié.")
         return redirect('inventaire_detail', pk=inv.pk)
 
-    lignes = inv.lignes.select_related('produit').order_by('produit__designation')
+    lignes = list(
+        lignes_assignees(request.user, inv)
+        .select_related('produit', 'zone', 'recompteur')
+        .order_by('zone__ordre', 'produit__designation')
+    )
+    for ligne in lignes:
+        ligne.a_recompter = (
+            not can_see_sensitive_data and ligne.recomptage_requis and ligne.recompteur_id == request.user.pk
+        )
     return render(request, 'pharmacy/inventaire_saisie.html', {
         'inventaire': inv,
         'lignes': lignes,
+        'a_des_zones': inv.zones.exists(),
         'can_see_sensitive_data': can_see_sensitive_data,
         'can_validate_inventory': can_see_sensitive_data,
         'can_recount': can_see_sensitive_data,
@@ -1204,10 +1824,15 @@ def inventaire_ligne_compter(request, pk, ligne_pk):
 
     if inv.statut != 'brouillon':
         return JsonResponse({'success': False, 'error': 'Inventaire non modifiable'}, status=400)
-    ligne = get_object_or_404(LigneInventaire, pk=ligne_pk, inventaire=inv)
+    ligne = get_object_or_404(lignes_assignees(request.user, inv), pk=ligne_pk)
+
+    # Recomptage aveugle confié à ce compteur : la ligne reste saisissable une seconde fois.
+    est_recomptage = (
+        not can_see_sensitive_data and ligne.recomptage_requis and ligne.recompteur_id == request.user.pk
+    )
 
     # En mode opérateur (non admin/gérant), une ligne déjà comptée est verrouillée.
-    if ligne.comptee and not can_see_sensitive_data:
+    if ligne.comptee and not can_see_sensitive_data and not est_recomptage:
         return JsonResponse({'success': False, 'error': 'Cette ligne est déjà comptée et verrouillée.'}, status=400)
 
     val = request.POST.get('stock_physique', '').strip()
@@ -1220,9 +1845,15 @@ def inventaire_ligne_compter(request, pk, ligne_pk):
     except ValueError:
         return JsonResponse({'success': False, 'error': 'Valeur invalide'}, status=400)
 
-    ligne.stock_physique = qte
-    ligne.comptee = True
-    ligne.save()
+    if est_recomptage:
+        ligne.enregistrer_recomptage(qte)
+        ligne.save()
+    else:
+        ligne.enregistrer_comptage(qte, request.user)
+        ligne.save()
+        # Un arbitrage admin/gérant fait foi ; seuls les comptages opérateur sont recomptés.
+        if not can_see_sensitive_data:
+            inv.planifier_recomptage(ligne, request.user)
     inv.recalculer_totaux()
     inv.save()
 
@@ -1240,6 +1871,8 @@ def inventaire_ligne_compter(request, pk, ligne_pk):
             'valeur_ecart': float(ligne.valeur_ecart),
             'nb_ecarts': inv.nb_ecarts,
             'total_ecart_valeur': float(inv.total_ecart_valeur),
+            'nb_recomptages': inv.nb_recomptages,
+            'nb_divergences': inv.nb_divergences,
         })
     return JsonResponse(payload)
 
@@ -1247,7 +1880,7 @@ def inventaire_ligne_compter(request, pk, ligne_pk):
 @admin_gerant_required
 def inventaire_valider(request, pk):
     """Récap + validation finale. Applique les stocks physiques sur les produits."""
-    inv = get_object_or_404(Inventaire, pk=pk)
+    inv = get_object_or_404(Inventaire.objects.avec_stats(), pk=pk)
     if inv.statut != 'brouillon':
         messages.warning(request, "Cet inventaire est déjà validé.")
         return redirect('inventaire_detail', pk=inv.pk)
@@ -1264,21 +1897,30 @@ def inventaire_valider(request, pk):
         )
         return redirect('inventaire_saisie', pk=inv.pk)
 
+    if inv.nb_recomptages or inv.nb_divergences:
+        messages.error(
+            request,
+            f"Impossible de valider : {inv.nb_recomptages} recomptage(s) en attente et "
+            f"{inv.nb_divergences} divergence(s) à arbitrer. Recomptez ces lignes pour trancher."
+        )
+        return redirect('inventaire_zones', pk=inv.pk)
+
     if request.method == 'POST':
         from django.db import transaction
         with transaction.atomic():
             for ligne in lignes:
                 if ligne.ecart != 0:
-                    produit = ligne.produit
-                    produit.quantite_stock = ligne.stock_physique
-                    produit.save()
+                    Lot.ajuster(ligne.produit, ligne.stock_physique)
             inv.statut = 'valide'
             inv.date_validation = timezone.now()
             inv.recalculer_totaux()
             inv.save()
+            SuiviEcartProduit.rafraichir(produit_ids=inv.lignes.values('produit_id'))
+            AlerteExpiration.rafraichir(produit_ids=inv.lignes.values('produit_id'))
         enregistrer_historique(
             request.user, 'modification', 'Inventaire',
-            f"Inventaire #{inv.code_inventaire} validé — {inv.nb_ecarts} écart(s), valeur: {inv.total_ecart_valeur} FC"
+            f"Inventaire #{inv.code_inventaire} validé — {inv.nb_ecarts} écart(s), valeur: {inv.total_ecart_valeur} FC",
+            cible=inv, donnees={'nb_ecarts': inv.nb_ecarts, 'total_ecart_valeur': inv.total_ecart_valeur},
         )
         messages.success(request, f"Inventaire #{inv.code_inventaire} validé. Stocks mis à jour.")
         return redirect('inventaire_detail', pk=inv.pk)
@@ -1293,7 +1935,7 @@ def inventaire_valider(request, pk):
 @admin_gerant_required
 def inventaire_detail(request, pk):
     """Consultation d'un inventaire (validé ou non)."""
-    inv = get_object_or_404(Inventaire.objects.prefetch_related('compteurs_autorises'), pk=pk)
+    inv = get_object_or_404(Inventaire.objects.avec_stats().prefetch_related('compteurs_autorises'), pk=pk)
 
     if request.method == 'POST' and inv.statut == 'brouillon':
         user_ids = request.POST.getlist('compteurs')
@@ -1308,7 +1950,8 @@ def inventaire_detail(request, pk):
             request.user,
             'modification',
             'Inventaire',
-            f"Inventaire #{inv.code_inventaire} - mise à jour des compteurs autorisés ({eligibles.count()} utilisateur(s))"
+            f"Inventaire #{inv.code_inventaire} - mise à jour des compteurs autorisés ({eligibles.count()} utilisateur(s))",
+            cible=inv,
         )
         messages.success(request, "Liste des compteurs autorisés mise à jour.")
         return redirect('inventaire_detail', pk=inv.pk)
@@ -1328,6 +1971,70 @@ def inventaire_detail(request, pk):
     })
 
 
+@admin_gerant_required
+def inventaire_zones(request, pk):
+    """Répartition des lignes par zone de comptage et avancement par zone."""
+    inv = get_object_or_404(Inventaire.objects.avec_stats(), pk=pk)
+    from accounts.models import User
+    compteurs_disponibles = User.objects.filter(
+        is_active=True,
+        role__in=['vendeur', 'gestionnaire', 'controleur']
+    ).order_by('first_name', 'last_name', 'username')
+
+    if request.method == 'POST':
+        if inv.statut != 'brouillon':
+            messages.error(request, "Seul un inventaire en brouillon peut être réparti.")
+            return redirect('inventaire_zones', pk=inv.pk)
+        eligibles = list(compteurs_disponibles.filter(pk__in=request.POST.getlist('compteurs')))
+        mode = request.POST.get('repartition', 'alphabetique')
+        if mode not in ('alphabetique', 'fournisseur'):
+            mode = 'alphabetique'
+        try:
+            inv.seuil_recomptage = max(int(request.POST.get('seuil_recomptage') or 0), 0)
+        except ValueError:
+            pass
+        inv.save(update_fields=['seuil_recomptage'])
+        zones = inv.repartir_zones(eligibles, mode=mode)
+        enregistrer_historique(
+            request.user, 'modification', 'Inventaire',
+            f"Inventaire #{inv.code_inventaire} - répartition en {len(zones)} zone(s) ({mode})",
+            cible=inv, donnees={'nb_zones': len(zones), 'mode': mode},
+        )
+        messages.success(request, f"{len(zones)} zone(s) de comptage créée(s).")
+        return redirect('inventaire_zones', pk=inv.pk)
+
+    comptee = models.Q(lignes__comptee=True)
+    zones = (
+        inv.zones.select_related('compteur')
+        .annotate(
+            nb_lignes=models.Count('lignes'),
+            nb_comptees=models.Count('lignes', filter=comptee),
+            nb_recomptages=models.Count('lignes', filter=models.Q(lignes__recomptage_requis=True)),
+            nb_divergences=models.Count('lignes', filter=(
+                models.Q(lignes__stock_recompte__lt=models.F('lignes__stock_physique'))
+                | models.Q(lignes__stock_recompte__gt=models.F('lignes__stock_physique'))
+            )),
+        )
+    )
+    recomptages = (
+        inv.lignes.filter(
+            models.Q(recomptage_requis=True)
+            | models.Q(stock_recompte__lt=models.F('stock_physique'))
+            | models.Q(stock_recompte__gt=models.F('stock_physique'))
+        )
+        .select_related('produit', 'zone', 'compte_par', 'recompteur')
+        .order_by('produit__designation')
+    )
+    return render(request, 'pharmacy/inventaire_zones.html', {
+        'inventaire': inv,
+        'zones': zones,
+        'recomptages': recomptages,
+        'nb_hors_zone': inv.lignes.filter(zone__isnull=True).count(),
+        'compteurs_disponibles': compteurs_disponibles,
+        'compteurs_zones_ids': {z.compteur_id for z in zones},
+    })
+
+
 @admin_gerant_required
 def inventaire_annuler(request, pk):
     """Annule un inventaire en brouillon (ne touche pas aux stocks)."""
@@ -1339,7 +2046,7 @@ def inventaire_annuler(request, pk):
         inv.statut = 'annule'
         inv.save()
         enregistrer_historique(request.user, 'suppression', 'Inventaire',
-                               f"Inventaire #{inv.code_inventaire} annulé")
+                               f"Inventaire #{inv.code_inventaire} annulé", cible=inv)
         messages.success(request, f"Inventaire #{inv.code_inventaire} annulé.")
         return redirect('inventaire_list')
     return render(request, 'pharmacy/confirm_delete.html', {'object': inv, 'type': 'Inventaire (annulation)'})
@@ -1352,7 +2059,11 @@ def inventaire_delete(request, pk):
     if request.method == 'POST':
         code = inv.code_inventaire
         statut = inv.get_statut_display()
+        etait_valide = inv.statut == 'valide'
+        produit_ids = list(inv.lignes.values_list('produit_id', flat=True))
         inv.delete()
+        if etait_valide:
+            SuiviEcartProduit.rafraichir(produit_ids=produit_ids)
         enregistrer_historique(
             request.user,
             'suppression',
@@ -1367,80 +2078,606 @@ def inventaire_delete(request, pk):
     })
 
 
-@admin_gerant_required
-def inventaire_pdf(request, pk):
-    """PDF d'un inventaire avec tous les écarts."""
-    import os, base64
-    inv = get_object_or_404(Inventaire, pk=pk)
+def document_inventaire(parametres, utilisateur, progression):
+    """Générateur de tâche : PDF d'un inventaire avec tous les écarts."""
+    from .taches import ErreurDocument
+    inv = Inventaire.objects.avec_stats().select_related('utilisateur').filter(pk=parametres['inventaire']).first()
+    if inv is None:
+        raise ErreurDocument("Cet inventaire n'existe plus.")
     lignes = inv.lignes.select_related('produit').order_by('produit__designation')
+    progression(10)
 
-    logo_path = os.path.join(settings.BASE_DIR, 'static', 'img', 'logo.png')
-    logo_data = ''
-    if os.path.exists(logo_path):
-        with open(logo_path, 'rb') as f:
-            logo_data = 'data:image/png;base64,' + base64.b64encode(f.read()).decode('utf-8')
-
-    template = get_template('pharmacy/inventaire_pdf.html')
     context = {
         'inventaire': inv,
-        'lignes': lignes,
         'date_impression': timezone.now(),
-        'logo_data': logo_data,
     }
-    html = template.render(context)
-    response = HttpResponse(content_type='application/pdf')
-    response['Content-Disposition'] = f'filename="inventaire_{inv.code_inventaire}.pdf"'
-    pisa_status = pisa.CreatePDF(html, dest=response)
-    if pisa_status.err:
-        return HttpResponse("Erreur lors de la génération du PDF", status=500)
-    return response
+    contenu = rendre_pdf_par_morceaux(
+        'pharmacy/inventaire_pdf.html', context, 'lignes',
+        lignes.iterator(chunk_size=settings.PDF_MORCEAU_LIGNES), nb_lignes=inv.stat_comptees + inv.stat_non_comptees, progression=progression,
+    )
+    if inv.statut == 'valide':
+        from . import cache_pdf
+        cache_pdf.ecrire(_nom_cache_inventaire(inv), contenu)
+    return f"inventaire_{inv.code_inventaire}.pdf", contenu
+
+
+def _nom_cache_inventaire(inv):
+    from . import cache_pdf
+    return cache_pdf.nom_document('inventaire', inv.pk, int(inv.date_validation.timestamp()))
+
+
+@admin_gerant_required
+def inventaire_pdf(request, pk):
+    """PDF d'un inventaire avec tous les écarts.
+
+    Un inventaire validé ne change plus : son PDF est servi depuis le cache disque
+    une fois produit, sans repasser par la file de tâches.
+    """
+    from . import cache_pdf
+    from .taches import lancer
+    inv = get_object_or_404(Inventaire, pk=pk)
+    if inv.statut == 'valide' and inv.date_validation:
+        etag = f'"inventaire-{inv.pk}-{int(inv.date_validation.timestamp())}"'
+        non_modifie = cache_pdf.non_modifie(request, etag, inv.date_validation)
+        if non_modifie is not None:
+            return non_modifie
+        contenu = cache_pdf.lire(_nom_cache_inventaire(inv))
+        if contenu is not None:
+            return cache_pdf.reponse_pdf(contenu, f"inventaire_{inv.code_inventaire}.pdf", etag, inv.date_validation)
+    return lancer(request, 'inventaire_pdf', {'inventaire': inv.pk})
+
+
+@admin_gerant_required
+def ecarts_inventaire(request):
+    """Classement des pertes chroniques par produit et fournisseur sur les inventaires validés."""
+    from django.db.models import Count, Sum
+    try:
+        limite = min(max(int(request.GET.get('limite', 20)), 1), 200)
+    except ValueError:
+        limite = 20
+
+    suivis = SuiviEcartProduit.objects.filter(nb_ecarts__gt=0)
+    produits = suivis.select_related('produit__fournisseur').order_by('cumul_valeur_ecart')[:limite]
+    fournisseurs = (
+        suivis.values('produit__fournisseur_id', 'produit__fournisseur__designation')
+        .annotate(
+            nb_produits=Count('pk'),
+            nb_manquants=Sum('nb_manquants'),
+            cumul_pertes=Sum('cumul_pertes'),
+            cumul_valeur_ecart=Sum('cumul_valeur_ecart'),
+        )
+        .order_by('cumul_valeur_ecart')[:limite]
+    )
+    totaux = suivis.aggregate(pertes=Sum('cumul_pertes'), net=Sum('cumul_valeur_ecart'))
+    evolution = (
+        Inventaire.objects.filter(statut='valide')
+        .order_by('-date_validation')
+        .values('code_inventaire', 'date_validation', 'total_ecart_valeur')[:12]
+    )
+    return render(request, 'pharmacy/ecarts_inventaire.html', {
+        'produits': produits,
+        'fournisseurs': fournisseurs,
+        'evolution': evolution,
+        'total_pertes': totaux['pertes'] or 0,
+        'total_net': totaux['net'] or 0,
+        'limite': limite,
+    })
+
+
+# ============ RÉCEPTIONS ============
+
+def _lignes_reception(lignes_data):
+    """Valide les lignes saisies (JSON) ; retourne (lignes non enregistrées, erreurs)."""
+    from decimal import InvalidOperation
+    ids = {str(ld.get('produit_id')) for ld in lignes_data}
+    produits = Produit.objects.in_bulk([int(i) for i in ids if i.isdigit()])
+    lignes, erreurs = [], []
+    for n, ld in enumerate(lignes_data, start=1):
+        try:
+            produit = produits[int(ld['produit_id'])]
+            quantite = int(ld['quantite'])
+            prix = Decimal(str(ld.get('prix_achat') or produit.prix_achat))
+            expiration = date.fromisoformat(ld['date_expiration']) if ld.get('date_expiration') else None
+        except (KeyError, ValueError, TypeError, InvalidOperation):
+            erreurs.append(f"Ligne {n} : produit, quantité, prix ou date invalide.")
+            continue
+        if quantite <= 0 or prix < 0:
+            erreurs.append(f"Ligne {n} ({produit.designation}) : quantité et prix doivent être positifs.")
+            continue
+        lignes.append(LigneReception(
+            produit=produit, quantite=quantite, prix_achat=prix,
+            numero_lot=str(ld.get('numero_lot') or '').strip()[:50], date_expiration=expiration,
+        ))
+    return lignes, erreurs
+
+
+def _valider_reception(request, reception):
+    try:
+        nb = reception.valider()
+    except ReceptionDejaValidee as e:
+        messages.warning(request, str(e))
+        return
+    enregistrer_historique(
+        request.user, 'creation', 'Reception',
+        f"Réception #{reception.code_reception} ({reception.fournisseur.designation}) validée — "
+        f"{nb} ligne(s), {reception.montant_total} FC",
+        cible=reception, donnees={'nb_lignes': nb, 'montant_total': reception.montant_total,
+                                  'maj_prix_achat': reception.maj_prix_achat},
+    )
+    messages.success(request, f"Réception #{reception.code_reception} validée : {nb} ligne(s) portée(s) en stock.")
+
+
+@non_vendeur_required
+def reception_list(request):
+    from django.db.models import Count
+    receptions = Reception.objects.select_related('fournisseur', 'utilisateur').annotate(nb_lignes=Count('lignes'))
+    return render(request, 'pharmacy/reception_list.html', {'receptions': receptions})
+
+
+@non_vendeur_required
+def reception_create(request):
+    """Saisie d'une livraison complète ; « Valider » la porte en stock immédiatement."""
+    lignes_data = []
+    if request.method == 'POST':
+        form = ReceptionForm(request.POST)
+        try:
+            lignes_data = json.loads(request.POST.get('lignes_json', '[]'))
+        except ValueError:
+            lignes_data = []
+        lignes, erreurs = _lignes_reception(lignes_data)
+        if not lignes_data:
+            erreurs.append("Ajoutez au moins une ligne à la réception.")
+        if form.is_valid() and not erreurs:
+            from django.db import transaction
+            with transaction.atomic():
+                reception = form.save(commit=False)
+                reception.utilisateur = request.user
+                reception.montant_total = sum((l.montant for l in lignes), Decimal('0'))
+                reception.save()
+                for ligne in lignes:
+                    ligne.reception = reception
+                LigneReception.objects.bulk_create(lignes, batch_size=500)
+            if 'valider' in request.POST:
+                _valider_reception(request, reception)
+            else:
+                messages.success(request, f"Réception #{reception.code_reception} enregistrée en brouillon.")
+            return redirect('reception_detail', pk=reception.pk)
+        for err in erreurs:
+            messages.error(request, err)
+    else:
+        form = ReceptionForm()
+
+    produits = Produit.objects.order_by('designation').values_list('pk', 'designation', 'prix_achat', 'fournisseur_id')
+    return render(request, 'pharmacy/reception_form.html', {
+        'form': form,
+        'produits_json': json.dumps([
+            {'id': pk, 'nom': nom, 'prix': float(prix), 'fournisseur': fournisseur_id}
+            for pk, nom, prix, fournisseur_id in produits
+        ]),
+        'lignes_json': json.dumps(lignes_data),
+    })
+
+
+@non_vendeur_required
+def reception_detail(request, pk):
+    reception = get_object_or_404(Reception.objects.select_related('fournisseur', 'utilisateur'), pk=pk)
+    lignes = reception.lignes.select_related('produit').order_by('produit__designation')
+    return render(request, 'pharmacy/reception_detail.html', {
+        'reception': reception,
+        'lignes': lignes,
+        'total': sum((l.montant for l in lignes), Decimal('0')),
+    })
+
+
+@non_vendeur_required
+def reception_valider(request, pk):
+    reception = get_object_or_404(Reception.objects.select_related('fournisseur'), pk=pk)
+    if request.method == 'POST':
+        _valider_reception(request, reception)
+    return redirect('reception_detail', pk=pk)
+
+
+@non_vendeur_required
+def reception_delete(request, pk):
+    reception = get_object_or_404(Reception, pk=pk)
+    if request.method == 'POST':
+        if reception.statut != 'brouillon':
+            messages.error(request, "Une réception validée ne peut pas être supprimée.")
+            return redirect('reception_detail', pk=pk)
+        reception.delete()
+        messages.success(request, "Réception supprimée.")
+    return redirect('reception_list')
 
 
 # ============ RÉQUISITION ============
 
-@login_required
-def requisition_list(request):
-    """Liste des produits ayant atteint ou dépassé le seuil d'alerte de stock."""
-    from django.db.models import ExpressionWrapper, IntegerField, F
+def _bons_de_commande(fournisseur_id=None):
+    """Produits à commander regroupés par fournisseur (un bon de commande par fournisseur).
+
+    Un produit est à commander quand son stock atteint le point de commande calculé
+    par `calculer_velocites` ; la quantité proposée le remonte au stock cible. Un
+    produit sans vitesse calculée retombe sur son seuil d'alerte fixe.
+    """
+    from itertools import groupby
+    from django.db.models import ExpressionWrapper, IntegerField, DecimalField, F
+    from django.db.models.functions import Coalesce
     produits = (
-        Produit.objects.select_related('fournisseur')
-        .filter(quantite_stock__lte=F('quantite_alerte'))
-        .annotate(manquant=ExpressionWrapper(F('quantite_alerte') - F('quantite_stock'), output_field=IntegerField()))
-        .order_by('fournisseur__designation', 'designation')
+        Produit.objects.select_related('fournisseur', 'velocite', 'prevision')
+        .annotate(
+            point_commande=Coalesce(F('velocite__point_commande'), F('quantite_alerte')),
+            stock_cible=Coalesce(F('velocite__stock_cible'), F('quantite_alerte')),
+        )
+        .filter(quantite_stock__lte=F('point_commande'))
+        .annotate(manquant=ExpressionWrapper(F('stock_cible') - F('quantite_stock'), output_field=IntegerField()))
+        .annotate(montant_estime=ExpressionWrapper(F('manquant') * F('prix_achat'),
+                                                   output_field=DecimalField(max_digits=15, decimal_places=2)))
+        .order_by('fournisseur__designation', 'fournisseur_id', 'designation')
     )
+    if fournisseur_id:
+        produits = produits.filter(fournisseur_id=fournisseur_id)
+    aujourd_hui = timezone.localdate()
+    bons = []
+    for fournisseur, lignes in groupby(produits, key=lambda p: p.fournisseur):
+        lignes = list(lignes)
+        livraison = aujourd_hui + timedelta(days=fournisseur.delai_livraison)
+        for p in lignes:
+            p.date_rupture = p.prevision.date_rupture(p.quantite_stock) if hasattr(p, 'prevision') else None
+            p.rupture_avant_livraison = p.date_rupture is not None and p.date_rupture < livraison
+        bons.append({
+            'fournisseur': fournisseur,
+            'produits': lignes,
+            'quantite_totale': sum(p.manquant for p in lignes),
+            'montant_estime': sum((p.montant_estime for p in lignes), Decimal('0')),
+        })
+    return bons
+
+
+@login_required
+def requisition_list(request):
+    """Bons de commande proposés par fournisseur, d'après la vitesse de vente des produits."""
+    from django.db.models import Max
+    bons = _bons_de_commande()
     return render(request, 'pharmacy/requisition_list.html', {
-        'produits': produits,
-        'nb_produits': produits.count(),
+        'bons': bons,
+        'nb_produits': sum(len(b['produits']) for b in bons),
+        'montant_total': sum((b['montant_estime'] for b in bons), Decimal('0')),
+        'date_calcul': VelociteProduit.objects.aggregate(d=Max('date_calcul'))['d'],
+        'jours_securite': getattr(settings, 'REAPPRO_JOURS_SECURITE', 7),
+        'jours_couverture': getattr(settings, 'REAPPRO_JOURS_COUVERTURE', 30),
     })
 
 
 @login_required
 def requisition_pdf(request):
-    """PDF de la liste des produits en alerte de stock."""
-    import os, base64
-    from django.db.models import ExpressionWrapper, IntegerField, F
-    produits = (
-        Produit.objects.select_related('fournisseur')
-        .filter(quantite_stock__lte=F('quantite_alerte'))
-        .annotate(manquant=ExpressionWrapper(F('quantite_alerte') - F('quantite_stock'), output_field=IntegerField()))
-        .order_by('fournisseur__designation', 'designation')
-    )
-    logo_data = None
-    logo_path = os.path.join(settings.BASE_DIR, 'static', 'img', 'logo.png')
-    if os.path.exists(logo_path):
-        with open(logo_path, 'rb') as f:
-            logo_data = 'data:image/png;base64,' + base64.b64encode(f.read()).decode('utf-8')
-
-    template = get_template('pharmacy/requisition_pdf.html')
-    html = template.render({
-        'produits': produits,
+    """PDF des bons de commande (tous fournisseurs, ou un seul via ?fournisseur=<code>)."""
+    from .taches import lancer
+    fournisseur_id = request.GET.get('fournisseur', '')
+    return lancer(request, 'requisition_pdf', {'fournisseur': int(fournisseur_id) if fournisseur_id.isdigit() else None})
+
+
+def document_requisition(parametres, utilisateur, progression):
+    """Générateur de tâche : bons de commande, tous fournisseurs ou un seul."""
+    fournisseur_id = parametres.get('fournisseur')
+    bons = _bons_de_commande(fournisseur_id=fournisseur_id)
+    progression(20)
+    contenu = rendre_pdf('pharmacy/requisition_pdf.html', {
+        'bons': bons,
+        'un_fournisseur': fournisseur_id is not None,
         'date_impression': timezone.now(),
-        'logo_data': logo_data,
-        'utilisateur': request.user,
+        'utilisateur': utilisateur,
+    })
+    return f'requisition_{timezone.now().strftime("%Y%m%d_%H%M")}.pdf', contenu
+
+
+# ============ RAPPORTS ============
+
+# Dimension → (champ de regroupement, champ libellé) dans CubeVentes.
+DIMENSIONS_CUBE = {
+    'mois': ('mois', 'mois', "Mois"),
+    'produit': ('produit_id', 'produit__designation', "Produit"),
+    'fournisseur': ('fournisseur_id', 'fournisseur__designation', "Fournisseur"),
+    'vendeur': ('vendeur_id', 'vendeur__username', "Vendeur"),
+    'client': ('client_id', 'client__nom', "Client"),
+}
+CUBE_MAX_LIGNES = 100
+CUBE_DESCENTE = {'fournisseur': 'produit', 'vendeur': 'produit', 'client': 'produit', 'produit': 'client'}
+
+
+def _mois_param(valeur):
+    """'AAAA-MM' (input type=month) → date du 1er du mois, ou None."""
+    try:
+        annee, mois = valeur.split('-')
+        return date(int(annee), int(mois), 1)
+    except (ValueError, AttributeError):
+        return None
+
+
+@admin_gerant_required
+def rapport_cube_ventes(request):
+    """Tableau croisé des ventes (mois × produit × fournisseur × vendeur × client) lu dans le cube pré-agrégé."""
+    from django.db.models import Max, Sum
+    if request.method == 'POST':
+        nb = CubeVentes.rafraichir()
+        messages.success(request, f"Cube des ventes actualisé ({nb} mois recalculé(s)).")
+        return redirect(f"{request.path}?{request.GET.urlencode()}")
+
+    dim_lignes = request.GET.get('lignes', 'fournisseur')
+    if dim_lignes not in DIMENSIONS_CUBE:
+        dim_lignes = 'fournisseur'
+    dim_colonnes = request.GET.get('colonnes', 'mois')
+    if dim_colonnes not in DIMENSIONS_CUBE or dim_colonnes == dim_lignes:
+        dim_colonnes = ''
+    mesure = 'quantite' if request.GET.get('mesure') == 'quantite' else 'montant'
+
+    aujourd_hui = timezone.localdate()
+    mois_fin = _mois_param(request.GET.get('mois_fin', '')) or aujourd_hui.replace(day=1)
+    mois_debut = _mois_param(request.GET.get('mois_debut', '')) or date(mois_fin.year - 1, mois_fin.month, 1)
+    cellules = CubeVentes.objects.filter(mois__gte=mois_debut, mois__lte=mois_fin)
+    filtres = {}
+    for dim in ('produit', 'fournisseur', 'vendeur', 'client'):
+        valeur = request.GET.get(dim, '')
+        if valeur.isdigit():
+            cellules = cellules.filter(**{f'{dim}_id': int(valeur)})
+            filtres[dim] = int(valeur)
+
+    cle_l, libelle_l, _ = DIMENSIONS_CUBE[dim_lignes]
+    champs = [cle_l, libelle_l]
+    if dim_colonnes:
+        cle_c, libelle_c, _ = DIMENSIONS_CUBE[dim_colonnes]
+        champs += [cle_c, libelle_c]
+    agregats = cellules.values(*dict.fromkeys(champs)).annotate(valeur=Sum(mesure)).order_by()
+
+    lignes, colonnes = {}, {}
+    for a in agregats:
+        ligne = lignes.setdefault(a[cle_l], {'libelle': a[libelle_l], 'cellules': {}, 'total': 0})
+        cle = a[cle_c] if dim_colonnes else None
+        if dim_colonnes:
+            colonnes.setdefault(cle, {'libelle': a[libelle_c], 'total': 0})
+            colonnes[cle]['total'] += a['valeur']
+        ligne['cellules'][cle] = a['valeur']
+        ligne['total'] += a['valeur']
+
+    def ordre(dim, elements):
+        if dim == 'mois':
+            return sorted(elements, key=lambda e: e[0])
+        return sorted(elements, key=lambda e: e[1]['total'], reverse=True)
+
+    colonnes = ordre(dim_colonnes, colonnes.items())
+    lignes_triees = ordre(dim_lignes, lignes.items())
+    total_general = sum(l['total'] for _, l in lignes_triees)
+    tronque = len(lignes_triees) > CUBE_MAX_LIGNES
+    # Descente : filtrer sur la ligne choisie et détailler selon la dimension suivante.
+    detail = CUBE_DESCENTE.get(dim_lignes)
+    tableau = []
+    for cle, l in lignes_triees[:CUBE_MAX_LIGNES]:
+        lien = None
+        if detail and cle is not None:
+            params = request.GET.copy()
+            params[dim_lignes] = cle
+            params['lignes'] = detail
+            if params.get('colonnes') == detail:
+                params['colonnes'] = 'mois'
+            lien = params.urlencode()
+        tableau.append({
+            'libelle': l['libelle'],
+            'valeurs': [l['cellules'].get(c, 0) for c, _ in colonnes] if dim_colonnes else [],
+            'total': l['total'],
+            'lien': lien,
+        })
+
+    from accounts.models import User as UserModel
+    etat = MoisCubeVentes.objects.aggregate(date_calcul=Max('date_calcul'))
+    return render(request, 'pharmacy/rapport_cube_ventes.html', {
+        'dimensions': [(k, v[2]) for k, v in DIMENSIONS_CUBE.items()],
+        'dim_lignes': dim_lignes,
+        'dim_colonnes': dim_colonnes,
+        'libelle_lignes': DIMENSIONS_CUBE[dim_lignes][2],
+        'mesure': mesure,
+        'mois_debut': mois_debut,
+        'mois_fin': mois_fin,
+        'filtres': filtres,
+        'colonnes': [c for _, c in colonnes],
+        'tableau': tableau,
+        'tronque': tronque,
+        'nb_lignes': len(lignes_triees),
+        'total_general': total_general,
+        'fournisseurs': Fournisseur.objects.only('pk', 'designation'),
+        'vendeurs': UserModel.objects.filter(is_active=True).order_by('username'),
+        'date_calcul': etat['date_calcul'],
+        'mois_a_recalculer': MoisCubeVentes.objects.filter(a_recalculer=True).count(),
+    })
+
+
+DIMENSIONS_MARGE = {
+    'produit': ('produit_id', 'produit__designation', "Produit"),
+    'fournisseur': ('fournisseur_id', 'fournisseur__designation', "Fournisseur"),
+    'vendeur': ('vente__vendeur_id', 'vente__vendeur__username', "Vendeur"),
+    'mois': ('mois', 'mois', "Mois"),
+}
+
+
+@admin_gerant_required
+def rapport_marges(request):
+    """Marge brute par produit, fournisseur, vendeur ou mois, à partir du coût figé sur chaque ligne de vente."""
+    from datetime import datetime, time
+    from django.db.models import Count, DecimalField, ExpressionWrapper, F, Q, Sum
+    from django.db.models.functions import TruncMonth
+    from accounts.models import User as UserModel
+
+    dimension = request.GET.get('par', 'produit')
+    if dimension not in DIMENSIONS_MARGE:
+        dimension = 'produit'
+    aujourd_hui = timezone.localdate()
+    try:
+        date_debut = date.fromisoformat(request.GET.get('date_debut', ''))
+    except ValueError:
+        date_debut = aujourd_hui.replace(day=1)
+    try:
+        date_fin = date.fromisoformat(request.GET.get('date_fin', ''))
+    except ValueError:
+        date_fin = aujourd_hui
+
+    lignes = LigneVente.objects.filter(
+        vente__date_vente__gte=timezone.make_aware(datetime.combine(date_debut, time.min)),
+        vente__date_vente__lt=timezone.make_aware(datetime.combine(date_fin + timedelta(days=1), time.min)),
+    )
+    filtre_fournisseur = request.GET.get('fournisseur', '')
+    filtre_vendeur = request.GET.get('vendeur', '')
+    if filtre_fournisseur.isdigit():
+        lignes = lignes.filter(fournisseur_id=int(filtre_fournisseur))
+    if filtre_vendeur.isdigit():
+        lignes = lignes.filter(vente__vendeur_id=int(filtre_vendeur))
+
+    cle, libelle, titre = DIMENSIONS_MARGE[dimension]
+    if dimension == 'mois':
+        lignes = lignes.annotate(mois=TruncMonth('vente__date_vente', output_field=models.DateField()))
+    montant = DecimalField(max_digits=15, decimal_places=2)
+    cout_ligne = ExpressionWrapper(F('quantite') * F('prix_achat_unitaire'), output_field=montant)
+    groupes = list(
+        lignes.values(*dict.fromkeys([cle, libelle]))
+        .annotate(
+            quantite_vendue=Sum('quantite'),
+            ca=Sum('montant_ligne'),
+            ca_avec_cout=Sum('montant_ligne', filter=Q(prix_achat_unitaire__isnull=False)),
+            cout=Sum(cout_ligne),
+            marge=Sum(ExpressionWrapper(F('montant_ligne') - cout_ligne, output_field=montant)),
+            nb_sans_cout=Count('pk', filter=Q(prix_achat_unitaire__isnull=True)),
+        )
+        .order_by(cle if dimension == 'mois' else '-marge')
+    )
+    for g in groupes:
+        g['libelle'] = g[libelle]
+        g['taux'] = g['marge'] / g['ca_avec_cout'] * 100 if g['ca_avec_cout'] else None
+
+    totaux = {
+        'quantite': sum(g['quantite_vendue'] or 0 for g in groupes),
+        'ca': sum((g['ca'] or 0 for g in groupes), Decimal('0')),
+        'ca_avec_cout': sum((g['ca_avec_cout'] or 0 for g in groupes), Decimal('0')),
+        'cout': sum((g['cout'] or 0 for g in groupes), Decimal('0')),
+        'marge': sum((g['marge'] or 0 for g in groupes), Decimal('0')),
+        'nb_sans_cout': sum(g['nb_sans_cout'] for g in groupes),
+    }
+    totaux['taux'] = totaux['marge'] / totaux['ca_avec_cout'] * 100 if totaux['ca_avec_cout'] else None
+
+    return render(request, 'pharmacy/rapport_marges.html', {
+        'groupes': groupes[:CUBE_MAX_LIGNES * 2],
+        'nb_groupes': len(groupes),
+        'totaux': totaux,
+        'dimension': dimension,
+        'titre_dimension': titre,
+        'dimensions': [(k, v[2]) for k, v in DIMENSIONS_MARGE.items()],
+        'date_debut': date_debut,
+        'date_fin': date_fin,
+        'filtre_fournisseur': filtre_fournisseur,
+        'filtre_vendeur': filtre_vendeur,
+        'fournisseurs': Fournisseur.objects.only('pk', 'designation'),
+        'vendeurs': UserModel.objects.filter(is_active=True).order_by('username'),
+    })
+
+
+@admin_gerant_required
+def rapport_produits(request):
+    """Meilleures ventes, classes ABC et stock dormant sur une période (résultat mis en cache)."""
+    from . import analyse_produits
+    aujourd_hui = timezone.localdate()
+    try:
+        date_debut = date.fromisoformat(request.GET.get('date_debut', ''))
+    except ValueError:
+        date_debut = aujourd_hui - timedelta(days=89)
+    try:
+        date_fin = date.fromisoformat(request.GET.get('date_fin', ''))
+    except ValueError:
+        date_fin = aujourd_hui
+    try:
+        jours_dormant = max(int(request.GET.get('jours', '')), 1)
+    except ValueError:
+        jours_dormant = getattr(settings, 'ANALYSE_JOURS_STOCK_DORMANT', 90)
+    classe = request.GET.get('classe', '')
+
+    analyse = analyse_produits.analyse_periode(
+        date_debut, date_fin, jours_dormant, actualiser=request.GET.get('actualiser') == '1',
+    )
+    classement = analyse['classement']
+    if classe in ('A', 'B', 'C'):
+        classement = [c for c in classement if c['classe'] == classe]
+    params = request.GET.copy()
+    params.pop('actualiser', None)
+    return render(request, 'pharmacy/rapport_produits.html', {
+        'analyse': analyse,
+        'classement': classement[:CUBE_MAX_LIGNES * 2],
+        'nb_classement': len(classement),
+        'classe': classe,
+        'date_debut': date_debut,
+        'date_fin': date_fin,
+        'jours_dormant': jours_dormant,
+        'params': params.urlencode(),
+    })
+
+
+@admin_gerant_required
+def rapport_expirations(request):
+    """Valeur du stock à risque (expiré ou en alerte) par mois d'expiration et fournisseur."""
+    from django.db.models import Count, Max, Sum
+
+    if request.method == 'POST':
+        nb = AlerteExpiration.rafraichir()
+        messages.success(request, f"Alertes d'expiration recalculées ({nb} produit(s) à risque).")
+        return redirect(f"{request.path}?{request.GET.urlencode()}")
+    AlerteExpiration.rafraichir_si_perime()
+
+    alertes = AlerteExpiration.objects.all()
+    statut = request.GET.get('statut', '')
+    if statut in dict(AlerteExpiration.STATUT_CHOICES):
+        alertes = alertes.filter(statut=statut)
+
+    cellules = (
+        alertes.values('mois_expiration', 'fournisseur_id', 'fournisseur__designation')
+        .annotate(valeur=Sum('valeur_risque'))
+        .order_by()
+    )
+    mois = sorted({c['mois_expiration'] for c in cellules})
+    index_mois = {m: i for i, m in enumerate(mois)}
+    lignes = {}
+    for c in cellules:
+        ligne = lignes.setdefault(c['fournisseur_id'], {
+            'fournisseur_id': c['fournisseur_id'],
+            'libelle': c['fournisseur__designation'],
+            'valeurs': [Decimal('0')] * len(mois),
+            'total': Decimal('0'),
+        })
+        ligne['valeurs'][index_mois[c['mois_expiration']]] = c['valeur']
+        ligne['total'] += c['valeur']
+    tableau = sorted(lignes.values(), key=lambda l: l['total'], reverse=True)
+    colonnes = [
+        {'mois': m, 'expire': m < timezone.localdate().replace(day=1), 'total': sum(l['valeurs'][i] for l in tableau)}
+        for i, m in enumerate(mois)
+    ]
+    totaux = alertes.aggregate(
+        valeur=Sum('valeur_risque'), nb=Count('pk'), quantite=Sum('quantite_stock'), date_calcul=Max('date_calcul'),
+    )
+    par_statut = dict(
+        AlerteExpiration.objects.values_list('statut').annotate(v=Sum('valeur_risque')).order_by()
+    )
+
+    detail = alertes.select_related('produit', 'fournisseur', 'lot')
+    filtre_fournisseur = request.GET.get('fournisseur', '')
+    if filtre_fournisseur.isdigit():
+        detail = detail.filter(fournisseur_id=int(filtre_fournisseur))
+    try:
+        filtre_mois = date.fromisoformat(request.GET.get('mois', ''))
+        detail = detail.filter(mois_expiration=filtre_mois)
+    except ValueError:
+        filtre_mois = None
+
+    return render(request, 'pharmacy/rapport_expirations.html', {
+        'tableau': tableau,
+        'colonnes': colonnes,
+        'totaux': totaux,
+        'valeur_expiree': par_statut.get('expire') or 0,
+        'valeur_alerte': par_statut.get('alerte') or 0,
+        'statut': statut,
+        'statuts': AlerteExpiration.STATUT_CHOICES,
+        'detail': detail.order_by('date_expiration', '-valeur_risque')[:CUBE_MAX_LIGNES],
+        'filtre_fournisseur': filtre_fournisseur,
+        'filtre_mois': filtre_mois,
     })
-    response = HttpResponse(content_type='application/pdf')
-    response['Content-Disposition'] = f'filename="requisition_{timezone.now().strftime("%Y%m%d_%H%M")}.pdf"'
-    pisa_status = pisa.CreatePDF(html, dest=response)
-    if pisa_status.err:
-        return HttpResponse("Erreur lors de la génération du PDF", status=500)
-    return response